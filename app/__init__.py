@@ -39,6 +39,16 @@ def create_app(config_name="development"):
 
     mail_manager.init_app(app)
 
+    # Registro diferido de visitas y descargas
+    from core.managers.record_manager import record_manager
+
+    record_manager.init_app(app)
+
+    # Caché de fragmentos de plantilla ({% cache key, ttl %})
+    from core.caching.fragments import init_fragment_cache
+
+    init_fragment_cache(app)
+
     # Register modules
     module_manager = ModuleManager(app)
     module_manager.register_modules()
@@ -6,9 +6,14 @@ from app.modules.auth.repositories import UserRepository
 from app.modules.auth.services import AuthenticationService
 
 
-@pytest.fixture(scope="session")
+@pytest.fixture(scope="session", autouse=True)
 def test_app():
-    """Create and configure a new app instance for each test session."""
+    """
+    Create and configure a new app instance for each test session.
+
+    It is created before any test runs: the shared caches and logging then follow TestingConfig
+    (temporary cache directory, no log file) instead of the development app created on import.
+    """
     test_app = create_app("testing")
 
     with test_app.app_context():
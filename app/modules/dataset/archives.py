@@ -0,0 +1,260 @@
+"""
+Descarga de datasets como zip.
+
+El archivo se escribe entrada a entrada sobre un buffer que se vacía en cada bloque, así que la
+respuesta empieza a enviarse en cuanto se lee el primer fichero, la memoria es constante y no
+se toca el disco. Los ficheros que ya vienen comprimidos (imágenes, zips...) se guardan sin
+volver a comprimir.
+
+DatasetArchiveCache guarda además el zip de cada dataset ya construido, identificado por el
+hash del manifiesto (nombre y checksum de cada fichero), para servirlo con sendfile.
+"""
+
+import fcntl
+import glob
+import hashlib
+import logging
+import os
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.modules.dataset.signals import dataset_changed
+from app.modules.hubfile.repositories import HubfileRepository
+from core.configuration.configuration import uploads_folder_name
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+# Extensiones que no ganan nada con deflate: se guardan tal cual (ZIP_STORED)
+COMPRESSED_EXTENSIONS = frozenset(
+    {".png", ".jpg", ".jpeg", ".gif", ".webp", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".pdf", ".mp4"}
+)
+
+
+def dataset_directory(dataset) -> str:
+    return os.path.join("uploads", f"user_{dataset.user_id}", f"dataset_{dataset.id}")
+
+
+def compress_type_for(filename: str) -> int:
+    extension = os.path.splitext(filename)[1].lower()
+    return zipfile.ZIP_STORED if extension in COMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def iter_directory_entries(directory: str, prefix: str) -> Iterator[Tuple[str, str]]:
+    """(ruta en disco, nombre dentro del zip) de cada fichero del directorio, en orden estable."""
+    for subdir, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            full_path = os.path.join(subdir, file)
+            yield full_path, os.path.join(prefix, os.path.relpath(full_path, directory))
+
+
+def iter_dataset_entries(dataset) -> Iterator[Tuple[str, str]]:
+    return iter_directory_entries(dataset_directory(dataset), f"dataset_{dataset.id}")
+
+
+def iter_bulk_entries(datasets: Iterable) -> Iterator[Tuple[str, str]]:
+    """Entradas de varios datasets en un mismo zip, cada uno en su directorio dataset_<id>/."""
+    for dataset in datasets:
+        yield from iter_dataset_entries(dataset)
+
+
+class _ChunkBuffer:
+    """Destino de ZipFile sin seek ni tell: zipfile usa descriptores de datos y lo trata como stream."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = ARCHIVE_CHUNK_SIZE) -> Iterator[bytes]:
+    """Genera un zip con los ficheros (ruta en disco, nombre en el zip) a medida que se leen."""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, mode="w", allowZip64=True) as archive:
+        for path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compress_type_for(path)
+            with open(path, "rb") as source, archive.open(info, mode="w", force_zip64=info.file_size > 2**31) as dest:
+                while True:
+                    block = source.read(chunk_size)
+                    if not block:
+                        break
+                    dest.write(block)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    # Directorio central
+    yield buffer.drain()
+
+
+def archive_cache_directory() -> str:
+    return os.getenv(
+        "DATASET_ARCHIVE_CACHE_DIR",
+        os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name(), "archive_cache"),
+    )
+
+
+def archive_cache_budget() -> int:
+    """Espacio máximo en disco de la caché de zips, en bytes (DATASET_ARCHIVE_CACHE_BYTES)."""
+    return int(os.getenv("DATASET_ARCHIVE_CACHE_BYTES", 2 * 1024**3))
+
+
+def manifest_hash(entries: List[Tuple[str, str]], checksums: Dict[str, str]) -> str:
+    """
+    Hash del contenido del zip: nombre en el zip y checksum de cada fichero. Los ficheros sin
+    checksum registrado (CSV, imágenes...) se identifican por tamaño y fecha de modificación.
+    """
+    digest = hashlib.sha256()
+    for path, arcname in sorted(entries, key=lambda entry: entry[1]):
+        checksum = checksums.get(os.path.basename(path))
+        if checksum is None:
+            stat = os.stat(path)
+            checksum = f"{stat.st_size}:{stat.st_mtime_ns}"
+        digest.update(f"{arcname}\0{checksum}\n".encode())
+    return digest.hexdigest()
+
+
+class DatasetArchiveCache:
+    """
+    Zips ya construidos de los datasets, en disco y con presupuesto de espacio.
+
+    El fichero se llama dataset_<id>-<manifiesto>.zip: si cambian los ficheros del dataset cambia
+    el manifiesto y se construye uno nuevo (el anterior se borra). Un flock por archivo hace que,
+    si llegan varias descargas a la vez, solo un proceso lo construya y el resto espere a que
+    termine. Cada acierto actualiza la fecha de modificación, que se usa para expulsar los menos
+    usados cuando se supera el presupuesto.
+    """
+
+    def __init__(self, directory: Optional[str] = None, budget: Optional[int] = None):
+        self._directory = directory
+        self._budget = budget
+        self.hubfile_repository = HubfileRepository()
+
+    @property
+    def directory(self) -> str:
+        # Ruta absoluta: send_file interpreta las relativas respecto a la carpeta de la app
+        return os.path.abspath(self._directory or archive_cache_directory())
+
+    @property
+    def budget(self) -> int:
+        return self._budget if self._budget is not None else archive_cache_budget()
+
+    def archive_path(self, dataset_id: int, manifest: str) -> str:
+        return os.path.join(self.directory, f"dataset_{dataset_id}-{manifest}.zip")
+
+    @contextmanager
+    def _build_lock(self, path: str):
+        with open(path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def describe(self, dataset) -> Tuple[str, List[Tuple[str, str]], Optional[datetime]]:
+        """Manifiesto, entradas y última modificación del contenido del dataset, sin construir el zip."""
+        entries = list(iter_dataset_entries(dataset))
+        manifest = manifest_hash(entries, self.hubfile_repository.get_checksums_by_dataset(dataset.id))
+        mtimes = [os.stat(path).st_mtime for path, _ in entries]
+        last_modified = datetime.fromtimestamp(int(max(mtimes)), timezone.utc) if mtimes else None
+        return manifest, entries, last_modified
+
+    def get_archive(self, dataset) -> str:
+        """Ruta del zip del dataset, construyéndolo si no está en la caché."""
+        manifest, entries, _ = self.describe(dataset)
+        return self.get_or_build(dataset.id, manifest, entries)
+
+    def get_or_build(self, dataset_id: int, manifest: str, entries: List[Tuple[str, str]]) -> str:
+        path = self.archive_path(dataset_id, manifest)
+        if self._touch(path):
+            return path
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._build_lock(path):
+            # Otro proceso puede haberlo construido mientras esperábamos el lock
+            if self._touch(path):
+                return path
+
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as archive:
+                    for chunk in stream_zip(entries):
+                        archive.write(chunk)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            logger.info(f"Built archive of dataset {dataset_id} ({os.path.getsize(path)} bytes)")
+
+        self.remove_dataset(dataset_id, keep=path)
+        self.evict(keep=path)
+        return path
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def remove_dataset(self, dataset_id: int, keep: Optional[str] = None):
+        """Borra los zips de un dataset (salvo `keep`): versiones antiguas o dataset eliminado."""
+        for path in glob.glob(os.path.join(self.directory, f"dataset_{dataset_id}-*.zip")):
+            if path != keep:
+                self._remove(path)
+
+    def evict(self, keep: Optional[str] = None):
+        """Expulsa los zips menos usados hasta quedar dentro del presupuesto."""
+        archives = []
+        for path in glob.glob(os.path.join(self.directory, "dataset_*.zip")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            archives.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in archives)
+        for _, size, path in sorted(archives):
+            if total <= self.budget:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path: str):
+        for leftover in (path, path + ".lock"):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+
+dataset_archive_cache = DatasetArchiveCache()
+
+
+def _on_dataset_changed(sender, dataset_id, dataset_type, action, **kwargs):
+    # Los cambios de ficheros ya cambian el manifiesto; al borrar el dataset se libera su espacio
+    if action == "deleted":
+        dataset_archive_cache.remove_dataset(dataset_id)
+
+
+dataset_changed.connect(_on_dataset_changed)
@@ -214,7 +214,7 @@ var currentId = 0;
                                     console.log('Dataset sent successfully');
                                     response.json().then(data => {
                                         console.log(data.message);
-                                        window.location.href = "/dataset/list";
+                                        wait_for_dataset_job(data.status_url);
                                     });
                                 } else {
                                     response.json().then(data => {
@@ -241,6 +241,28 @@ var currentId = 0;
         };
 
 
+        // La creación del dataset se ejecuta en segundo plano: se consulta su estado con long-polling
+        // corto (el servidor espera como mucho unos segundos) y se vuelve a preguntar mientras no termine
+        function wait_for_dataset_job(status_url, since = '') {
+            fetch(`${status_url}?wait=5&since=${encodeURIComponent(since)}`)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.status === 'succeeded') {
+                        window.location.href = "/dataset/list";
+                    } else if (job.status === 'failed') {
+                        hide_loading();
+                        write_upload_error(job.error || 'Dataset creation failed');
+                    } else {
+                        console.log(`Dataset job ${job.job_id}: ${job.status} (${job.stage})`);
+                        wait_for_dataset_job(status_url, `${job.status}:${job.stage}`);
+                    }
+                })
+                .catch(error => {
+                    console.error('Error while checking dataset job:', error);
+                    setTimeout(() => wait_for_dataset_job(status_url, since), 2000);
+                });
+        }
+
         function isValidOrcid(orcid) {
             let orcidRegex = /^\d{4}-\d{4}-\d{4}-\d{4}$/;
             return orcidRegex.test(orcid);
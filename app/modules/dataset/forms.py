@@ -1,6 +1,15 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileAllowed, FileField, FileRequired
-from wtforms import FieldList, FormField, MultipleFileField, SelectField, StringField, SubmitField, TextAreaField
+from wtforms import (
+    BooleanField,
+    FieldList,
+    FormField,
+    MultipleFileField,
+    SelectField,
+    StringField,
+    SubmitField,
+    TextAreaField,
+)
 from wtforms.validators import URL, DataRequired, Optional
 
 from app.modules.dataset.models_base import PublicationType
@@ -108,6 +117,9 @@ class FormulaDataSetForm(BaseDatasetForm):
     # FileAllowed: Solo permite extensiones .csv
     csv_file = FileField("Upload CSV File", validators=[FileRequired(), FileAllowed(["csv"], "CSV files only!")])
 
+    # Si está marcado, el CSV es una temporada completa y se crea un dataset por cada carrera
+    split_by_race = BooleanField("One dataset per race")
+
     submit = SubmitField("Submit Formula 1 Dataset")
 
 
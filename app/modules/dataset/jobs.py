@@ -0,0 +1,351 @@
+"""
+Creación asíncrona de datasets.
+
+La petición a /dataset/upload solo guarda lo subido en uploads/jobs/<job_id> y encola un
+DatasetJob. El worker (``flask dataset worker``) ejecuta después las etapas lentas: ingesta
+del CSV o de los UVL, recomendaciones y publicación en Zenodo. Los clientes consultan el
+estado en /dataset/jobs/<job_id>, con long-polling opcional.
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import click
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset import dataset_bp
+from app.modules.dataset.forms import FormulaDataSetForm, UVLDataSetForm
+from app.modules.dataset.models import DataSet, DatasetImage, DatasetJob
+from app.modules.dataset.repositories import DatasetJobRepository
+from app.modules.dataset.services import DailyStatsService, DataSetService, unique_visitors_service
+from app.modules.dataset.signals import send_dataset_changed
+from app.modules.dataset.validators import FormulaCSVValidationError
+from app.modules.zenodo.services import ZenodoService
+from core.configuration.configuration import uploads_folder_name
+from core.services.BaseService import BaseService
+
+logger = logging.getLogger(__name__)
+
+FORM_CLASSES = {"uvl": UVLDataSetForm, "formula": FormulaDataSetForm}
+
+# Un trabajo "running" sin cambios en este tiempo se considera huérfano (worker caído)
+STALE_JOB_TIMEOUT = timedelta(hours=1)
+MAX_JOB_ATTEMPTS = 3
+LONG_POLL_INTERVAL = 0.5
+# Espera máxima de una consulta de estado: con los workers síncronos de gunicorn cada cliente
+# que espera ocupa un worker entero, así que la espera es corta y el cliente vuelve a preguntar
+MAX_JOB_WAIT_SECONDS = float(os.getenv("MAX_JOB_WAIT_SECONDS", "5"))
+# Cada cuánto consolida el worker las visitas y descargas en los contadores diarios
+STATS_ROLLUP_INTERVAL = 60.0
+
+
+def dataset_images_folder(dataset_id: int) -> str:
+    """
+    Las imágenes se guardan en uploads (volumen compartido por la web y el worker, que es quien
+    las escribe) y se sirven con la ruta dataset.dataset_image.
+    """
+    return os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name(), "datasets", str(dataset_id))
+
+
+def save_dataset_images(dataset, images):
+    """Guarda las imágenes asociadas a un dataset."""
+    if not images:
+        return
+
+    dataset_folder = dataset_images_folder(dataset.id)
+    os.makedirs(dataset_folder, exist_ok=True)
+
+    for image in images:
+        if image and image.filename:
+            filename = secure_filename(image.filename)
+            # Evitar duplicados
+            base, ext = os.path.splitext(filename)
+            counter = 1
+            while os.path.exists(os.path.join(dataset_folder, filename)):
+                filename = f"{base}_{counter}{ext}"
+                counter += 1
+
+            image.save(os.path.join(dataset_folder, filename))
+
+            dataset_image = DatasetImage(filename=filename, dataset_id=dataset.id)
+            db.session.add(dataset_image)
+
+    db.session.commit()
+
+
+def job_folder(job_id: str) -> str:
+    return os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name(), "jobs", job_id)
+
+
+class DatasetJobService(BaseService):
+    def __init__(self):
+        super().__init__(DatasetJobRepository())
+        self.dataset_service = DataSetService()
+        self.zenodo_service = ZenodoService()
+
+    # ------------------------------------------------------------------
+    # Lado web: encolar y consultar
+    # ------------------------------------------------------------------
+
+    def enqueue(self, form, user, form_data: MultiDict, files: MultiDict) -> DatasetJob:
+        """Copia lo subido a la carpeta del trabajo y lo encola. No toca ninguna tabla de datasets."""
+        job_id = str(uuid.uuid4())
+        folder = job_folder(job_id)
+        os.makedirs(os.path.join(folder, "files"), exist_ok=True)
+        stored = {"csv_file": None, "images": []}
+
+        if isinstance(form, FormulaDataSetForm):
+            csv_file = form.csv_file.data
+            csv_file.save(os.path.join(folder, "upload.csv"))
+            stored["csv_file"] = {"path": "upload.csv", "filename": csv_file.filename}
+        else:
+            # Los UVL se subieron antes a la carpeta temporal del usuario, que puede cambiar mientras se espera
+            for feature_model in form.feature_models:
+                uvl_filename = feature_model.uvl_filename.data
+                shutil.copy(os.path.join(user.temp_folder(), uvl_filename), os.path.join(folder, "files", uvl_filename))
+
+        for index, image in enumerate(files.getlist("images")):
+            if image and image.filename:
+                path = f"image_{index}"
+                image.save(os.path.join(folder, path))
+                stored["images"].append({"path": path, "filename": image.filename})
+
+        payload = {"form": form_data.to_dict(flat=False), "files": stored}
+        return self.repository.create(
+            id=job_id,
+            user_id=user.id,
+            form_type="formula" if isinstance(form, FormulaDataSetForm) else "uvl",
+            status=DatasetJob.QUEUED,
+            stage="queued",
+            payload=json.dumps(payload),
+        )
+
+    def get_user_job(self, job_id: str, user_id: int) -> Optional[DatasetJob]:
+        job = self.repository.get_by_id(job_id)
+        return job if job is not None and job.user_id == user_id else None
+
+    def wait_for_update(self, job_id: str, user_id: int, timeout: float, since: Optional[str] = None):
+        """
+        Long-polling: espera hasta `timeout` segundos (como mucho MAX_JOB_WAIT_SECONDS) a que el
+        trabajo termine o cambie de etapa respecto a `since` ("status:stage" de la consulta anterior).
+        """
+        deadline = time.monotonic() + min(timeout, MAX_JOB_WAIT_SECONDS)
+        while True:
+            # Cerrar la transacción para ver los cambios que confirma el worker
+            self.repository.session.rollback()
+            job = self.get_user_job(job_id, user_id)
+            if job is None or job.is_finished or f"{job.status}:{job.stage}" != since:
+                return job
+            if time.monotonic() >= deadline:
+                return job
+            time.sleep(LONG_POLL_INTERVAL)
+
+    # ------------------------------------------------------------------
+    # Lado worker: ejecutar las etapas
+    # ------------------------------------------------------------------
+
+    def _set_stage(self, job: DatasetJob, stage: str):
+        job.stage = stage
+        self.repository.session.commit()
+        logger.info(f"Dataset job {job.id}: {stage}")
+
+    def _finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        self.repository.session.rollback()
+        job = self.repository.get_by_id(job_id)
+        job.status = status
+        job.stage = "done"
+        job.result = json.dumps(result) if result is not None else None
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        self.repository.session.commit()
+
+    def _build_form(self, job: DatasetJob, payload: dict, streams: List):
+        formdata = MultiDict([(key, value) for key, values in payload["form"].items() for value in values])
+        csv_file = payload["files"]["csv_file"]
+        if csv_file:
+            stream = open(os.path.join(job_folder(job.id), csv_file["path"]), "rb")
+            streams.append(stream)
+            formdata.add("csv_file", FileStorage(stream=stream, filename=csv_file["filename"]))
+        return FORM_CLASSES[job.form_type](formdata=formdata, meta={"csrf": False})
+
+    def _open_images(self, job: DatasetJob, payload: dict, streams: List) -> List[FileStorage]:
+        images = []
+        for image in payload["files"]["images"]:
+            stream = open(os.path.join(job_folder(job.id), image["path"]), "rb")
+            streams.append(stream)
+            images.append(FileStorage(stream=stream, filename=image["filename"]))
+        return images
+
+    def run(self, job: DatasetJob):
+        job_id = job.id
+        folder = job_folder(job_id)
+        payload = json.loads(job.payload)
+        user = User.query.get(job.user_id)
+        streams = []
+
+        try:
+            form = self._build_form(job, payload, streams)
+
+            self._set_stage(job, "ingestion")
+            source_dir = os.path.join(folder, "files")
+            if isinstance(form, FormulaDataSetForm) and form.split_by_race.data:
+                datasets = self.dataset_service.create_season_from_form(form=form, current_user=user)
+            else:
+                datasets = [self.dataset_service.create_from_form(form=form, current_user=user, source_dir=source_dir)]
+
+            if isinstance(form, UVLDataSetForm):
+                self.dataset_service.move_feature_models(datasets[0], current_user=user, source_dir=source_dir)
+
+            # En una temporada, las imágenes se asocian a la primera carrera
+            save_dataset_images(datasets[0], self._open_images(job, payload, streams))
+
+            self._set_stage(job, "recommendations")
+            for dataset in datasets:
+                self.calculate_recommendations(dataset)
+
+            self._set_stage(job, "zenodo")
+            messages = [self.publish_to_zenodo(dataset, form, user) for dataset in datasets]
+            for dataset in datasets:
+                send_dataset_changed(dataset.id, dataset.dataset_type, "published")
+            message = next((message for message in messages if message), "Everything works!")
+
+            self._finish(
+                job_id, DatasetJob.SUCCEEDED, result={"dataset_ids": [ds.id for ds in datasets], "message": message}
+            )
+
+        except FormulaCSVValidationError as exc:
+            self._finish(job_id, DatasetJob.FAILED, result={"report": exc.report.to_dict()}, error=str(exc))
+
+        except Exception as exc:
+            logger.exception(f"Exception while running dataset job {job_id}: {exc}")
+            self._finish(job_id, DatasetJob.FAILED, error=str(exc))
+
+        finally:
+            for stream in streams:
+                stream.close()
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def calculate_recommendations(self, dataset: DataSet):
+        try:
+            self.dataset_service.save_dataset_recommendations(dataset)
+        except Exception as e:
+            logger.exception(f"Exception while calculating recommendations locally: {e}")
+
+    def publish_to_zenodo(self, dataset: DataSet, form, user: User) -> Optional[str]:
+        """Publica el dataset en Zenodo. Devuelve un mensaje si falla la subida."""
+        data = {}
+        try:
+            data = self.zenodo_service.create_new_deposition(dataset)
+        except Exception as exc:
+            fake_doi = f"10.1234/local-dataset-{dataset.id}"
+            self.dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=fake_doi)
+            logger.exception(f"Exception while create dataset data in Zenodo: {exc}")
+
+        if data.get("conceptrecid"):
+            deposition_id = data.get("id")
+            self.dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
+
+            try:
+                # Subir archivos a Zenodo (Solo UVL por ahora)
+                if isinstance(form, UVLDataSetForm):
+                    for feature_model in dataset.feature_models:
+                        self.zenodo_service.upload_file(dataset, deposition_id, feature_model, user=user)
+
+                self.zenodo_service.publish_deposition(deposition_id)
+                deposition_doi = self.zenodo_service.get_doi(deposition_id)
+                self.dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
+            except Exception as e:
+                return f"Zenodo upload error: {e}"
+
+        return None
+
+
+class DatasetJobWorker:
+    """
+    Bucle del proceso worker: toma trabajos de la cola (tabla dataset_job) y los ejecuta. Entre
+    trabajos consolida cada `rollup_interval` segundos los registros de visitas y descargas.
+    """
+
+    def __init__(
+        self,
+        service: Optional[DatasetJobService] = None,
+        poll_interval: float = 2.0,
+        stats_service: Optional[DailyStatsService] = None,
+        rollup_interval: float = STATS_ROLLUP_INTERVAL,
+    ):
+        self.service = service or DatasetJobService()
+        self.poll_interval = poll_interval
+        self.stats_service = stats_service or DailyStatsService()
+        self.rollup_interval = rollup_interval
+        self._next_rollup = 0.0
+
+    def roll_up_stats_if_due(self):
+        if time.monotonic() < self._next_rollup:
+            return
+        self._next_rollup = time.monotonic() + self.rollup_interval
+        try:
+            self.stats_service.roll_up()
+        except Exception as exc:
+            self.stats_service.repository.session.rollback()
+            logger.exception(f"Exception while rolling up daily stats: {exc}")
+
+    def run_once(self) -> bool:
+        """Ejecuta un trabajo si hay alguno en cola. Devuelve False si la cola estaba vacía."""
+        job = self.service.repository.claim_next()
+        if job is None:
+            return False
+
+        if job.attempts > MAX_JOB_ATTEMPTS:
+            self.service._finish(job.id, DatasetJob.FAILED, error="Too many attempts, the worker kept stopping")
+            shutil.rmtree(job_folder(job.id), ignore_errors=True)
+        else:
+            self.service.run(job)
+        return True
+
+    def run(self, once: bool = False):
+        requeued = self.service.repository.requeue_stale(STALE_JOB_TIMEOUT)
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale dataset jobs")
+
+        while True:
+            self.roll_up_stats_if_due()
+            processed = self.run_once()
+            if once and not processed:
+                return
+            if not processed:
+                time.sleep(self.poll_interval)
+
+
+@dataset_bp.cli.command("worker")
+@click.option("--poll-interval", default=2.0, show_default=True, help="Seconds between checks of an empty queue.")
+@click.option("--once", is_flag=True, help="Process the queued jobs and exit.")
+def worker_command(poll_interval, once):
+    """Run the queued dataset creation jobs."""
+    DatasetJobWorker(poll_interval=poll_interval).run(once=once)
+
+
+@dataset_bp.cli.command("stats-rollup")
+def stats_rollup_command():
+    """Roll up new view and download records into the daily counters."""
+    rolled = DailyStatsService().roll_up()
+    click.echo(f"Rolled up {rolled['datasets']} dataset records and {rolled['files']} file records")
+
+
+@dataset_bp.cli.command("rebuild-sketches")
+@click.option("--if-empty", is_flag=True, help="Only rebuild when there are no sketches yet (after migrating).")
+def rebuild_sketches_command(if_empty):
+    """Rebuild the unique-visitor sketches from the stored view records."""
+    if if_empty and unique_visitors_service.count():
+        click.echo("Unique-visitor sketches already built, nothing to do")
+        return
+    replayed = unique_visitors_service.rebuild()
+    click.echo(f"Rebuilt unique-visitor sketches from {replayed} view records")
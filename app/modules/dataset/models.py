@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 from flask import request
@@ -54,6 +55,8 @@ class DataSet(db.Model):
     dataset_type = db.Column(db.String(50), nullable=False)  # Clave Polimórfica
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Versión del dataset para las cachés de fragmentos: cambia con él y con sus metadatos
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     recalculated_at = db.Column(db.DateTime, nullable=True)
     recommended_datasets_json = db.Column(db.Text, nullable=True, default="[]")
 
@@ -63,6 +66,9 @@ class DataSet(db.Model):
 
     comments = db.relationship("Comment", backref="dataset", cascade="all, delete-orphan", lazy=True)
 
+    # Paginación por keyset de Explore: (created_at, id) en los dos sentidos
+    __table_args__ = (db.Index("ix_dataset_created_at_id", "created_at", "id"),)
+
     __mapper_args__ = {
         "polymorphic_on": dataset_type,
         "polymorphic_identity": "base",
@@ -72,8 +78,12 @@ class DataSet(db.Model):
         return self.ds_meta_data.title
 
     def delete(self):
+        from app.modules.dataset.signals import send_dataset_changed
+
+        dataset_id, dataset_type = self.id, self.dataset_type
         db.session.delete(self)
         db.session.commit()
+        send_dataset_changed(dataset_id, dataset_type, "deleted")
 
     def get_files_count(self):
         """Método base: Por defecto 0 si no se sobrescribe."""
@@ -200,6 +210,12 @@ class FormulaDataSet(DataSet):
     fecha_carrera = db.Column(db.Date, nullable=False)
     circuito = db.Column(db.String(200), nullable=False)
 
+    # SHA-256 del CSV original: si se vuelve a subir el mismo fichero se copian los resultados sin reprocesarlo
+    csv_checksum = db.Column(db.String(64), nullable=True, index=True)
+
+    # Versión actual de los resultados: cada corrección aplicada guarda un FormulaResultDelta
+    results_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     # Resultados por piloto
     results = db.relationship(
         "FormulaResult",
@@ -208,6 +224,19 @@ class FormulaDataSet(DataSet):
         lazy=True,
     )
 
+    # Historial de correcciones de los resultados
+    result_deltas = db.relationship(
+        "FormulaResultDelta",
+        backref="formula_dataset",
+        cascade="all, delete-orphan",
+        lazy=True,
+    )
+
+    __table_args__ = (
+        db.Index("ix_formula_dataset_anio_temporada_circuito", "anio_temporada", "circuito"),
+        db.Index("ix_formula_dataset_circuito_anio_temporada", "circuito", "anio_temporada"),
+    )
+
     __mapper_args__ = {
         "polymorphic_identity": "formula",  # valor que irá en dataset.dataset_type
     }
@@ -220,6 +249,7 @@ class FormulaDataSet(DataSet):
                 "anio_temporada": self.anio_temporada,
                 "fecha_carrera": self.fecha_carrera.isoformat() if self.fecha_carrera else None,
                 "circuito": self.circuito,
+                "results_version": self.results_version,
                 "results": [r.to_dict() for r in self.results],
             }
         )
@@ -238,31 +268,91 @@ class FormulaResult(db.Model):
 
     # String porque puede ser "1", "DNF", "15", etc.
     posicion_final = db.Column(db.String(20), nullable=False)
+    # Posición como número (None si es "DNF", "DSQ"...), para filtrar por rangos con índice
+    posicion_numero = db.Column(db.Integer, nullable=True)
 
     puntos_obtenidos = db.Column(db.Float, nullable=False, default=0.0)
     tiempo_carrera = db.Column(db.String(50), nullable=True)
+    # Tiempo de carrera en milisegundos, para ordenar y calcular diferencias en SQL
+    tiempo_carrera_ms = db.Column(db.Integer, nullable=True, index=True)
     vueltas_completadas = db.Column(db.Integer, nullable=True)
     estado_carrera = db.Column(db.String(120), nullable=True)
 
+    __table_args__ = (
+        db.Index("ix_formula_result_dataset_id_tiempo_carrera_ms", "dataset_id", "tiempo_carrera_ms"),
+        # Índices de la consulta entre datasets (/formula/results/query): filtro + dataset_id + id
+        db.Index("ix_formula_result_piloto_nombre_dataset_id", "piloto_nombre", "dataset_id", "id"),
+        db.Index("ix_formula_result_equipo_dataset_id", "equipo", "dataset_id", "id"),
+        db.Index("ix_formula_result_motor_dataset_id", "motor", "dataset_id", "id"),
+        db.Index("ix_formula_result_estado_carrera_dataset_id", "estado_carrera", "dataset_id", "id"),
+        db.Index("ix_formula_result_posicion_numero_dataset_id", "posicion_numero", "dataset_id", "id"),
+        # Clave de las correcciones incrementales (upsert por piloto)
+        db.UniqueConstraint("dataset_id", "piloto_nombre", name="uq_formula_result_dataset_id_piloto_nombre"),
+    )
+
     def to_dict(self):
         return {
             "piloto_nombre": self.piloto_nombre,
             "equipo": self.equipo,
             "motor": self.motor,
             "posicion_final": self.posicion_final,
+            "posicion_numero": self.posicion_numero,
             "puntos_obtenidos": self.puntos_obtenidos,
             "tiempo_carrera": self.tiempo_carrera,
+            "tiempo_carrera_ms": self.tiempo_carrera_ms,
             "vueltas_completadas": self.vueltas_completadas,
             "estado_carrera": self.estado_carrera,
         }
 
 
+class FormulaResultDelta(db.Model):
+    """
+    Corrección aplicada a los resultados de un FormulaDataSet (sanción, descalificación...).
+
+    Solo se guardan los campos que cambian de cada piloto afectado, con su valor anterior y
+    el nuevo; "before" es null para los pilotos añadidos en esa versión.
+    """
+
+    __tablename__ = "formula_result_delta"
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey("formula_dataset.id"), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    comment = db.Column(db.String(255), nullable=True)
+    # [{"piloto_nombre": ..., "before": {...} | null, "after": {...}}]
+    changes = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint("dataset_id", "version", name="uq_formula_result_delta_dataset_id_version"),)
+
+    def get_changes(self) -> list:
+        return json.loads(self.changes)
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "user_id": self.user_id,
+            "comment": self.comment,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "changes": self.get_changes(),
+        }
+
+
 class DSDownloadRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey("dataset.id"))
     download_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     download_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
+    # user_id sin NULL, para que la clave única también descarte las descargas anónimas repetidas
+    user_key = db.Column(db.Integer, db.Computed("coalesce(user_id, 0)", persisted=True))
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "dataset_id", "download_cookie", "user_key", name="uq_ds_download_record_dataset_id_cookie_user_key"
+        ),
+    )
 
     def __repr__(self):
         return (
@@ -279,25 +369,121 @@ class DSViewRecord(db.Model):
     dataset_id = db.Column(db.Integer, db.ForeignKey("dataset.id"))
     view_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     view_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
+    user_key = db.Column(db.Integer, db.Computed("coalesce(user_id, 0)", persisted=True))
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "dataset_id", "view_cookie", "user_key", name="uq_ds_view_record_dataset_id_cookie_user_key"
+        ),
+    )
 
     def __repr__(self):
         return f"<View id={self.id} dataset_id={self.dataset_id} date={self.view_date} cookie={self.view_cookie}>"
 
 
+class DatasetDailyStats(db.Model):
+    """
+    Visitas y descargas de cada dataset por día, consolidadas desde ds_view_record y
+    ds_download_record. Sin clave foránea: es una tabla derivada que se puede reconstruir.
+    """
+
+    __tablename__ = "dataset_daily_stats"
+
+    dataset_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    downloads = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+
+class StatsRollupState(db.Model):
+    """Último id de cada tabla de registros ya sumado en las tablas de contadores diarios."""
+
+    __tablename__ = "stats_rollup_state"
+
+    source = db.Column(db.String(64), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ViewSketch(db.Model):
+    """
+    Sketch HyperLogLog de los visitantes distintos de un dataset o fichero en un periodo: un día
+    ("2026-10-17"), un mes ("2026-10") o todo el histórico ("all"). object_id 0 agrupa todos los
+    objetos de ese tipo.
+    """
+
+    __tablename__ = "view_sketch"
+
+    object_type = db.Column(db.String(16), primary_key=True)
+    object_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    period = db.Column(db.String(10), primary_key=True)
+    registers = db.Column(db.LargeBinary, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class DOIMapping(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     dataset_doi_old = db.Column(db.String(120))
     dataset_doi_new = db.Column(db.String(120))
 
+
 class DatasetImage(db.Model):
     __tablename__ = "dataset_image"
-    
+
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(256), nullable=False)
     dataset_id = db.Column(db.Integer, db.ForeignKey("dataset.id"), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+
     dataset = db.relationship("DataSet", backref=db.backref("images", lazy=True, cascade="all, delete-orphan"))
-    
+
     def __repr__(self):
         return f"<DatasetImage {self.filename}>"
+
+
+class DatasetJob(db.Model):
+    """Creación de un dataset encolada: la ejecuta el worker (flask dataset worker) fuera de la petición."""
+
+    __tablename__ = "dataset_job"
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    form_type = db.Column(db.String(20), nullable=False)  # "uvl" o "formula"
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    stage = db.Column(db.String(30), nullable=True)
+    # Datos del formulario (request.form) y nombres de los ficheros guardados en la carpeta del trabajo
+    payload = db.Column(db.Text, nullable=False)
+    # dataset_ids, mensaje final o informe de validación del CSV
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index("ix_dataset_job_status_created_at", "status", "created_at"),)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"DatasetJob<{self.id} {self.status}>"
@@ -1,12 +1,26 @@
 import logging
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
-from flask_login import current_user
-from sqlalchemy import desc, func
+from sqlalchemy import bindparam, delete, desc, insert, literal, select, tuple_, update
 
-from app.modules.dataset.models import Author, Comment, DataSet, DOIMapping, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.dataset.models import (
+    Author,
+    Comment,
+    DataSet,
+    DatasetDailyStats,
+    DatasetJob,
+    DOIMapping,
+    DSDownloadRecord,
+    DSMetaData,
+    DSViewRecord,
+    FormulaDataSet,
+    FormulaResult,
+    ViewSketch,
+)
 from core.repositories.BaseRepository import BaseRepository
+from core.repositories.DailyStatsRepository import DailyStatsRepository
+from core.sketches.hyperloglog import HyperLogLog
 
 logger = logging.getLogger(__name__)
 
@@ -16,15 +30,99 @@ class AuthorRepository(BaseRepository):
         super().__init__(Author)
 
 
+class DatasetDailyStatsRepository(DailyStatsRepository):
+    def __init__(self):
+        super().__init__(
+            DatasetDailyStats,
+            "dataset_id",
+            {"views": (DSViewRecord, "view_date"), "downloads": (DSDownloadRecord, "download_date")},
+        )
+
+
+class ViewSketchRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(ViewSketch)
+
+    def get_registers(self, object_type: str, object_id: int, periods: List[str]) -> List[bytes]:
+        table = self.model.__table__
+        rows = self.session.execute(
+            select(table.c.registers).where(
+                table.c.object_type == object_type, table.c.object_id == object_id, table.c.period.in_(periods)
+            )
+        )
+        return [registers for (registers,) in rows if registers]
+
+    def clear(self):
+        self.session.execute(delete(self.model.__table__))
+        self.session.commit()
+
+    def view_rows(self, record_model, after_id: int, limit: int) -> List[dict]:
+        """Registros de visitas posteriores a `after_id`, para reconstruir los sketches por lotes."""
+        table = record_model.__table__
+        rows = self.session.execute(select(table).where(table.c.id > after_id).order_by(table.c.id).limit(limit))
+        return [dict(row._mapping) for row in rows]
+
+    def merge(self, sketches: Dict[Tuple[str, int, str], HyperLogLog]):
+        """
+        Une cada sketch con el guardado. Las filas se crean vacías si no existen y se bloquean
+        (en orden, para no provocar interbloqueos) antes de leerlas, así que dos procesos que
+        actualicen el mismo sketch a la vez no pierden visitantes.
+        """
+        if not sketches:
+            return
+        table = self.model.__table__
+        keys = sorted(sketches)
+        now = datetime.utcnow()
+        self.session.execute(
+            insert(table).prefix_with("IGNORE", dialect="mysql"),
+            [
+                {"object_type": object_type, "object_id": object_id, "period": period, "updated_at": now}
+                for object_type, object_id, period in keys
+            ],
+        )
+        stored = {
+            (object_type, object_id, period): registers
+            for object_type, object_id, period, registers in self.session.execute(
+                select(table.c.object_type, table.c.object_id, table.c.period, table.c.registers)
+                .where(tuple_(table.c.object_type, table.c.object_id, table.c.period).in_(keys))
+                .order_by(table.c.object_type, table.c.object_id, table.c.period)
+                .with_for_update()
+            )
+        }
+        self.session.execute(
+            update(table)
+            .where(
+                table.c.object_type == bindparam("key_type"),
+                table.c.object_id == bindparam("key_id"),
+                table.c.period == bindparam("key_period"),
+            )
+            .values(registers=bindparam("new_registers"), updated_at=now),
+            [
+                {
+                    "key_type": key[0],
+                    "key_id": key[1],
+                    "key_period": key[2],
+                    "new_registers": HyperLogLog.from_bytes(stored.get(key)).merge(sketches[key]).to_bytes(),
+                }
+                for key in keys
+            ],
+        )
+        self.session.commit()
+
+
 class DSDownloadRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(DSDownloadRecord)
+        self.daily_stats_repository = DatasetDailyStatsRepository()
 
     def total_dataset_downloads(self) -> int:
-        return self.model.query.count()
+        return self.daily_stats_repository.total("downloads")
 
     def count_downloads_for_dataset(self, dataset_id: int) -> int:
-        return self.model.query.filter_by(dataset_id=dataset_id).count()
+        return self.daily_stats_repository.counts("downloads", [dataset_id]).get(dataset_id, 0)
+
+    def downloads_by_dataset(self, dataset_ids: Optional[List[int]] = None) -> Dict[int, int]:
+        return self.daily_stats_repository.counts("downloads", dataset_ids)
 
 
 class DSMetaDataRepository(BaseRepository):
@@ -38,31 +136,31 @@ class DSMetaDataRepository(BaseRepository):
 class DSViewRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(DSViewRecord)
+        self.daily_stats_repository = DatasetDailyStatsRepository()
 
     def total_dataset_views(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
-
-    def the_record_exists(self, dataset: DataSet, user_cookie: str):
-        return self.model.query.filter_by(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset.id,
-            view_cookie=user_cookie,
-        ).first()
-
-    def create_new_record(self, dataset: DataSet, user_cookie: str) -> DSViewRecord:
-        return self.create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset.id,
-            view_date=datetime.now(timezone.utc),
-            view_cookie=user_cookie,
-        )
+        return self.daily_stats_repository.total("views")
 
 
 class DataSetRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
 
+    def get_by_ids(self, dataset_ids: List[int]) -> List[DataSet]:
+        """Datasets con esos ids, en el orden pedido (los que no existen se omiten)."""
+        datasets = {dataset.id: dataset for dataset in self.model.query.filter(DataSet.id.in_(dataset_ids)).all()}
+        return [datasets[dataset_id] for dataset_id in dataset_ids if dataset_id in datasets]
+
+    def touch(self, dataset_id: Optional[int] = None, ds_meta_data_id: Optional[int] = None):
+        """Avanza updated_at (la versión del dataset en las cachés de fragmentos)."""
+        statement = update(DataSet).values(updated_at=datetime.utcnow())
+        if dataset_id is not None:
+            statement = statement.where(DataSet.id == dataset_id)
+        else:
+            statement = statement.where(DataSet.ds_meta_data_id == ds_meta_data_id)
+        self.session.execute(statement)
+        self.session.commit()
+
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return (
             self.model.query.join(DSMetaData)
@@ -105,6 +203,76 @@ class DataSetRepository(BaseRepository):
         return self.model.query.join(DSMetaData).filter(DSMetaData.dataset_doi.isnot(None)).all()
 
 
+class FormulaResultRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FormulaResult)
+
+    def bulk_insert(self, rows: List[dict]) -> int:
+        """Inserta un lote de resultados con un único executemany de Core, sin crear objetos ORM."""
+        if not rows:
+            return 0
+        self.session.execute(insert(self.model.__table__), rows)
+        return len(rows)
+
+    def copy_results(self, source_dataset_id: int, dataset_id: int) -> int:
+        """Copia los resultados de otro dataset con un INSERT ... SELECT, sin pasar por Python."""
+        table = self.model.__table__
+        columns = [column for column in table.columns if column.name not in ("id", "dataset_id")]
+        statement = insert(table).from_select(
+            ["dataset_id", *(column.name for column in columns)],
+            select(literal(dataset_id), *columns).where(table.c.dataset_id == source_dataset_id),
+        )
+        return self.session.execute(statement).rowcount
+
+    def get_dataset_by_csv_checksum(self, checksum: str) -> Optional[FormulaDataSet]:
+        """Dataset con los resultados tal cual venían en el CSV: los corregidos con parches no cuentan."""
+        return (
+            self.session.query(FormulaDataSet)
+            .filter(FormulaDataSet.csv_checksum == checksum, FormulaDataSet.results_version == 0)
+            .order_by(FormulaDataSet.id)
+            .first()
+        )
+
+
+class DatasetJobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(DatasetJob)
+
+    def claim_next(self) -> Optional[DatasetJob]:
+        """
+        Toma el trabajo en cola más antiguo y lo marca como en ejecución.
+
+        SKIP LOCKED permite que varios workers compitan por la cola sin bloquearse entre sí
+        ni tomar el mismo trabajo.
+        """
+        job = (
+            self.session.query(DatasetJob)
+            .filter(DatasetJob.status == DatasetJob.QUEUED)
+            .order_by(DatasetJob.created_at)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            self.session.rollback()
+            return None
+
+        job.status = DatasetJob.RUNNING
+        job.started_at = datetime.utcnow()
+        job.attempts += 1
+        self.session.commit()
+        return job
+
+    def requeue_stale(self, timeout: timedelta) -> int:
+        """Devuelve a la cola los trabajos que llevan demasiado tiempo en ejecución (worker caído)."""
+        count = (
+            self.session.query(DatasetJob)
+            .filter(DatasetJob.status == DatasetJob.RUNNING, DatasetJob.updated_at < datetime.utcnow() - timeout)
+            .update({DatasetJob.status: DatasetJob.QUEUED, DatasetJob.stage: None}, synchronize_session=False)
+        )
+        self.session.commit()
+        return count
+
+
 class DOIMappingRepository(BaseRepository):
     def __init__(self):
         super().__init__(DOIMapping)
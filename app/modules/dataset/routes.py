@@ -2,72 +2,57 @@ import json
 import logging
 import os
 import shutil
-import tempfile
 import uuid
-from datetime import datetime, timezone
-from zipfile import ZipFile
 
-from flask import abort, jsonify, make_response, redirect, render_template, request, send_from_directory, url_for
+from flask import (
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user, login_required
-from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 
-from app import db
 from app.modules.auth.services import AuthenticationService
 from app.modules.dataset import dataset_bp
+from app.modules.dataset.archives import dataset_archive_cache, iter_bulk_entries, stream_zip
 from app.modules.dataset.forms import FormulaDataSetForm, UVLDataSetForm
-from app.modules.dataset.models import Comment, DatasetImage, DSDownloadRecord
+from app.modules.dataset.jobs import MAX_JOB_WAIT_SECONDS, DatasetJobService, dataset_images_folder
+from app.modules.dataset.models import Comment
 from app.modules.dataset.services import (
     AuthorService,
+    BulkDownloadError,
     CommentService,
     DataSetService,
     DOIMappingService,
     DSDownloadRecordService,
     DSMetaDataService,
     DSViewRecordService,
+    parse_dataset_ids,
+    unique_visitors_service,
 )
+from app.modules.dataset.validators import FormulaCSVValidator
 from app.modules.zenodo.services import ZenodoService
+from core.caching.http import is_resumed_download, not_modified, send_upload
 
 comment_service = CommentService()
 
 logger = logging.getLogger(__name__)
 
-UPLOAD_FOLDER = "app/static/uploads/datasets"
-
 dataset_service = DataSetService()
 author_service = AuthorService()
 dsmetadata_service = DSMetaDataService()
 zenodo_service = ZenodoService()
 doi_mapping_service = DOIMappingService()
 ds_view_record_service = DSViewRecordService()
-
-
-def save_dataset_images(dataset, images):
-    """Guarda las imágenes asociadas a un dataset."""
-    if not images:
-        return
-    
-    dataset_folder = os.path.join(UPLOAD_FOLDER, str(dataset.id))
-    os.makedirs(dataset_folder, exist_ok=True)
-    
-    for image in images:
-        if image and image.filename:
-            filename = secure_filename(image.filename)
-            # Evitar duplicados
-            base, ext = os.path.splitext(filename)
-            counter = 1
-            while os.path.exists(os.path.join(dataset_folder, filename)):
-                filename = f"{base}_{counter}{ext}"
-                counter += 1
-            
-            image.save(os.path.join(dataset_folder, filename))
-            
-            dataset_image = DatasetImage(
-                filename=filename,
-                dataset_id=dataset.id
-            )
-            db.session.add(dataset_image)
-    
-    db.session.commit()
+ds_download_record_service = DSDownloadRecordService()
+dataset_job_service = DatasetJobService()
 
 
 @dataset_bp.route("/dataset/upload", methods=["GET", "POST"])
@@ -78,7 +63,6 @@ def create_dataset():
     formula_form = FormulaDataSetForm()
 
     if request.method == "POST":
-        dataset = None
         form_to_process = None
 
         # Determinar cuál formulario se ha enviado validándolos
@@ -89,68 +73,29 @@ def create_dataset():
 
         if form_to_process:
             try:
-                logger.info(f"Creating dataset using {type(form_to_process).__name__}...")
-
-                # El servicio ya sabe cómo manejar cada tipo (modificamos services.py antes)
-                dataset = dataset_service.create_from_form(form=form_to_process, current_user=current_user)
-                logger.info(f"Created dataset: {dataset}")
-
-                # Mover archivos solo si es UVL (Formula CSV ya se procesó en memoria)
-                if isinstance(form_to_process, UVLDataSetForm):
-                    dataset_service.move_feature_models(dataset)
-
-                # Guardar imágenes del dataset
-                images = request.files.getlist("images")
-                if images:
-                    save_dataset_images(dataset, images)
-
-                # --- CÁLCULO DE RECOMENDACIONES ---
-                try:
-                    dataset_service.save_dataset_recommendations(dataset)
-                except Exception as e:
-                    logger.exception(f"Exception while calculating recommendations locally: {e}")
-
-                # --- ZENODO ---
-                data = {}
-                try:
-                    zenodo_response_json = zenodo_service.create_new_deposition(dataset)
-                    response_data = json.dumps(zenodo_response_json)
-                    data = json.loads(response_data)
-                except Exception as exc:
-                    fake_doi = f"10.1234/local-dataset-{dataset.id}"
-                    dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=fake_doi)
-                    # ------------------
-
-                    data = {}
-                    logger.exception(f"Exception while create dataset data in Zenodo: {exc}")
-
-                if data.get("conceptrecid"):
-                    deposition_id = data.get("id")
-                    dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
-
-                    try:
-                        # Subir archivos a Zenodo (Solo UVL por ahora)
-                        if isinstance(form_to_process, UVLDataSetForm):
-                            for feature_model in dataset.feature_models:
-                                zenodo_service.upload_file(dataset, deposition_id, feature_model)
-
-                        zenodo_service.publish_deposition(deposition_id)
-                        deposition_doi = zenodo_service.get_doi(deposition_id)
-                        dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
-                    except Exception as e:
-                        msg = f"Zenodo upload error: {e}"
-                        return jsonify({"message": msg}), 200
-
-                # Borrar temporales
+                logger.info(f"Queueing dataset creation using {type(form_to_process).__name__}...")
+
+                # La ingesta, las recomendaciones y Zenodo se ejecutan en el worker (flask dataset worker)
+                job = dataset_job_service.enqueue(form_to_process, current_user, request.form, request.files)
+
+                # Borrar temporales (el trabajo tiene su propia copia)
                 file_path = current_user.temp_folder()
                 if os.path.exists(file_path) and os.path.isdir(file_path):
                     shutil.rmtree(file_path)
 
-                msg = "Everything works!"
-                return jsonify({"message": msg}), 200
+                return (
+                    jsonify(
+                        {
+                            "message": "Dataset creation queued",
+                            "job_id": job.id,
+                            "status_url": url_for("dataset.dataset_job_status", job_id=job.id),
+                        }
+                    ),
+                    202,
+                )
 
             except Exception as exc:
-                logger.exception(f"Exception while create dataset data in local {exc}")
+                logger.exception(f"Exception while queueing dataset creation {exc}")
                 return jsonify({"Exception while create dataset data in local: ": str(exc)}), 400
 
         else:
@@ -162,6 +107,24 @@ def create_dataset():
     return render_template("dataset/upload_dataset.html", form=uvl_form, formula_form=formula_form)
 
 
+@dataset_bp.route("/dataset/jobs/<job_id>", methods=["GET"])
+@login_required
+def dataset_job_status(job_id):
+    """
+    Estado de un trabajo de creación. Con ?wait=N la petición espera hasta N segundos (como
+    mucho MAX_JOB_WAIT_SECONDS) a que el trabajo cambie respecto a ?since=<status:stage>.
+    """
+    wait = min(max(request.args.get("wait", 0, type=float), 0), MAX_JOB_WAIT_SECONDS)
+    if wait:
+        job = dataset_job_service.wait_for_update(job_id, current_user.id, wait, since=request.args.get("since"))
+    else:
+        job = dataset_job_service.get_user_job(job_id, current_user.id)
+
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
 @dataset_bp.route("/dataset/list", methods=["GET", "POST"])
 @login_required
 def list_dataset():
@@ -203,6 +166,23 @@ def upload():
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
+    if new_filename.endswith(".csv"):
+        report = FormulaCSVValidator().validate_file(file_path)
+        if not report.is_valid:
+            os.remove(file_path)
+            return jsonify({"message": "CSV not valid", "report": report.to_dict()}), 400
+
+        return (
+            jsonify(
+                {
+                    "message": "CSV uploaded and validated successfully",
+                    "filename": new_filename,
+                    "report": report.to_dict(),
+                }
+            ),
+            200,
+        )
+
     return (
         jsonify(
             {
@@ -232,63 +212,87 @@ def delete():
 def download_dataset(dataset_id):
     dataset = dataset_service.get_or_404(dataset_id)
 
-    file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
-
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
-
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
+    # El ETag es el manifiesto del zip: si el cliente ya lo tiene se responde 304 sin construir nada
+    manifest, entries, last_modified = dataset_archive_cache.describe(dataset)
+    cached = not_modified(manifest, last_modified)
+    if cached is not None:
+        return cached
 
-                relative_path = os.path.relpath(full_path, file_path)
-
-                zipf.write(
-                    full_path,
-                    arcname=os.path.join(os.path.basename(zip_path[:-4]), relative_path),
-                )
+    try:
+        # Zip ya construido (o construido ahora, una sola vez) servido con sendfile o por nginx (X-Accel-Redirect)
+        resp = send_upload(
+            dataset_archive_cache.get_or_build(dataset.id, manifest, entries),
+            mimetype="application/zip",
+            as_attachment=True,
+            download_name=f"dataset_{dataset_id}.zip",
+            etag=manifest,
+            last_modified=last_modified,
+        )
+    except OSError as exc:
+        # Sin caché (disco lleno, permisos...) se genera el zip mientras se envía
+        logger.warning(f"Archive cache unavailable for dataset {dataset_id}: {exc}")
+        resp = Response(stream_zip(entries), mimetype="application/zip")
+        resp.headers["Content-Disposition"] = f"attachment; filename=dataset_{dataset_id}.zip"
+        resp.set_etag(manifest)
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())  # Generate a new unique identifier if it does not exist
         # Save the cookie to the user's browser
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
 
-    # Check if the download record already exists for this cookie
-    existing_record = DSDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        dataset_id=dataset_id,
-        download_cookie=user_cookie,
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        DSDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
+    # Resumed downloads are not new ones; repeated downloads are discarded by the record's unique key
+    if not is_resumed_download():
+        ds_download_record_service.record_download(
+            dataset_id, current_user.id if current_user.is_authenticated else None, user_cookie
         )
 
     return resp
 
 
+@dataset_bp.route("/dataset/<int:dataset_id>/images/<path:filename>", methods=["GET"])
+def dataset_image(dataset_id, filename):
+    # Las imágenes subidas antes de guardarlas en uploads siguen en la carpeta estática antigua
+    legacy_folder = os.path.join(current_app.static_folder, "uploads", "datasets", str(dataset_id))
+    for folder in (dataset_images_folder(dataset_id), legacy_folder):
+        path = safe_join(folder, filename)
+        if path is not None and os.path.isfile(path):
+            return send_upload(path, as_attachment=False)
+    abort(404)
+
+
+@dataset_bp.route("/dataset/download/bulk", methods=["GET", "POST"])
+def download_datasets():
+    """
+    Descarga varios datasets en un único zip generado mientras se envía. Por GET con ?ids=1,2,3;
+    por POST con un JSON {"dataset_ids": [...]} o {"query": {...criterios de Explore...}}.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        dataset_ids = parse_dataset_ids(payload.get("dataset_ids") or request.args.getlist("ids"))
+        datasets = dataset_service.get_for_bulk_download(dataset_ids=dataset_ids, criteria=payload.get("query"))
+    except BulkDownloadError as exc:
+        return jsonify({"message": str(exc)}), 400
+
+    if not datasets:
+        abort(404)
+
+    resp = Response(stream_with_context(stream_zip(iter_bulk_entries(datasets))), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f"attachment; filename=datasets_{len(datasets)}.zip"
+
+    user_cookie = request.cookies.get("download_cookie")
+    if not user_cookie:
+        user_cookie = str(uuid.uuid4())
+        resp.set_cookie("download_cookie", user_cookie)
+
+    # Un solo INSERT diferido para todas las descargas
+    ds_download_record_service.record_bulk(
+        current_user.id if current_user.is_authenticated else None, user_cookie, [dataset.id for dataset in datasets]
+    )
+
+    return resp
+
+
 @dataset_bp.route("/doi/<path:doi>/", methods=["GET"], strict_slashes=False)
 @dataset_bp.route("/doi/<path:doi>", methods=["GET"], strict_slashes=False)
 def subdomain_index(doi):
@@ -313,7 +317,8 @@ def subdomain_index(doi):
 
     # Save the cookie to the user's browser
     user_cookie = ds_view_record_service.create_cookie(dataset=dataset)
-    resp = make_response(render_template("dataset/view_dataset.html", dataset=dataset))
+    unique_views = unique_visitors_service.unique_visitors("dataset", dataset.id)
+    resp = make_response(render_template("dataset/view_dataset.html", dataset=dataset, unique_views=unique_views))
     resp.set_cookie("view_cookie", user_cookie)
 
     return resp
@@ -392,4 +397,4 @@ def add_comment_ajax(dataset_id):
 
     comments = Comment.query.filter_by(dataset_id=dataset_id, parent_id=None).all()
     html = render_template("dataset/comments_list.html", comments=comments)
-    return jsonify({"ok": True, "html": html})
\ No newline at end of file
+    return jsonify({"ok": True, "html": html})
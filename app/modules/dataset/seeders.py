@@ -167,8 +167,10 @@ class DataSetSeeder(BaseSeeder):
                 equipo="Red Bull Racing",
                 motor="Honda RBPT",
                 posicion_final="1",
+                posicion_numero=1,
                 puntos_obtenidos=25.0,
                 tiempo_carrera="1:35:48.333",
+                tiempo_carrera_ms=5748333,
                 vueltas_completadas=66,
                 estado_carrera="Terminado",
             ),
@@ -178,8 +180,10 @@ class DataSetSeeder(BaseSeeder):
                 equipo="McLaren",
                 motor="Mercedes",
                 posicion_final="2",
+                posicion_numero=2,
                 puntos_obtenidos=18.0,
                 tiempo_carrera="1:35:48.653",
+                tiempo_carrera_ms=5748653,
                 vueltas_completadas=66,
                 estado_carrera="Terminado",
             ),
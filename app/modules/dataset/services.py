@@ -1,49 +1,172 @@
 import csv
-import hashlib
 import io
 import json
 import logging
 import os
 import shutil
 import uuid
-from datetime import datetime, timedelta, timezone
-from typing import Optional
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional
 
 from flask import request
 
 from app.modules.auth.services import AuthenticationService
 from app.modules.dataset.forms import FormulaDataSetForm, UVLDataSetForm
-from app.modules.dataset.models import DataSet, DSMetaData, DSViewRecord, FormulaDataSet, FormulaResult, UVLDataSet
+from app.modules.dataset.models import (
+    DataSet,
+    DSDownloadRecord,
+    DSMetaData,
+    DSViewRecord,
+    FormulaDataSet,
+    UVLDataSet,
+)
 from app.modules.dataset.repositories import (
     AuthorRepository,
     CommentRepository,
+    DatasetDailyStatsRepository,
     DataSetRepository,
     DOIMappingRepository,
     DSDownloadRecordRepository,
     DSMetaDataRepository,
     DSViewRecordRepository,
+    FormulaResultRepository,
+    ViewSketchRepository,
 )
+from app.modules.dataset.signals import dataset_changed, send_dataset_changed
+from app.modules.dataset.validators import RACE_TIME_REGEX, FormulaCSVValidationError, FormulaCSVValidator
+from app.modules.explore.services import ExploreService
 from app.modules.featuremodel.repositories import FeatureModelRepository, FMMetaDataRepository
+from app.modules.hubfile.models import HubfileViewRecord
 from app.modules.hubfile.repositories import (
+    HubfileDailyStatsRepository,
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from app.modules.hubfile.services import ContentBlobService, sha256_stream
+from core.managers.record_manager import record_manager
 from core.services.BaseService import BaseService
 from core.services.DatasetRecommenderService import DatasetRecommenderService
+from core.sketches.hyperloglog import HyperLogLog
 
 logger = logging.getLogger(__name__)
 
 EXPIRATION_TIME = timedelta(hours=1)
 ANCIENT_DATE = datetime(2000, 1, 1, tzinfo=timezone.utc)
 
-
-def calculate_checksum_and_size(file_path):
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as file:
-        content = file.read()
-        hash_md5 = hashlib.md5(content).hexdigest()
-        return hash_md5, file_size
+# Número de filas del CSV que se convierten e insertan en cada executemany
+FORMULA_CSV_CHUNK_SIZE = 1000
+
+# Columnas que identifican una visita o descarga repetida (las claves únicas de las tablas)
+VIEW_RECORD_KEY = ("dataset_id", "view_cookie", "user_id")
+DOWNLOAD_RECORD_KEY = ("dataset_id", "download_cookie", "user_id")
+
+# Máximo de datasets en una descarga conjunta
+MAX_BULK_DOWNLOAD_DATASETS = 200
+
+
+class BulkDownloadError(ValueError):
+    pass
+
+
+def parse_dataset_ids(values) -> List[int]:
+    """Ids de una descarga conjunta: lista de enteros o cadenas "1,2,3", sin repetidos y en orden."""
+    if isinstance(values, (str, int)):
+        values = [values]
+    ids = []
+    for value in values or []:
+        for part in str(value).split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                raise BulkDownloadError(f"Invalid dataset id: {part}")
+            ids.append(int(part))
+    return list(dict.fromkeys(ids))
+
+
+def uvlhub_doi_url(dataset_doi: str) -> str:
+    domain = os.getenv("DOMAIN", "localhost")
+    return f"http://{domain}/doi/{dataset_doi}"
+
+
+def iter_chunks(rows: Iterable[dict], chunk_size: int = FORMULA_CSV_CHUNK_SIZE) -> Iterator[List[dict]]:
+    """Agrupa un iterable de filas en listas de, como mucho, chunk_size elementos."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def formula_race_fields(row: dict) -> dict:
+    """Extrae de una fila del CSV los datos globales del Gran Premio."""
+    return {
+        "nombre_gp": row.get("nombre_gp") or "Desconocido",
+        "anio_temporada": int(row.get("anio_temporada") or datetime.now().year),
+        # Manejo de fecha seguro
+        "fecha_carrera": (
+            datetime.strptime(row.get("fecha_carrera"), "%Y-%m-%d").date()
+            if row.get("fecha_carrera")
+            else datetime.now().date()
+        ),
+        "circuito": row.get("circuito") or "Desconocido",
+    }
+
+
+def formula_race_key(row: dict) -> tuple:
+    """Clave que identifica la carrera a la que pertenece una fila del CSV."""
+    return (row.get("nombre_gp"), row.get("anio_temporada"), row.get("fecha_carrera"))
+
+
+def parse_race_time_ms(value: Optional[str]) -> Optional[int]:
+    """Convierte un tiempo "H:MM:SS.mmm" (o "M:SS.mmm") en milisegundos. None si no es un tiempo."""
+    value = (value or "").strip()
+    if not RACE_TIME_REGEX.match(value):
+        return None
+
+    *parts, seconds = value.split(":")
+    seconds, _, fraction = seconds.partition(".")
+    total = 0
+    for part in parts:
+        total = total * 60 + int(part)
+    return (total * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, "0") or 0)
+
+
+def parse_position(value: Optional[str]) -> Optional[int]:
+    """Posición final como entero. None para "DNF", "DSQ" y demás posiciones sin número."""
+    value = (value or "").strip()
+    return int(value) if value.isdigit() else None
+
+
+def build_formula_result_row(row: dict, dataset_id: int) -> dict:
+    """Convierte una fila del CSV en los valores de una fila de formula_result."""
+    # Conversiones seguras para números
+    try:
+        puntos = float(row.get("puntos_obtenidos", 0.0))
+    except (TypeError, ValueError):
+        puntos = 0.0
+
+    try:
+        vueltas = int(row.get("vueltas_completadas", 0))
+    except (TypeError, ValueError):
+        vueltas = 0
+
+    return {
+        "dataset_id": dataset_id,
+        "piloto_nombre": (row.get("piloto_nombre") or "").strip(),
+        "equipo": row.get("equipo"),
+        "motor": row.get("motor"),
+        "posicion_final": row.get("posicion_final"),
+        "posicion_numero": parse_position(row.get("posicion_final")),
+        "puntos_obtenidos": puntos,
+        "tiempo_carrera": row.get("tiempo_carrera"),
+        "tiempo_carrera_ms": parse_race_time_ms(row.get("tiempo_carrera")),
+        "vueltas_completadas": vueltas,
+        "estado_carrera": row.get("estado_carrera"),
+    }
 
 
 class DataSetService(BaseService):
@@ -58,10 +181,31 @@ class DataSetService(BaseService):
         self.hubfilerepository = HubfileRepository()
         self.dsviewrecord_repository = DSViewRecordRepository()
         self.hubfileviewrecord_repository = HubfileViewRecordRepository()
+        self.formula_result_repository = FormulaResultRepository()
+        self.content_blob_service = ContentBlobService()
         self.dataset_recommender_service = DatasetRecommenderService(
             dataset_repository=self.repository, ds_download_repository=self.dsdownloadrecord_repository
         )
 
+    def get_for_bulk_download(self, dataset_ids: Optional[List[int]] = None, criteria: Optional[dict] = None):
+        """Datasets de una descarga conjunta: los ids pedidos o el resultado de una búsqueda de Explore."""
+        if dataset_ids:
+            if len(dataset_ids) > MAX_BULK_DOWNLOAD_DATASETS:
+                raise BulkDownloadError(f"At most {MAX_BULK_DOWNLOAD_DATASETS} datasets can be downloaded at once")
+            return self.repository.get_by_ids(dataset_ids)
+
+        if criteria is not None:
+            if not isinstance(criteria, dict):
+                raise BulkDownloadError("The query must be an object with Explore criteria")
+            datasets = ExploreService().filter(**criteria)
+            if len(datasets) > MAX_BULK_DOWNLOAD_DATASETS:
+                raise BulkDownloadError(
+                    f"The query matches {len(datasets)} datasets, at most {MAX_BULK_DOWNLOAD_DATASETS} are allowed"
+                )
+            return datasets
+
+        raise BulkDownloadError("Provide dataset ids or an Explore query")
+
     def save_dataset_recommendations(self, dataset: DataSet):
         """Calcula las recomendaciones y las guarda en el objeto DataSet."""
 
@@ -98,9 +242,9 @@ class DataSetService(BaseService):
         # self.save_dataset_recommendations(dataset)
         # return dataset.recommended_datasets_json
 
-    def move_feature_models(self, dataset: DataSet):
-        current_user = AuthenticationService().get_authenticated_user()
-        source_dir = current_user.temp_folder()
+    def move_feature_models(self, dataset: DataSet, current_user=None, source_dir: Optional[str] = None):
+        current_user = current_user or AuthenticationService().get_authenticated_user()
+        source_dir = source_dir or current_user.temp_folder()
 
         working_dir = os.getenv("WORKING_DIR", "")
         dest_dir = os.path.join(working_dir, "uploads", f"user_{current_user.id}", f"dataset_{dataset.id}")
@@ -109,7 +253,14 @@ class DataSetService(BaseService):
 
         for feature_model in dataset.feature_models:
             uvl_filename = feature_model.fm_meta_data.uvl_filename
-            shutil.move(os.path.join(source_dir, uvl_filename), dest_dir)
+            source_path = os.path.join(source_dir, uvl_filename)
+            blobs = [file.blob for file in feature_model.files if file.name == uvl_filename and file.blob]
+            if blobs:
+                # El contenido ya está en el almacén de blobs: se enlaza en vez de guardar otra copia
+                self.content_blob_service.link(blobs[0], os.path.join(dest_dir, uvl_filename))
+                os.remove(source_path)
+            else:
+                shutil.move(source_path, dest_dir)
 
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return self.repository.get_synchronized(current_user_id)
@@ -141,63 +292,44 @@ class DataSetService(BaseService):
     def total_dataset_views(self) -> int:
         return self.dsviewrecord_repository.total_dataset_views()
 
-    # def create_from_form(self, form, current_user) -> DataSet:
-    #     main_author = {
-    #         "name": f"{current_user.profile.surname}, {current_user.profile.name}",
-    #         "affiliation": current_user.profile.affiliation,
-    #         "orcid": current_user.profile.orcid,
-    #     }
-    #     try:
-    #         logger.info(f"Creating dsmetadata...: {form.get_dsmetadata()}")
-
-    #         dsmetadata = self.dsmetadata_repository.create(**form.get_dsmetadata())
-    #         for author_data in [main_author] + form.get_authors():
-    #             author = self.author_repository.create(commit=False, ds_meta_data_id=dsmetadata.id, **author_data)
-    #             dsmetadata.authors.append(author)
-
-    #         dataset = self.create(commit=False, user_id=current_user.id, ds_meta_data_id=dsmetadata.id)
-
-    #         for feature_model in form.feature_models:
-    #             uvl_filename = feature_model.uvl_filename.data
-    #             fmmetadata = self.fmmetadata_repository.create(commit=False, **feature_model.get_fmmetadata())
-    #             for author_data in feature_model.get_authors():
-    #                 author = self.author_repository.create(commit=False, fm_meta_data_id=fmmetadata.id, **author_data)
-    #                 fmmetadata.authors.append(author)
-
-    #             fm = self.feature_model_repository.create(
-    #                 commit=False, data_set_id=dataset.id, fm_meta_data_id=fmmetadata.id
-    #             )
-
-    #             # associated files in feature model
-    #             file_path = os.path.join(current_user.temp_folder(), uvl_filename)
-    #             checksum, size = calculate_checksum_and_size(file_path)
-
-    #             file = self.hubfilerepository.create(
-    #                 commit=False, name=uvl_filename, checksum=checksum, size=size, feature_model_id=fm.id
-    #             )
-    #             fm.files.append(file)
-    #         self.repository.session.commit()
-    #     except Exception as exc:
-    #         logger.info(f"Exception creating dataset from form...: {exc}")
-    #         self.repository.session.rollback()
-    #         raise exc
-    #   return dataset
-
-    def create_from_form(self, form, current_user) -> DataSet:
+    def create_dsmetadata_with_authors(self, form, current_user, **overrides) -> DSMetaData:
+        """Crea (sin commit) los metadatos comunes del dataset con el usuario actual como autor principal."""
         main_author = {
             "name": f"{current_user.profile.surname}, {current_user.profile.name}",
             "affiliation": current_user.profile.affiliation,
             "orcid": current_user.profile.orcid,
         }
 
+        dsmetadata = self.dsmetadata_repository.create(commit=False, **{**form.get_dsmetadata(), **overrides})
+        for author_data in [main_author] + form.get_authors():
+            author = self.author_repository.create(commit=False, ds_meta_data_id=dsmetadata.id, **author_data)
+            dsmetadata.authors.append(author)
+
+        return dsmetadata
+
+    def validate_formula_csv(self, csv_file, single_race: bool = False):
+        """Valida el CSV subido antes de abrir ninguna transacción y deja el stream al principio."""
+        report = FormulaCSVValidator(single_race=single_race).validate_stream(csv_file.stream)
+        csv_file.stream.seek(0)
+        if not report.is_valid:
+            raise FormulaCSVValidationError(report)
+        return report
+
+    def create_from_form(self, form, current_user, source_dir: Optional[str] = None) -> DataSet:
+        known_dataset = None
+        if isinstance(form, FormulaDataSetForm):
+            # Si ya se procesó un CSV idéntico (búsqueda por checksum indexado) no se vuelve a validar ni parsear
+            csv_checksum, _ = sha256_stream(form.csv_file.data.stream)
+            known_dataset = self.formula_result_repository.get_dataset_by_csv_checksum(csv_checksum)
+            if known_dataset is None:
+                # Sin separar por carrera todo el CSV es un único dataset: una sola carrera
+                self.validate_formula_csv(form.csv_file.data, single_race=True)
+
         try:
             logger.info(f"Creating dsmetadata...: {form.get_dsmetadata()}")
 
             # 1. Crear Metadatos Comunes (DSMetaData)
-            dsmetadata = self.dsmetadata_repository.create(**form.get_dsmetadata())
-            for author_data in [main_author] + form.get_authors():
-                author = self.author_repository.create(commit=False, ds_meta_data_id=dsmetadata.id, **author_data)
-                dsmetadata.authors.append(author)
+            dsmetadata = self.create_dsmetadata_with_authors(form, current_user)
 
             dataset = None
 
@@ -224,77 +356,63 @@ class DataSetService(BaseService):
                     )
 
                     # associated files in feature model
-                    file_path = os.path.join(current_user.temp_folder(), uvl_filename)
-                    checksum, size = calculate_checksum_and_size(file_path)
+                    file_path = os.path.join(source_dir or current_user.temp_folder(), uvl_filename)
+                    blob = self.content_blob_service.store_file(file_path)
 
                     file = self.hubfilerepository.create(
-                        commit=False, name=uvl_filename, checksum=checksum, size=size, feature_model_id=fm.id
+                        commit=False,
+                        name=uvl_filename,
+                        checksum=blob.checksum,
+                        size=blob.size,
+                        feature_model_id=fm.id,
+                        blob_id=blob.id,
                     )
                     fm.files.append(file)
 
             # -----------------------------------------------------------
             # CASO B: DATASET FÓRMULA 1 (Nueva Lógica CSV)
             # -----------------------------------------------------------
+            elif isinstance(form, FormulaDataSetForm) and known_dataset is not None:
+                dataset = FormulaDataSet(
+                    user_id=current_user.id,
+                    ds_meta_data_id=dsmetadata.id,
+                    nombre_gp=known_dataset.nombre_gp,
+                    anio_temporada=known_dataset.anio_temporada,
+                    fecha_carrera=known_dataset.fecha_carrera,
+                    circuito=known_dataset.circuito,
+                    csv_checksum=csv_checksum,
+                )
+                self.repository.session.add(dataset)
+                self.repository.session.flush()
+
+                copied = self.formula_result_repository.copy_results(known_dataset.id, dataset.id)
+                logger.info(f"CSV already ingested as dataset {known_dataset.id}, copied {copied} results")
+
             elif isinstance(form, FormulaDataSetForm):
                 # Obtener archivo del formulario
                 csv_file = form.csv_file.data
 
-                # Leer el stream del archivo como texto (utf-8)
-                stream = io.TextIOWrapper(csv_file.stream, encoding="utf-8")
+                # Leer el stream del archivo como texto (utf-8) sin cargarlo entero en memoria
+                stream = io.TextIOWrapper(csv_file.stream, encoding="utf-8", newline="")
                 csv_reader = csv.DictReader(stream)
 
-                # Convertir a lista para procesar
-                rows = list(csv_reader)
+                # Usamos la primera fila para los datos globales del Gran Premio
+                first_row = next(csv_reader, None)
 
-                if not rows:
+                if first_row is None:
                     raise Exception("El archivo CSV está vacío o no es válido.")
 
-                # Usamos la primera fila para los datos globales del Gran Premio
-                first_row = rows[0]
-
                 # Crear el dataset específico de Fórmula 1
                 dataset = FormulaDataSet(
                     user_id=current_user.id,
                     ds_meta_data_id=dsmetadata.id,
-                    # Mapeo de columnas CSV a Modelo
-                    nombre_gp=first_row.get("nombre_gp", "Desconocido"),
-                    anio_temporada=int(first_row.get("anio_temporada", datetime.now().year)),
-                    # Manejo de fecha seguro
-                    fecha_carrera=(
-                        datetime.strptime(first_row.get("fecha_carrera"), "%Y-%m-%d").date()
-                        if first_row.get("fecha_carrera")
-                        else datetime.now().date()
-                    ),
-                    circuito=first_row.get("circuito", "Desconocido"),
+                    csv_checksum=csv_checksum,
+                    **formula_race_fields(first_row),
                 )
                 self.repository.session.add(dataset)
                 self.repository.session.flush()  # Obtener ID
 
-                # Iterar filas para crear los resultados de cada piloto
-                for row in rows:
-                    # Conversiones seguras para números
-                    try:
-                        puntos = float(row.get("puntos_obtenidos", 0.0))
-                    except ValueError:
-                        puntos = 0.0
-
-                    try:
-                        vueltas = int(row.get("vueltas_completadas", 0))
-                    except ValueError:
-                        vueltas = 0
-
-                    result = FormulaResult(
-                        dataset_id=dataset.id,
-                        piloto_nombre=row.get("piloto_nombre"),
-                        equipo=row.get("equipo"),
-                        motor=row.get("motor"),
-                        posicion_final=row.get("posicion_final"),
-                        puntos_obtenidos=puntos,
-                        tiempo_carrera=row.get("tiempo_carrera"),
-                        vueltas_completadas=vueltas,
-                        estado_carrera=row.get("estado_carrera"),
-                    )
-                    self.repository.session.add(result)
+                self.insert_formula_results(dataset, chain([first_row], csv_reader))
 
             # Confirmar transacción
             self.repository.session.commit()
@@ -304,14 +422,91 @@ class DataSetService(BaseService):
             self.repository.session.rollback()
             raise exc
 
+        send_dataset_changed(dataset.id, dataset.dataset_type, "created")
         return dataset
 
+    def create_season_from_form(self, form, current_user) -> List[FormulaDataSet]:
+        """
+        Crea un FormulaDataSet por cada carrera presente en el CSV (temporada completa).
+
+        Las filas se agrupan por (nombre_gp, anio_temporada, fecha_carrera) en una sola pasada
+        sobre el fichero: cada carrera nueva crea su dataset al aparecer y sus filas se acumulan
+        en un buffer que se vuelca con executemany al llegar a FORMULA_CSV_CHUNK_SIZE. Todas las
+        carreras se confirman juntas en un único commit.
+        """
+        self.validate_formula_csv(form.csv_file.data)
+
+        try:
+            csv_file = form.csv_file.data
+            stream = io.TextIOWrapper(csv_file.stream, encoding="utf-8", newline="")
+            csv_reader = csv.DictReader(stream)
+
+            datasets = {}
+            buffers = {}
+
+            for row in csv_reader:
+                key = formula_race_key(row)
+
+                if key not in datasets:
+                    race = formula_race_fields(row)
+                    title = form.get_dsmetadata()["title"]
+                    dsmetadata = self.create_dsmetadata_with_authors(
+                        form,
+                        current_user,
+                        title=f"{title} - {race['nombre_gp']} {race['anio_temporada']}"[:120],
+                    )
+                    dataset = FormulaDataSet(user_id=current_user.id, ds_meta_data_id=dsmetadata.id, **race)
+                    self.repository.session.add(dataset)
+                    self.repository.session.flush()  # Obtener ID
+
+                    datasets[key] = dataset
+                    buffers[key] = []
+
+                buffers[key].append(row)
+                if len(buffers[key]) >= FORMULA_CSV_CHUNK_SIZE:
+                    self.insert_formula_results(datasets[key], buffers[key])
+                    buffers[key] = []
+
+            if not datasets:
+                raise Exception("El archivo CSV está vacío o no es válido.")
+
+            for key, rows in buffers.items():
+                self.insert_formula_results(datasets[key], rows)
+
+            self.repository.session.commit()
+
+        except Exception as exc:
+            logger.info(f"Exception creating season datasets from form...: {exc}")
+            self.repository.session.rollback()
+            raise exc
+
+        logger.info(f"Created {len(datasets)} race datasets from one season upload")
+        for dataset in datasets.values():
+            send_dataset_changed(dataset.id, dataset.dataset_type, "created")
+        return list(datasets.values())
+
+    def insert_formula_results(self, dataset: FormulaDataSet, rows: Iterable[dict]) -> int:
+        """
+        Inserta los resultados de una carrera por bloques de FORMULA_CSV_CHUNK_SIZE filas.
+
+        Cada bloque se escribe con un executemany dentro de la transacción en curso, así que la
+        memoria usada no depende del tamaño del fichero. El commit lo hace quien llama.
+        """
+        inserted = 0
+        for chunk in iter_chunks(rows):
+            inserted += self.formula_result_repository.bulk_insert(
+                [build_formula_result_row(row, dataset.id) for row in chunk]
+            )
+        logger.info(f"Inserted {inserted} formula results for dataset {dataset.id}")
+        return inserted
+
     def update_dsmetadata(self, id, **kwargs):
-        return self.dsmetadata_repository.update(id, **kwargs)
+        ds_meta_data = self.dsmetadata_repository.update(id, **kwargs)
+        self.repository.touch(ds_meta_data_id=id)
+        return ds_meta_data
 
     def get_uvlhub_doi(self, dataset: DataSet) -> str:
-        domain = os.getenv("DOMAIN", "localhost")
-        return f"http://{domain}/doi/{dataset.ds_meta_data.dataset_doi}"
+        return uvlhub_doi_url(dataset.ds_meta_data.dataset_doi)
 
 
 class AuthorService(BaseService):
@@ -323,6 +518,21 @@ class DSDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(DSDownloadRecordRepository())
 
+    def record_download(self, dataset_id: int, user_id: Optional[int], download_cookie: str):
+        self.record_bulk(user_id, download_cookie, [dataset_id])
+
+    def record_bulk(self, user_id: Optional[int], download_cookie: str, dataset_ids: List[int]):
+        """
+        Registra las descargas sin consultar si ya existían: se escriben en diferido y la clave
+        única (dataset, cookie, usuario) descarta las repetidas.
+        """
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"user_id": user_id, "dataset_id": dataset_id, "download_date": now, "download_cookie": download_cookie}
+            for dataset_id in dict.fromkeys(dataset_ids)
+        ]
+        record_manager.record_many(DSDownloadRecord, rows, key=DOWNLOAD_RECORD_KEY)
+
 
 class DSMetaDataService(BaseService):
     def __init__(self):
@@ -335,15 +545,94 @@ class DSMetaDataService(BaseService):
         return self.repository.filter_by_doi(doi)
 
 
-class DSViewRecordService(BaseService):
+def visitor_key(row: dict) -> str:
+    """Identidad de un visitante: el usuario si ha iniciado sesión y, si no, la cookie."""
+    if row.get("user_id"):
+        return f"user:{row['user_id']}"
+    return f"cookie:{row.get('view_cookie')}"
+
+
+def sketch_periods_between(start: date, end: date) -> List[str]:
+    """Periodos que cubren [start, end]: los meses completos con su sketch mensual y el resto por días."""
+    periods = []
+    day = start
+    while day <= end:
+        next_month = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+        if day.day == 1 and next_month - timedelta(days=1) <= end:
+            periods.append(day.strftime("%Y-%m"))
+            day = next_month
+        else:
+            periods.append(day.isoformat())
+            day += timedelta(days=1)
+    return periods
+
+
+class UniqueVisitorsService(BaseService):
+    """Visitantes distintos de datasets y ficheros, estimados con sketches HyperLogLog por día, mes y total."""
+
+    OBJECT_COLUMNS = {"dataset": "dataset_id", "file": "file_id"}
+
     def __init__(self):
-        super().__init__(DSViewRecordRepository())
+        super().__init__(ViewSketchRepository())
+
+    def add_views(self, object_type: str, rows: List[dict]):
+        column = self.OBJECT_COLUMNS[object_type]
+        sketches = {}
+        for row in rows:
+            viewed = (row.get("view_date") or datetime.now(timezone.utc)).date()
+            for object_id in (row[column], 0):
+                for period in (viewed.isoformat(), viewed.strftime("%Y-%m"), "all"):
+                    sketches.setdefault((object_type, object_id, period), HyperLogLog()).add(visitor_key(row))
+        self.repository.merge(sketches)
+
+    def unique_visitors(
+        self, object_type: str, object_id: int = 0, since: Optional[date] = None, until: Optional[date] = None
+    ) -> int:
+        """Visitantes distintos de un objeto (o de todos con object_id 0), en total o entre dos días."""
+        if since is None:
+            periods = ["all"]
+        else:
+            periods = sketch_periods_between(since, until or datetime.now(timezone.utc).date())
+        sketch = HyperLogLog()
+        for registers in self.repository.get_registers(object_type, object_id, periods):
+            sketch.merge(HyperLogLog.from_bytes(registers))
+        return sketch.count()
+
+    def rebuild(self, batch_size: int = 5000) -> int:
+        """Reconstruye todos los sketches a partir de los registros de visitas guardados."""
+        self.repository.clear()
+        replayed = 0
+        for object_type, record_model in (("dataset", DSViewRecord), ("file", HubfileViewRecord)):
+            last_id = 0
+            while True:
+                rows = self.repository.view_rows(record_model, last_id, batch_size)
+                if not rows:
+                    break
+                self.add_views(object_type, rows)
+                last_id = rows[-1]["id"]
+                replayed += len(rows)
+        return replayed
+
+
+unique_visitors_service = UniqueVisitorsService()
+record_manager.add_flush_hook(DSViewRecord, lambda rows, inserted: unique_visitors_service.add_views("dataset", rows))
+record_manager.add_flush_hook(HubfileViewRecord, lambda rows, inserted: unique_visitors_service.add_views("file", rows))
 
-    def the_record_exists(self, dataset: DataSet, user_cookie: str):
-        return self.repository.the_record_exists(dataset, user_cookie)
 
-    def create_new_record(self, dataset: DataSet, user_cookie: str) -> DSViewRecord:
-        return self.repository.create_new_record(dataset, user_cookie)
+class DailyStatsService(BaseService):
+    """Consolidación de los registros de visitas y descargas en los contadores diarios."""
+
+    def __init__(self):
+        super().__init__(DatasetDailyStatsRepository())
+        self.file_stats_repository = HubfileDailyStatsRepository()
+
+    def roll_up(self) -> dict:
+        return {"datasets": self.repository.roll_up(), "files": self.file_stats_repository.roll_up()}
+
+
+class DSViewRecordService(BaseService):
+    def __init__(self):
+        super().__init__(DSViewRecordRepository())
 
     def create_cookie(self, dataset: DataSet) -> str:
 
@@ -351,10 +640,19 @@ class DSViewRecordService(BaseService):
         if not user_cookie:
             user_cookie = str(uuid.uuid4())
 
-        existing_record = self.the_record_exists(dataset=dataset, user_cookie=user_cookie)
-
-        if not existing_record:
-            self.create_new_record(dataset=dataset, user_cookie=user_cookie)
+        user = AuthenticationService().get_authenticated_user()
+
+        # Sin consultar si ya existía: la visita repetida la descarta la clave única al escribirla
+        record_manager.record(
+            DSViewRecord,
+            {
+                "user_id": user.id if user else None,
+                "dataset_id": dataset.id,
+                "view_date": datetime.now(timezone.utc),
+                "view_cookie": user_cookie,
+            },
+            key=VIEW_RECORD_KEY,
+        )
 
         return user_cookie
 
@@ -390,3 +688,15 @@ class SizeService:
             return f"{round(size / (1024 ** 2), 2)} MB"
         else:
             return f"{round(size / (1024 ** 3), 2)} GB"
+
+
+def _on_dataset_changed(sender, dataset_id, dataset_type, action, **kwargs):
+    # Los cambios que no tocan la fila del dataset (resultados de Fórmula) también cambian su versión
+    if action == "updated":
+        try:
+            DataSetRepository().touch(dataset_id=dataset_id)
+        except Exception as exc:
+            logger.exception(f"Error touching dataset {dataset_id}: {exc}")
+
+
+dataset_changed.connect(_on_dataset_changed)
@@ -0,0 +1,16 @@
+from blinker import Namespace
+from flask import current_app
+
+_signals = Namespace()
+
+# Se emite después del commit de cualquier alta, cambio o baja de un dataset.
+# Argumentos: dataset_id, dataset_type ("uvl", "formula", ...) y action ("created", "updated", "deleted",
+# o "published" cuando termina la publicación en Zenodo y el dataset ya tiene DOI).
+dataset_changed = _signals.signal("dataset-changed")
+
+
+def send_dataset_changed(dataset_id: int, dataset_type: str, action: str):
+    """Notifica a los suscriptores (cachés, snapshots, índices) que un dataset ha cambiado."""
+    dataset_changed.send(
+        current_app._get_current_object(), dataset_id=dataset_id, dataset_type=dataset_type, action=action
+    )
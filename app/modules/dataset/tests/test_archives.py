@@ -0,0 +1,152 @@
+import io
+import os
+import threading
+import time
+import tracemalloc
+import zipfile
+from unittest.mock import MagicMock
+
+from app.modules.dataset.archives import (
+    DatasetArchiveCache,
+    compress_type_for,
+    iter_dataset_entries,
+    iter_directory_entries,
+    manifest_hash,
+    stream_zip,
+)
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def test_stream_zip_produces_valid_archive(tmp_path):
+    write(str(tmp_path / "model.uvl"), b"features\n  Root\n" * 1000)
+    write(str(tmp_path / "images" / "cover.png"), os.urandom(4096))
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(iter_directory_entries(str(tmp_path), "dataset_1")))))
+
+    assert archive.testzip() is None
+    assert sorted(archive.namelist()) == ["dataset_1/images/cover.png", "dataset_1/model.uvl"]
+    assert archive.getinfo("dataset_1/model.uvl").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo("dataset_1/images/cover.png").compress_type == zipfile.ZIP_STORED
+    assert archive.read("dataset_1/model.uvl") == b"features\n  Root\n" * 1000
+
+
+def test_stream_zip_yields_before_reading_every_file(tmp_path):
+    for index in range(3):
+        write(str(tmp_path / f"file_{index}.png"), os.urandom(64 * 1024))
+
+    opened = []
+
+    def entries():
+        for path, arcname in iter_directory_entries(str(tmp_path), "dataset_1"):
+            opened.append(path)
+            yield path, arcname
+
+    chunks = stream_zip(entries(), chunk_size=16 * 1024)
+    first = next(chunks)
+
+    assert first.startswith(b"PK")
+    assert len(opened) == 1
+
+
+def test_stream_zip_memory_does_not_grow_with_size(tmp_path):
+    write(str(tmp_path / "big.png"), os.urandom(8 * 1024 * 1024))
+
+    tracemalloc.start()
+    total = sum(len(chunk) for chunk in stream_zip(iter_directory_entries(str(tmp_path), "d"), chunk_size=256 * 1024))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert total > 8 * 1024 * 1024
+    assert peak < 2 * 1024 * 1024
+
+
+def test_iter_dataset_entries_uses_dataset_folder():
+    dataset = MagicMock(id=4, user_id=2)
+
+    assert list(iter_dataset_entries(dataset)) == []
+    assert compress_type_for("photo.JPG") == zipfile.ZIP_STORED
+    assert compress_type_for("results.csv") == zipfile.ZIP_DEFLATED
+
+
+def make_cache(tmp_path, budget=None):
+    cache = DatasetArchiveCache(directory=str(tmp_path / "cache"), budget=budget)
+    cache.hubfile_repository = MagicMock()
+    cache.hubfile_repository.get_checksums_by_dataset.return_value = {}
+    return cache
+
+
+def test_manifest_hash_uses_checksums_and_changes_with_files(tmp_path):
+    write(str(tmp_path / "model.uvl"), b"features")
+    entries = list(iter_directory_entries(str(tmp_path), "dataset_1"))
+
+    first = manifest_hash(entries, {"model.uvl": "abc"})
+
+    assert manifest_hash(entries, {"model.uvl": "abc"}) == first
+    assert manifest_hash(entries, {"model.uvl": "def"}) != first
+
+
+def test_archive_cache_builds_once_and_replaces_old_versions(tmp_path, monkeypatch):
+    write(str(tmp_path / "data" / "model.uvl"), b"features")
+    entries = list(iter_directory_entries(str(tmp_path / "data"), "dataset_1"))
+    cache = make_cache(tmp_path)
+    builds = MagicMock(side_effect=stream_zip)
+    monkeypatch.setattr("app.modules.dataset.archives.stream_zip", builds)
+
+    path = cache.get_or_build(1, "v1", entries)
+    assert cache.get_or_build(1, "v1", entries) == path
+    assert builds.call_count == 1
+    assert zipfile.ZipFile(path).namelist() == ["dataset_1/model.uvl"]
+
+    new_path = cache.get_or_build(1, "v2", entries)
+    assert not os.path.exists(path)
+    assert os.path.exists(new_path)
+
+    cache.remove_dataset(1)
+    assert not os.path.exists(new_path)
+
+
+def test_archive_cache_coalesces_concurrent_builds(tmp_path, monkeypatch):
+    write(str(tmp_path / "data" / "model.uvl"), b"features")
+    entries = list(iter_directory_entries(str(tmp_path / "data"), "dataset_1"))
+    cache = make_cache(tmp_path)
+    building = threading.Event()
+
+    def slow_stream_zip(archive_entries):
+        building.set()
+        time.sleep(0.2)
+        yield from stream_zip(archive_entries)
+
+    builds = MagicMock(side_effect=slow_stream_zip)
+    monkeypatch.setattr("app.modules.dataset.archives.stream_zip", builds)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_build(1, "v1", entries))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert builds.call_count == 1
+    assert len(set(results)) == 1
+
+
+def test_archive_cache_evicts_least_recently_used(tmp_path):
+    write(str(tmp_path / "data" / "image.png"), os.urandom(10000))
+    entries = list(iter_directory_entries(str(tmp_path / "data"), "d"))
+    cache = make_cache(tmp_path, budget=25000)
+
+    first = cache.get_or_build(1, "a", entries)
+    second = cache.get_or_build(2, "a", entries)
+    os.utime(first, ns=(1, 1))
+    os.utime(second, ns=(2, 2))
+    cache.get_or_build(1, "a", entries)  # Acierto: pasa a ser el más reciente
+    third = cache.get_or_build(3, "a", entries)
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert os.path.exists(third)
@@ -0,0 +1,75 @@
+import io
+import zipfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.modules.dataset.archives import iter_bulk_entries, stream_zip
+from app.modules.dataset.models import DSDownloadRecord
+from app.modules.dataset.services import (
+    MAX_BULK_DOWNLOAD_DATASETS,
+    BulkDownloadError,
+    DataSetService,
+    DSDownloadRecordService,
+    parse_dataset_ids,
+)
+
+
+def test_parse_dataset_ids():
+    assert parse_dataset_ids(["3,1", "2", "3"]) == [3, 1, 2]
+    assert parse_dataset_ids([4, 5]) == [4, 5]
+    assert parse_dataset_ids("7") == [7]
+    assert parse_dataset_ids(None) == []
+
+    with pytest.raises(BulkDownloadError):
+        parse_dataset_ids(["1,dos"])
+
+
+def test_bulk_archive_has_one_directory_per_dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for dataset_id, name in [(1, "race.csv"), (2, "model.uvl")]:
+        folder = tmp_path / "uploads" / "user_9" / f"dataset_{dataset_id}"
+        folder.mkdir(parents=True)
+        (folder / name).write_bytes(b"data")
+    datasets = [MagicMock(id=1, user_id=9), MagicMock(id=2, user_id=9)]
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(iter_bulk_entries(datasets)))))
+
+    assert archive.namelist() == ["dataset_1/race.csv", "dataset_2/model.uvl"]
+
+
+def test_get_for_bulk_download_by_ids_and_limit():
+    service = DataSetService()
+    service.repository = MagicMock()
+
+    service.get_for_bulk_download(dataset_ids=[2, 1])
+    service.repository.get_by_ids.assert_called_once_with([2, 1])
+
+    with pytest.raises(BulkDownloadError):
+        service.get_for_bulk_download(dataset_ids=list(range(MAX_BULK_DOWNLOAD_DATASETS + 1)))
+    with pytest.raises(BulkDownloadError):
+        service.get_for_bulk_download()
+
+
+def test_get_for_bulk_download_by_explore_query(monkeypatch):
+    explore = MagicMock()
+    explore.return_value.filter.return_value = ["a", "b"]
+    monkeypatch.setattr("app.modules.dataset.services.ExploreService", explore)
+
+    datasets = DataSetService().get_for_bulk_download(criteria={"query": "monaco", "sorting": "oldest"})
+
+    assert datasets == ["a", "b"]
+    explore.return_value.filter.assert_called_once_with(query="monaco", sorting="oldest")
+
+
+def test_record_bulk_enqueues_one_record_per_dataset(monkeypatch):
+    recorder = MagicMock()
+    monkeypatch.setattr("app.modules.dataset.services.record_manager", recorder)
+
+    DSDownloadRecordService().record_bulk(None, "cookie", [1, 3, 1])
+
+    model, rows = recorder.record_many.call_args.args
+    assert model is DSDownloadRecord
+    assert [row["dataset_id"] for row in rows] == [1, 3]
+    assert all(row["download_cookie"] == "cookie" and row["user_id"] is None for row in rows)
+    assert recorder.record_many.call_args.kwargs["key"] == ("dataset_id", "download_cookie", "user_id")
@@ -0,0 +1,93 @@
+import glob
+import io
+import os
+
+import pytest
+
+from app.modules.dataset.validators import FormulaCSVValidator
+
+HEADER = (
+    "nombre_gp,anio_temporada,fecha_carrera,circuito,piloto_nombre,equipo,motor,"
+    "posicion_final,puntos_obtenidos,tiempo_carrera,vueltas_completadas,estado_carrera"
+)
+VALID_ROW = 'GP España,2024,2024-06-23,Montmeló,Max Verstappen,Red Bull,Honda,1,25.0,"1:35:48.333",66,Terminado'
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "formula_csv_examples")
+
+
+def validate(*lines):
+    return FormulaCSVValidator().validate_stream(io.BytesIO("\n".join(lines).encode("utf-8")))
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.csv"))))
+def test_bundled_examples_are_valid(path):
+    report = FormulaCSVValidator().validate_file(path)
+
+    assert report.is_valid, report.errors
+
+
+def test_missing_columns_are_reported():
+    report = validate("nombre_gp,anio_temporada", "GP,2024")
+
+    assert not report.is_valid
+    assert "piloto_nombre" in report.missing_columns
+
+
+def test_row_level_errors_point_to_row_and_column():
+    report = validate(
+        HEADER,
+        VALID_ROW,
+        'GP España,2024,2024-13-23,Montmeló,Lando Norris,McLaren,Mercedes,P2,-3,"1:35:48.653",66,Terminado',
+    )
+
+    errors = {(error["row"], error["column"]) for error in report.errors}
+    assert errors == {(3, "fecha_carrera"), (3, "posicion_final"), (3, "puntos_obtenidos")}
+
+
+def test_duplicated_driver_and_season_mismatch():
+    report = validate(
+        HEADER,
+        VALID_ROW,
+        VALID_ROW,
+        'GP Abu Dhabi,2024,2025-12-07,Yas Marina,Max Verstappen,Red Bull,Honda,1,25.0,"1:26:07.469",58,Terminado',
+    )
+
+    assert [(e["row"], e["column"]) for e in report.errors] == [(3, "piloto_nombre"), (4, "fecha_carrera")]
+
+
+def test_duplicated_driver_ignores_case_and_surrounding_spaces():
+    # La clave única de formula_result compara así los nombres: el CSV no debe pasar la validación y fallar al insertar
+    report = validate(HEADER, VALID_ROW, VALID_ROW.replace("Max Verstappen", "max verstappen "))
+
+    assert not report.is_valid
+    assert [(e["row"], e["column"], e["value"]) for e in report.errors] == [(3, "piloto_nombre", "max verstappen")]
+
+
+def test_short_rows_are_reported_without_shifting_row_numbers():
+    report = validate(HEADER, "GP España,2024", VALID_ROW.replace("25.0", "x"))
+
+    assert [(e["row"], e["column"]) for e in report.errors] == [(2, ""), (3, "puntos_obtenidos")]
+    assert report.rows == 2
+
+
+def test_column_statistics():
+    report = validate(HEADER, VALID_ROW, VALID_ROW.replace("Max Verstappen", "Checo Perez").replace("25.0", "18.0"))
+
+    assert report.is_valid
+    assert report.stats["puntos_obtenidos"] == {"nulls": 0, "distinct": 2, "min": 18.0, "max": 25.0, "mean": 21.5}
+    assert report.stats["piloto_nombre"] == {"nulls": 0, "distinct": 2}
+
+
+def test_empty_file_is_not_valid():
+    assert not validate(HEADER).is_valid
+
+
+def test_single_race_mode_rejects_whole_seasons():
+    other_race = VALID_ROW.replace("GP España", "GP Austria").replace("2024-06-23", "2024-06-30")
+
+    assert validate(HEADER, VALID_ROW, other_race).races == 2
+    report = FormulaCSVValidator(single_race=True).validate_stream(
+        io.BytesIO("\n".join([HEADER, VALID_ROW, other_race]).encode("utf-8"))
+    )
+
+    assert not report.is_valid
+    assert [(e["row"], e["column"]) for e in report.errors] == [(3, "nombre_gp")]
@@ -0,0 +1,86 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import mysql
+
+from app.modules.dataset.jobs import DatasetJobWorker
+from app.modules.dataset.repositories import DatasetDailyStatsRepository
+
+
+def make_repository(*results):
+    repository = DatasetDailyStatsRepository()
+    repository.session = MagicMock()
+    repository.session.execute.side_effect = list(results)
+    return repository
+
+
+def sql(statement):
+    return str(statement.compile(dialect=mysql.dialect()))
+
+
+def test_counts_add_consolidated_and_pending_records():
+    watermark = MagicMock(**{"scalar.return_value": 40})
+    repository = make_repository(watermark, [(1, 10), (2, 3)], [(2, 1), (5, 2)])
+
+    counts = repository.counts("downloads", [1, 2, 5])
+
+    assert counts == {1: 10, 2: 4, 5: 2}
+    statements = [sql(call.args[0]) for call in repository.session.execute.call_args_list]
+    assert "FROM dataset_daily_stats" in statements[1]
+    assert "ds_download_record.id > " in statements[2]
+
+
+def test_total_reads_rollup_and_pending_tail():
+    repository = make_repository(
+        MagicMock(**{"scalar.return_value": 120}),
+        MagicMock(**{"scalar.return_value": 40}),
+        MagicMock(**{"scalar.return_value": 3}),
+    )
+
+    assert repository.total("views") == 123
+
+
+def test_roll_up_upserts_new_records_and_moves_watermark():
+    scalar = lambda value: MagicMock(**{"scalar.return_value": value})  # noqa: E731
+    repository = make_repository(None, scalar(40), scalar(55), None, scalar(15), None)
+
+    rolled = repository._roll_up_source("views", datetime(2026, 10, 17, 12, 0))
+
+    assert rolled == 15
+    statements = [sql(call.args[0]) for call in repository.session.execute.call_args_list]
+    assert statements[0].startswith("INSERT IGNORE INTO stats_rollup_state")
+    assert "FOR UPDATE" in statements[1]
+    assert statements[3].startswith("INSERT INTO dataset_daily_stats (dataset_id, day, views) SELECT")
+    assert "ON DUPLICATE KEY UPDATE views = (dataset_daily_stats.views + VALUES(views))" in statements[3]
+    assert statements[5].startswith("UPDATE stats_rollup_state SET last_id=")
+    repository.session.commit.assert_called_once()
+
+
+def test_roll_up_without_new_records_only_commits():
+    repository = make_repository(
+        None, MagicMock(**{"scalar.return_value": 40}), MagicMock(**{"scalar.return_value": None})
+    )
+
+    assert repository._roll_up_source("downloads", datetime(2026, 10, 17, 12, 0)) == 0
+    assert repository.session.execute.call_count == 3
+    repository.session.commit.assert_called_once()
+
+
+def test_worker_rolls_up_stats_once_per_interval():
+    stats_service = MagicMock()
+    worker = DatasetJobWorker(service=MagicMock(), stats_service=stats_service, rollup_interval=3600)
+
+    worker.roll_up_stats_if_due()
+    worker.roll_up_stats_if_due()
+
+    stats_service.roll_up.assert_called_once()
+
+
+def test_worker_survives_rollup_errors():
+    stats_service = MagicMock()
+    stats_service.roll_up.side_effect = RuntimeError("db down")
+    worker = DatasetJobWorker(service=MagicMock(), stats_service=stats_service)
+
+    worker.roll_up_stats_if_due()
+
+    stats_service.repository.session.rollback.assert_called_once()
@@ -0,0 +1,132 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.modules.dataset.forms import FormulaDataSetForm
+from app.modules.dataset.jobs import MAX_JOB_WAIT_SECONDS, DatasetJobService, DatasetJobWorker, save_dataset_images
+from app.modules.dataset.models import DatasetJob
+from app.modules.dataset.validators import FormulaCSVValidationError, ValidationReport
+
+CSV = "nombre_gp,anio_temporada\nGP Bahrein,2023\n"
+
+
+@pytest.fixture
+def job_service(test_app, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.modules.dataset.jobs.job_folder", lambda job_id: str(tmp_path / job_id))
+    monkeypatch.setattr("app.modules.dataset.jobs.User", MagicMock())
+    monkeypatch.setattr("app.modules.dataset.jobs.save_dataset_images", MagicMock())
+    service = DatasetJobService()
+    service.repository = MagicMock()
+    service.dataset_service = MagicMock()
+    service.zenodo_service = MagicMock()
+    service.zenodo_service.create_new_deposition.return_value = {}
+    return service
+
+
+def formula_job(tmp_path, **form):
+    folder = tmp_path / "job-1"
+    (folder / "files").mkdir(parents=True)
+    (folder / "upload.csv").write_text(CSV)
+    payload = {
+        "form": {"title": ["GP"], "desc": ["Carrera"], "publication_type": ["none"], **form},
+        "files": {"csv_file": {"path": "upload.csv", "filename": "gp.csv"}, "images": []},
+    }
+    job = DatasetJob(id="job-1", user_id=1, form_type="formula", status=DatasetJob.RUNNING, payload=json.dumps(payload))
+    return job, folder
+
+
+def finished(service):
+    return service.repository.get_by_id.return_value
+
+
+def test_run_formula_job_goes_through_all_stages(job_service, tmp_path):
+    job, folder = formula_job(tmp_path)
+    stages = []
+    job_service._set_stage = lambda job, stage: stages.append(stage)
+    job_service.dataset_service.create_from_form.return_value = MagicMock(id=10)
+
+    job_service.run(job)
+
+    form = job_service.dataset_service.create_from_form.call_args.kwargs["form"]
+    assert isinstance(form, FormulaDataSetForm)
+    assert form.title.data == "GP"
+    assert form.csv_file.data.filename == "gp.csv"
+    assert stages == ["ingestion", "recommendations", "zenodo"]
+    job_service.dataset_service.save_dataset_recommendations.assert_called_once()
+    assert finished(job_service).status == DatasetJob.SUCCEEDED
+    assert json.loads(finished(job_service).result)["dataset_ids"] == [10]
+    assert not folder.exists()
+
+
+def test_run_season_job_creates_one_dataset_per_race(job_service, tmp_path):
+    job, _ = formula_job(tmp_path, split_by_race=["y"])
+    job_service.dataset_service.create_season_from_form.return_value = [MagicMock(id=10), MagicMock(id=11)]
+
+    job_service.run(job)
+
+    job_service.dataset_service.create_from_form.assert_not_called()
+    assert json.loads(finished(job_service).result)["dataset_ids"] == [10, 11]
+
+
+def test_run_job_with_invalid_csv_fails_with_report(job_service, tmp_path):
+    job, _ = formula_job(tmp_path)
+    report = ValidationReport()
+    report.add_error(2, "anio_temporada", "1800", "Temporada fuera de rango")
+    job_service.dataset_service.create_from_form.side_effect = FormulaCSVValidationError(report)
+
+    job_service.run(job)
+
+    assert finished(job_service).status == DatasetJob.FAILED
+    assert json.loads(finished(job_service).result)["report"]["error_count"] == 1
+    job_service.zenodo_service.create_new_deposition.assert_not_called()
+
+
+def test_worker_run_once_with_empty_queue():
+    service = MagicMock()
+    service.repository.claim_next.return_value = None
+
+    assert DatasetJobWorker(service=service).run_once() is False
+    service.run.assert_not_called()
+
+
+def test_wait_for_update_returns_when_stage_changes(job_service, monkeypatch):
+    monkeypatch.setattr("app.modules.dataset.jobs.time.sleep", MagicMock())
+    states = iter([("running", "ingestion"), ("running", "ingestion"), ("running", "zenodo")])
+
+    def get_by_id(job_id):
+        status, stage = next(states)
+        return DatasetJob(id=job_id, user_id=1, status=status, stage=stage)
+
+    job_service.repository.get_by_id.side_effect = get_by_id
+
+    job = job_service.wait_for_update("job-1", 1, timeout=30, since="running:ingestion")
+
+    assert job.stage == "zenodo"
+
+
+def test_wait_for_update_is_capped_to_free_the_worker(job_service, monkeypatch):
+    clock = iter(range(0, 1000))
+    monkeypatch.setattr("app.modules.dataset.jobs.time.monotonic", lambda: next(clock))
+    sleep = MagicMock()
+    monkeypatch.setattr("app.modules.dataset.jobs.time.sleep", sleep)
+    job_service.repository.get_by_id.return_value = DatasetJob(id="job-1", user_id=1, status="running", stage="zenodo")
+
+    job = job_service.wait_for_update("job-1", 1, timeout=600, since="running:zenodo")
+
+    assert job.stage == "zenodo"
+    assert sleep.call_count <= MAX_JOB_WAIT_SECONDS
+
+
+def test_saved_images_are_served_from_the_shared_uploads_folder(test_app, tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setattr("app.modules.dataset.jobs.db", MagicMock())
+    image = MagicMock(filename="podio.png")
+    image.save.side_effect = lambda path: open(path, "wb").write(b"png")
+
+    save_dataset_images(MagicMock(id=7), [image])
+
+    assert (tmp_path / "uploads" / "datasets" / "7" / "podio.png").read_bytes() == b"png"
+    client = test_app.test_client()
+    assert client.get("/dataset/7/images/podio.png").data == b"png"
+    assert client.get("/dataset/7/images/../../../.env").status_code == 404
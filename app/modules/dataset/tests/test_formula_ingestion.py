@@ -0,0 +1,158 @@
+import io
+from datetime import date
+from unittest.mock import MagicMock
+
+from app.modules.dataset.forms import FormulaDataSetForm
+from app.modules.dataset.services import (
+    DataSetService,
+    build_formula_result_row,
+    formula_race_fields,
+    iter_chunks,
+    parse_position,
+    parse_race_time_ms,
+)
+
+ROW = {
+    "nombre_gp": "Gran Premio de España",
+    "anio_temporada": "2023",
+    "fecha_carrera": "2023-06-04",
+    "circuito": "Circuit de Barcelona-Catalunya",
+    "piloto_nombre": "Fernando Alonso",
+    "equipo": "Aston Martin",
+    "motor": "Mercedes",
+    "posicion_final": "7",
+    "puntos_obtenidos": "6",
+    "tiempo_carrera": "1:28:12.470",
+    "vueltas_completadas": "66",
+    "estado_carrera": "Finished",
+}
+
+
+def test_iter_chunks_splits_in_fixed_size_blocks():
+    chunks = list(iter_chunks(range(2500), chunk_size=1000))
+
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert chunks[-1][-1] == 2499
+
+
+def test_iter_chunks_empty_input():
+    assert list(iter_chunks([], chunk_size=10)) == []
+
+
+def test_formula_race_fields_from_first_row():
+    fields = formula_race_fields(ROW)
+
+    assert fields == {
+        "nombre_gp": "Gran Premio de España",
+        "anio_temporada": 2023,
+        "fecha_carrera": date(2023, 6, 4),
+        "circuito": "Circuit de Barcelona-Catalunya",
+    }
+
+
+def test_build_formula_result_row_converts_numbers():
+    values = build_formula_result_row(ROW, dataset_id=42)
+
+    assert values["dataset_id"] == 42
+    assert values["piloto_nombre"] == "Fernando Alonso"
+    assert values["puntos_obtenidos"] == 6.0
+    assert values["vueltas_completadas"] == 66
+
+
+def test_build_formula_result_row_strips_driver_name():
+    values = build_formula_result_row({**ROW, "piloto_nombre": " Fernando Alonso "}, dataset_id=42)
+
+    assert values["piloto_nombre"] == "Fernando Alonso"
+
+
+def test_build_formula_result_row_parses_race_time():
+    values = build_formula_result_row(ROW, dataset_id=42)
+
+    assert values["tiempo_carrera"] == "1:28:12.470"
+    assert values["tiempo_carrera_ms"] == (1 * 3600 + 28 * 60 + 12) * 1000 + 470
+
+
+def test_parse_race_time_ms_formats():
+    assert parse_race_time_ms("1:35:48.333") == 5748333
+    assert parse_race_time_ms("35:48.3") == (35 * 60 + 48) * 1000 + 300
+    assert parse_race_time_ms(" 1:35:48 ") == 5748000
+    assert parse_race_time_ms("DNF") is None
+    assert parse_race_time_ms("") is None
+    assert parse_race_time_ms(None) is None
+
+
+def test_parse_position():
+    assert parse_position("7") == 7
+    assert parse_position(" 12 ") == 12
+    assert parse_position("DNF") is None
+    assert parse_position(None) is None
+    assert build_formula_result_row(ROW, dataset_id=1)["posicion_numero"] == 7
+
+
+def test_build_formula_result_row_bad_numbers_default_to_zero():
+    values = build_formula_result_row({**ROW, "puntos_obtenidos": "", "vueltas_completadas": None}, dataset_id=1)
+
+    assert values["puntos_obtenidos"] == 0.0
+    assert values["vueltas_completadas"] == 0
+
+
+def test_insert_formula_results_uses_one_executemany_per_chunk():
+    service = DataSetService()
+    service.formula_result_repository = MagicMock()
+    service.formula_result_repository.bulk_insert.side_effect = len
+    dataset = MagicMock(id=7)
+
+    inserted = service.insert_formula_results(dataset, (dict(ROW) for _ in range(2500)))
+
+    assert inserted == 2500
+    assert service.formula_result_repository.bulk_insert.call_count == 3
+
+
+def test_create_season_from_form_creates_one_dataset_per_race(monkeypatch):
+    monkeypatch.setattr("app.modules.dataset.services.send_dataset_changed", MagicMock())
+    header = ",".join(ROW.keys())
+    lines = [header]
+    for gp, fecha in [("GP Bahrein", "2023-03-05"), ("GP Arabia Saudi", "2023-03-19")]:
+        for piloto in ["Max Verstappen", "Sergio Perez", "Fernando Alonso"]:
+            lines.append(",".join({**ROW, "nombre_gp": gp, "fecha_carrera": fecha, "piloto_nombre": piloto}.values()))
+    form = MagicMock()
+    form.csv_file.data.stream = io.BytesIO("\n".join(lines).encode("utf-8"))
+    form.get_dsmetadata.return_value = {"title": "Temporada 2023"}
+
+    service = DataSetService()
+    service.repository = MagicMock()
+    service.create_dsmetadata_with_authors = MagicMock(return_value=MagicMock(id=1))
+    service.insert_formula_results = MagicMock()
+
+    datasets = service.create_season_from_form(form, MagicMock(id=1))
+
+    assert [ds.nombre_gp for ds in datasets] == ["GP Bahrein", "GP Arabia Saudi"]
+    assert service.insert_formula_results.call_count == 2
+    assert all(len(call.args[1]) == 3 for call in service.insert_formula_results.call_args_list)
+    service.repository.session.commit.assert_called_once()
+    titles = [call.kwargs["title"] for call in service.create_dsmetadata_with_authors.call_args_list]
+    assert titles == ["Temporada 2023 - GP Bahrein 2023", "Temporada 2023 - GP Arabia Saudi 2023"]
+
+
+def test_create_from_form_reuses_results_of_identical_csv(monkeypatch):
+    monkeypatch.setattr("app.modules.dataset.services.send_dataset_changed", MagicMock())
+    form = MagicMock(spec=FormulaDataSetForm)
+    form.csv_file.data.stream = io.BytesIO(("\n".join([",".join(ROW.keys()), ",".join(ROW.values())])).encode())
+    form.get_dsmetadata.return_value = {"title": "GP España"}
+    known = MagicMock(id=5, nombre_gp="Gran Premio de España", anio_temporada=2023, fecha_carrera=date(2023, 6, 4))
+
+    service = DataSetService()
+    service.repository = MagicMock()
+    service.create_dsmetadata_with_authors = MagicMock(return_value=MagicMock(id=1))
+    service.validate_formula_csv = MagicMock()
+    service.insert_formula_results = MagicMock()
+    service.formula_result_repository = MagicMock()
+    service.formula_result_repository.get_dataset_by_csv_checksum.return_value = known
+
+    dataset = service.create_from_form(form, MagicMock(id=1))
+
+    service.validate_formula_csv.assert_not_called()
+    service.insert_formula_results.assert_not_called()
+    service.formula_result_repository.copy_results.assert_called_once_with(5, dataset.id)
+    assert dataset.nombre_gp == "Gran Premio de España"
+    assert len(dataset.csv_checksum) == 64
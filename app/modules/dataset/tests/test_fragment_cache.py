@@ -0,0 +1,84 @@
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+from core.caching.fragments import FileSystemFragmentBackend, FragmentCacheExtension, LRUFragmentBackend
+
+TEMPLATE = (
+    """{% cache ["dataset-card", dataset.id, dataset.updated_at] %}<h2>{{ render(dataset) }}</h2>{% endcache %}"""
+)
+
+
+def make_environment(backend):
+    environment = Environment(loader=DictLoader({"card.html": TEMPLATE}), extensions=[FragmentCacheExtension])
+    environment.fragment_cache_backend = backend
+    return environment
+
+
+def render_card(environment, dataset, renders):
+    def render(dataset):
+        renders.append(dataset.id)
+        return dataset.title
+
+    return environment.get_template("card.html").render(dataset=dataset, render=render)
+
+
+@pytest.fixture(params=["lru", "filesystem"])
+def backend(request, tmp_path):
+    if request.param == "lru":
+        return LRUFragmentBackend()
+    return FileSystemFragmentBackend(str(tmp_path / "fragments"))
+
+
+def test_fragment_is_rendered_once_per_version(backend):
+    environment = make_environment(backend)
+    dataset = SimpleNamespace(id=1, title="Spa 2024", updated_at=datetime(2026, 10, 1))
+    renders = []
+
+    assert render_card(environment, dataset, renders) == "<h2>Spa 2024</h2>"
+    assert render_card(environment, dataset, renders) == "<h2>Spa 2024</h2>"
+    assert renders == [1]
+
+    dataset.title, dataset.updated_at = "Spa 2025", datetime(2026, 10, 2)
+    assert render_card(environment, dataset, renders) == "<h2>Spa 2025</h2>"
+    assert renders == [1, 1]
+
+
+def test_expired_fragment_is_rendered_again(backend):
+    environment = make_environment(backend)
+    environment.fragment_cache_ttl = -1
+    dataset = SimpleNamespace(id=1, title="Monza", updated_at=datetime(2026, 10, 1))
+    renders = []
+
+    render_card(environment, dataset, renders)
+    render_card(environment, dataset, renders)
+
+    assert renders == [1, 1]
+
+
+def test_disabled_cache_renders_every_time():
+    environment = make_environment(None)
+    dataset = SimpleNamespace(id=1, title="Monza", updated_at=None)
+    renders = []
+
+    render_card(environment, dataset, renders)
+    render_card(environment, dataset, renders)
+
+    assert renders == [1, 1]
+
+
+def test_filesystem_fragments_are_shared_and_pruned(tmp_path):
+    directory = str(tmp_path / "fragments")
+    FileSystemFragmentBackend(directory).set("a", "<p>shared</p>", ttl=60)
+    FileSystemFragmentBackend(directory).set("b", "<p>old</p>", ttl=-1)
+    other_worker = FileSystemFragmentBackend(directory)
+
+    assert other_worker.get("a") == "<p>shared</p>"
+    assert other_worker.get("b") is None
+    assert other_worker.prune() == 1
+    assert len(os.listdir(directory)) == 1
+    assert os.stat(os.path.join(directory, os.listdir(directory)[0])).st_mtime > time.time()
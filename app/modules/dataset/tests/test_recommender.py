@@ -110,17 +110,8 @@ class TestDatasetRecommenderService(unittest.TestCase):
         ]
         self.mock_download_repo.total_dataset_downloads.return_value = 1000  # Máximo global de descargas
 
-        # Configurar el conteo individual de descargas para el motor:
-        def mock_count(ds_id):
-            if ds_id == 1:
-                return 900
-            if ds_id == 2:
-                return 100
-            if ds_id == 3:
-                return 500
-            return 0
-
-        self.mock_download_repo.count_downloads_for_dataset.side_effect = mock_count
+        # Configurar el conteo de descargas por dataset (una sola lectura de los contadores diarios):
+        self.mock_download_repo.downloads_by_dataset.return_value = {1: 900, 2: 100, 3: 500}
 
     def test_04_engine_returns_top_k_sorted_objects(self):
         """Verifica que el motor calcula los scores, ordena y devuelve los objetos con título."""
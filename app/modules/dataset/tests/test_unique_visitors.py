@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.modules.dataset.services import UniqueVisitorsService, sketch_periods_between, visitor_key
+from core.sketches.hyperloglog import HyperLogLog
+
+
+@pytest.mark.parametrize("visitors", [0, 50, 2000, 50000])
+def test_hyperloglog_estimate_within_two_percent(visitors):
+    sketch = HyperLogLog()
+    sketch.update(f"cookie:{index}" for index in range(visitors))
+    sketch.update(f"cookie:{index}" for index in range(visitors))
+
+    assert abs(sketch.count() - visitors) <= max(1, visitors * 0.02)
+
+
+def test_hyperloglog_merge_and_serialization():
+    monday, tuesday = HyperLogLog(), HyperLogLog()
+    monday.update(range(0, 3000))
+    tuesday.update(range(2000, 5000))
+
+    week = HyperLogLog.from_bytes(monday.to_bytes()).merge(HyperLogLog.from_bytes(tuesday.to_bytes()))
+
+    assert abs(week.count() - 5000) <= 100
+    assert len(week.to_bytes()) < 8 * 1024
+    with pytest.raises(ValueError):
+        week.merge(HyperLogLog(precision=10))
+
+
+def test_visitor_key_prefers_user_over_cookie():
+    assert visitor_key({"user_id": 3, "view_cookie": "abc"}) == "user:3"
+    assert visitor_key({"user_id": None, "view_cookie": "abc"}) == "cookie:abc"
+
+
+def test_sketch_periods_between_uses_whole_months():
+    assert sketch_periods_between(date(2026, 8, 30), date(2026, 10, 2)) == [
+        "2026-08-30",
+        "2026-08-31",
+        "2026-09",
+        "2026-10-01",
+        "2026-10-02",
+    ]
+
+
+def test_add_views_updates_day_month_total_and_global_sketches():
+    service = UniqueVisitorsService()
+    service.repository = MagicMock()
+    viewed = datetime(2026, 10, 17, 9, 30)
+
+    service.add_views(
+        "dataset",
+        [
+            {"dataset_id": 4, "user_id": None, "view_cookie": "a", "view_date": viewed},
+            {"dataset_id": 4, "user_id": 7, "view_cookie": "b", "view_date": viewed},
+        ],
+    )
+
+    sketches = service.repository.merge.call_args.args[0]
+    assert set(sketches) == {
+        ("dataset", object_id, period) for object_id in (4, 0) for period in ("2026-10-17", "2026-10", "all")
+    }
+    assert sketches[("dataset", 4, "all")].count() == 2
+
+
+def test_unique_visitors_merges_stored_sketches():
+    first, second = HyperLogLog(), HyperLogLog()
+    first.update(["user:1", "user:2"])
+    second.update(["user:2", "cookie:x"])
+    service = UniqueVisitorsService()
+    service.repository = MagicMock()
+    service.repository.get_registers.return_value = [first.to_bytes(), second.to_bytes()]
+
+    assert service.unique_visitors("dataset", 4, since=date(2026, 10, 1), until=date(2026, 10, 2)) == 3
+    service.repository.get_registers.assert_called_once_with("dataset", 4, ["2026-10-01", "2026-10-02"])
+
+
+@pytest.mark.parametrize("stored, rebuilt", [(0, True), (12, False)])
+def test_rebuild_sketches_if_empty_only_runs_once(test_app, monkeypatch, stored, rebuilt):
+    service = MagicMock()
+    service.count.return_value = stored
+    service.rebuild.return_value = 0
+    monkeypatch.setattr("app.modules.dataset.jobs.unique_visitors_service", service)
+
+    result = test_app.test_cli_runner().invoke(args=["dataset", "rebuild-sketches", "--if-empty"])
+
+    assert result.exit_code == 0, result.output
+    assert service.rebuild.called is rebuilt
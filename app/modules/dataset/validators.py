@@ -0,0 +1,344 @@
+import csv
+import io
+import math
+import re
+from collections import Counter
+from datetime import date, datetime
+from itertools import islice
+from operator import itemgetter
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+# Columnas obligatorias del CSV (ver README: "CSV Structure Requirements")
+REQUIRED_COLUMNS = (
+    "nombre_gp",
+    "anio_temporada",
+    "fecha_carrera",
+    "circuito",
+    "piloto_nombre",
+    "equipo",
+    "motor",
+    "posicion_final",
+    "puntos_obtenidos",
+    "tiempo_carrera",
+    "vueltas_completadas",
+    "estado_carrera",
+)
+NON_EMPTY_COLUMNS = (
+    "nombre_gp",
+    "anio_temporada",
+    "fecha_carrera",
+    "circuito",
+    "piloto_nombre",
+    "equipo",
+    "posicion_final",
+    "puntos_obtenidos",
+)
+NUMERIC_COLUMNS = ("anio_temporada", "puntos_obtenidos", "vueltas_completadas")
+
+# Posiciones no numéricas admitidas (abandono, descalificado, no salió, no clasificado...)
+STATUS_POSITIONS = frozenset({"DNF", "DSQ", "DNS", "DNQ", "NC", "EX", "RET"})
+NULL_VALUES = frozenset({"", "NULL", "null", "None"})
+RACE_TIME_REGEX = re.compile(r"^(\d+:)?\d{1,2}:\d{2}(\.\d{1,3})?$")
+
+FIRST_SEASON = 1950
+VALIDATION_CHUNK_SIZE = 10000
+MAX_REPORTED_ERRORS = 500
+
+
+class FormulaCSVValidationError(Exception):
+    """El CSV no cumple el esquema; lleva el informe completo para devolverlo al cliente."""
+
+    def __init__(self, report: "ValidationReport"):
+        super().__init__(f"El archivo CSV no es válido: {report.error_count} errores encontrados.")
+        self.report = report
+
+
+class ValidationReport:
+    """Resultado de validar un CSV: errores por fila/columna y estadísticas por columna."""
+
+    def __init__(self):
+        self.rows = 0
+        self.races = 0
+        self.missing_columns: List[str] = []
+        self.errors: List[dict] = []
+        self.error_count = 0
+        self.stats: Dict[str, dict] = {}
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.missing_columns and self.error_count == 0
+
+    def add_error(self, row: int, column: str, value: str, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "column": column, "value": value, "error": message})
+
+    def to_dict(self) -> dict:
+        return {
+            "valid": self.is_valid,
+            "rows": self.rows,
+            "races": self.races,
+            "missing_columns": self.missing_columns,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "truncated": self.error_count > len(self.errors),
+            "stats": self.stats,
+        }
+
+
+def _check_season(value: str) -> Optional[str]:
+    try:
+        season = int(value)
+    except ValueError:
+        return "Debe ser un año entero"
+    if not FIRST_SEASON <= season <= date.today().year + 1:
+        return f"Temporada fuera de rango ({FIRST_SEASON}-{date.today().year + 1})"
+    return None
+
+
+def _check_date(value: str) -> Optional[str]:
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return "Fecha no válida, se espera YYYY-MM-DD"
+    return None
+
+
+def _check_position(value: str) -> Optional[str]:
+    if value in STATUS_POSITIONS:
+        return None
+    if not value.isdigit() or int(value) < 1:
+        return f"Debe ser un entero positivo o uno de {', '.join(sorted(STATUS_POSITIONS))}"
+    return None
+
+
+def _check_points(value: str) -> Optional[str]:
+    try:
+        points = float(value)
+    except ValueError:
+        return "Debe ser un número"
+    if math.isnan(points) or points < 0:
+        return "No puede ser negativo"
+    return None
+
+
+def _check_laps(value: str) -> Optional[str]:
+    if value in NULL_VALUES:
+        return None
+    if not value.isdigit():
+        return "Debe ser un entero no negativo"
+    return None
+
+
+def _check_race_time(value: str) -> Optional[str]:
+    if value in NULL_VALUES or RACE_TIME_REGEX.match(value):
+        return None
+    return "Tiempo no válido, se espera H:MM:SS.mmm"
+
+
+def _season_mismatch(season: str, race_date: str) -> bool:
+    # Solo se compara si ambos valores son válidos; si no, ya se ha informado del error de columna
+    return race_date[:4] != season and not _check_date(race_date) and not _check_season(season)
+
+
+def driver_key(name: str) -> str:
+    """
+    Piloto tal como lo compara la clave única (dataset_id, piloto_nombre): la collation de MariaDB
+    no distingue mayúsculas ni espacios finales, y al guardar la fila el nombre se recorta.
+    """
+    return name.strip().casefold()
+
+
+COLUMN_CHECKS = {
+    "anio_temporada": _check_season,
+    "fecha_carrera": _check_date,
+    "posicion_final": _check_position,
+    "puntos_obtenidos": _check_points,
+    "vueltas_completadas": _check_laps,
+    "tiempo_carrera": _check_race_time,
+}
+
+
+class _ColumnStats:
+    def __init__(self, numeric: bool):
+        self.numeric = numeric
+        self.nulls = 0
+        self.distinct = set()
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, counts: Dict[str, int], valid: Dict[str, bool]):
+        for raw_value, count in counts.items():
+            value = raw_value.strip()
+            if value in NULL_VALUES:
+                self.nulls += count
+                continue
+            if len(self.distinct) <= 10000:
+                self.distinct.add(value)
+            if self.numeric and valid[raw_value]:
+                number = float(value)
+                self.minimum = number if self.minimum is None else min(self.minimum, number)
+                self.maximum = number if self.maximum is None else max(self.maximum, number)
+                self.total += number * count
+                self.count += count
+
+    def to_dict(self) -> dict:
+        data = {"nulls": self.nulls, "distinct": len(self.distinct)}
+        if self.numeric:
+            data.update(
+                {
+                    "min": self.minimum,
+                    "max": self.maximum,
+                    "mean": round(self.total / self.count, 4) if self.count else None,
+                }
+            )
+        return data
+
+
+class FormulaCSVValidator:
+    """
+    Valida el esquema y los datos de un CSV de resultados antes de tocar la base de datos.
+
+    El fichero se procesa por bloques y columna a columna: dentro de cada bloque cada valor
+    distinto se comprueba una sola vez (equipos, circuitos, puntos, posiciones... se repiten
+    muchísimo), así que el coste por celda es prácticamente una búsqueda en un diccionario.
+
+    Con single_race=True el CSV debe ser de una sola carrera (un dataset sin separar por carrera,
+    donde cada piloto aparece una única vez).
+    """
+
+    def __init__(self, single_race: bool = False):
+        self.single_race = single_race
+
+    def validate_stream(self, stream: BinaryIO) -> ValidationReport:
+        text_stream = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        try:
+            return self.validate_rows(csv.reader(text_stream))
+        except UnicodeDecodeError:
+            report = ValidationReport()
+            report.add_error(0, "", "", "El archivo no está codificado en UTF-8")
+            return report
+        finally:
+            # Desacoplar el wrapper para que no cierre el stream original al destruirse
+            text_stream.detach()
+
+    def validate_file(self, file_path: str) -> ValidationReport:
+        with open(file_path, "rb") as stream:
+            return self.validate_stream(stream)
+
+    def validate_rows(self, reader: Iterable[List[str]]) -> ValidationReport:
+        report = ValidationReport()
+        reader = iter(reader)
+        header = [column.strip() for column in next(reader, [])]
+
+        report.missing_columns = [column for column in REQUIRED_COLUMNS if column not in header]
+        if report.missing_columns:
+            return report
+
+        indexes = {column: header.index(column) for column in REQUIRED_COLUMNS}
+        stats = {column: _ColumnStats(column in NUMERIC_COLUMNS) for column in REQUIRED_COLUMNS}
+        seen_entries = set()
+        races = set()
+        first_row = 2  # La fila 1 es la cabecera
+
+        while True:
+            chunk = list(islice(reader, VALIDATION_CHUNK_SIZE))
+            if not chunk:
+                break
+
+            # Número de fila (en el fichero) de cada fila completa del bloque
+            positions = range(first_row, first_row + len(chunk))
+            full_rows = chunk
+            if min(map(len, chunk)) < len(header):
+                positions = []
+                for i, row in enumerate(chunk, start=first_row):
+                    if len(row) < len(header):
+                        report.add_error(i, "", ",".join(row), "Faltan columnas en la fila")
+                    else:
+                        positions.append(i)
+                full_rows = [row for row in chunk if len(row) >= len(header)]
+            report.rows += len(chunk)
+            first_row += len(chunk)
+
+            columns = {column: list(map(itemgetter(index), full_rows)) for column, index in indexes.items()}
+
+            for column, values in columns.items():
+                counts = Counter(values)
+
+                check = COLUMN_CHECKS.get(column)
+                messages = {}
+                for raw_value in counts:
+                    value = raw_value.strip()
+                    if value in NULL_VALUES and column in NON_EMPTY_COLUMNS:
+                        messages[raw_value] = "Valor obligatorio"
+                    elif check and not (value in NULL_VALUES and column not in NON_EMPTY_COLUMNS):
+                        messages[raw_value] = check(value)
+                    else:
+                        messages[raw_value] = None
+
+                if any(messages.values()):
+                    for position, value in zip(positions, values):
+                        if messages[value]:
+                            report.add_error(position, column, value.strip(), messages[value])
+
+                stats[column].update(counts, {value: messages[value] is None for value in counts})
+
+            # Cada piloto solo puede aparecer una vez por carrera. Se guarda el hash de cada
+            # (carrera, piloto) y solo se recorre el bloque fila a fila si hay alguno repetido.
+            # El nombre se compara como la clave única de formula_result (sin espacios ni mayúsculas).
+            entries = list(
+                map(
+                    hash,
+                    zip(
+                        columns["nombre_gp"],
+                        columns["anio_temporada"],
+                        columns["fecha_carrera"],
+                        map(driver_key, columns["piloto_nombre"]),
+                    ),
+                )
+            )
+            unique = set(entries)
+            if len(unique) == len(entries) and seen_entries.isdisjoint(unique):
+                seen_entries |= unique
+            else:
+                for position, entry, driver in zip(positions, entries, columns["piloto_nombre"]):
+                    if entry in seen_entries:
+                        report.add_error(
+                            position, "piloto_nombre", driver.strip(), "Piloto repetido en la misma carrera"
+                        )
+                    seen_entries.add(entry)
+
+            race_keys = list(zip(columns["nombre_gp"], columns["anio_temporada"], columns["fecha_carrera"]))
+            new_races = set(race_keys) - races
+            if self.single_race and new_races and (races or len(new_races) > 1):
+                first_race = next(iter(races)) if races else race_keys[0]
+                for position, race_key in zip(positions, race_keys):
+                    if race_key != first_race:
+                        report.add_error(
+                            position,
+                            "nombre_gp",
+                            race_key[0].strip(),
+                            "El CSV contiene más de una carrera: marque 'One dataset per race'",
+                        )
+                        break
+            races |= new_races
+
+            # La fecha debe caer en la temporada indicada; se comprueba una vez por par distinto
+            mismatched = {
+                (season, race_date)
+                for season, race_date in set(zip(columns["anio_temporada"], columns["fecha_carrera"]))
+                if _season_mismatch(season.strip(), race_date.strip())
+            }
+            if mismatched:
+                for position, season, race_date in zip(positions, columns["anio_temporada"], columns["fecha_carrera"]):
+                    if (season, race_date) in mismatched:
+                        report.add_error(position, "fecha_carrera", race_date.strip(), "No coincide con anio_temporada")
+
+        if report.rows == 0:
+            report.add_error(0, "", "", "El archivo CSV está vacío")
+        report.races = len(races)
+
+        report.stats = {column: column_stats.to_dict() for column, column_stats in stats.items()}
+        return report
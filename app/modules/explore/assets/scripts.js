@@ -6,6 +6,10 @@ document.addEventListener('DOMContentLoaded', () => {
     handleInitialLoad();
 });
 
+// Criterios y cursor de la búsqueda en curso, para pedir las páginas siguientes
+let currentCriteria = null;
+let nextCursor = null;
+
 // Función central: Se encarga ÚNICAMENTE de ejecutar el FETCH y renderizar los resultados.
 function performSearch() {
     const headerQueryInput = document.getElementById('search-query');
@@ -55,33 +59,51 @@ function performSearch() {
 
     console.log(`Filtros: Query='${searchCriteria.query}', Type='${searchCriteria.publication_type}', Sorting='${searchCriteria.sorting}'`);
 
+    currentCriteria = searchCriteria;
+    fetchPage(null);
+}
+
+// Pide una página de resultados (cursor null = la primera) y añade sus tarjetas
+function fetchPage(cursor) {
+    const criteria = currentCriteria;
+    document.getElementById('load_more').style.display = 'none';
+
     fetch('/explore', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify(searchCriteria),
+        body: JSON.stringify({...criteria, cursor: cursor}),
     })
     .then(response => response.json())
     .then(data => {
 
         console.log("Data received:", data);
-        document.getElementById('results').innerHTML = '';
-
-        // results counter
-        const resultCount = data.length;
-        const resultText = resultCount === 1 ? 'dataset' : 'datasets';
-        document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
-
-        if (resultCount === 0) {
-            console.log("show not found icon");
-            document.getElementById("results_not_found").style.display = "block";
-        } else {
-            document.getElementById("results_not_found").style.display = "none";
+        // Una búsqueda nueva ha empezado mientras llegaba esta página
+        if (criteria !== currentCriteria) {
+            return;
         }
 
+        if (cursor === null) {
+            document.getElementById('results').innerHTML = '';
+
+            // results counter
+            const resultCount = data.total;
+            const resultText = resultCount === 1 ? 'dataset' : 'datasets';
+            document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
 
-        data.forEach(dataset => {
+            if (resultCount === 0) {
+                console.log("show not found icon");
+                document.getElementById("results_not_found").style.display = "block";
+            } else {
+                document.getElementById("results_not_found").style.display = "none";
+            }
+        }
+
+        nextCursor = data.next_cursor;
+        document.getElementById('load_more').style.display = nextCursor ? 'inline-block' : 'none';
+
+        data.items.forEach(dataset => {
             let card = document.createElement('div');
             card.className = 'col-12';
             card.innerHTML = `
@@ -189,6 +211,16 @@ function setupFilterListeners() {
         }
     });
 
+    // Siguiente página de la búsqueda en curso
+    const loadMoreBtn = document.getElementById('load_more');
+    if (loadMoreBtn) {
+        loadMoreBtn.addEventListener('click', () => {
+            if (nextCursor) {
+                fetchPage(nextCursor);
+            }
+        });
+    }
+
     // Listener del botón limpiar
     const clearBtn = document.getElementById('clear-filters');
     if (clearBtn) {
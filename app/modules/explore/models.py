@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from app import db
+
+
+class SearchDocument(db.Model):
+    """Un dataset en el índice de búsqueda y su longitud ponderada (para normalizar BM25)."""
+
+    __tablename__ = "search_document"
+
+    dataset_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    length = db.Column(db.Integer, nullable=False, default=0)
+    indexed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SearchPosting(db.Model):
+    """
+    Entrada del índice invertido: término -> dataset, con la frecuencia ponderada del término.
+    Sin claves foráneas a propósito: el índice se mantiene fuera de la transacción del dataset.
+    """
+
+    __tablename__ = "search_posting"
+
+    term = db.Column(db.String(64), primary_key=True)
+    dataset_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    frequency = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.Index("ix_search_posting_dataset_id", "dataset_id"),)
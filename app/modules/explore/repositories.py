@@ -1,107 +1,101 @@
-import re
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
-import unidecode
-from sqlalchemy import and_, or_
+from sqlalchemy import Row, and_, delete, func, insert, or_, select
+from sqlalchemy.orm import Query
 
-from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.dataset.models import Author, DataSet, DSMetaData, FormulaDataSet, FormulaResult, PublicationType
+from app.modules.explore.models import SearchDocument, SearchPosting
 from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import Hubfile
 from core.repositories.BaseRepository import BaseRepository
+from core.search import bm25
+
+# Peso de cada campo en las frecuencias del índice (el título cuenta tres veces una palabra de la descripción)
+FIELD_WEIGHTS = {
+    "title": 3,
+    "description": 1,
+    "tags": 2,
+    "author": 2,
+    "affiliation": 1,
+    "uvl_filename": 2,
+    "fm_title": 2,
+    "fm_description": 1,
+    "fm_tags": 1,
+    "nombre_gp": 3,
+    "circuito": 2,
+    "anio_temporada": 1,
+    "piloto": 1,
+    "equipo": 1,
+}
+
+# Columnas de las tarjetas de Explore: se leen tal cual, sin cargar los objetos ni sus relaciones
+CARD_COLUMNS = (
+    DataSet.id,
+    DataSet.created_at,
+    DataSet.dataset_type,
+    DSMetaData.id.label("ds_meta_data_id"),
+    DSMetaData.title,
+    DSMetaData.description,
+    DSMetaData.tags,
+    DSMetaData.publication_type,
+    DSMetaData.dataset_doi,
+)
+
+# La última palabra de la consulta también busca los términos que empiezan por ella ("alph" -> "alpha")
+MIN_PREFIX_LENGTH = 3
+PREFIX_EXPANSIONS = 20
+
+# Número de documentos y longitud media: cambian poco, no hace falta calcularlos en cada búsqueda
+COLLECTION_STATS_TTL = 60.0
+_collection_stats: Dict[str, object] = {"expires_at": 0.0, "value": None}
 
 
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
+        self.search_index = SearchIndexRepository()
 
-    def filter(
+    def _filtered(
         self,
         query="",
-        sorting="newest",
         publication_type="any",
         tags=None,
         author="",
         description="",
         date="",
         uvl_files="",
-        **kwargs,
-    ):
-
-        # Normalize and remove unwanted characters
-        normalized_query = unidecode.unidecode(query).lower()
-        # Permitimos el punto para buscar archivos (e.g., file.uvl)
-        cleaned_query = re.sub(r'[,":\'()\[\]^;!¡¿?]', "", normalized_query).strip()
-
-        # Inicia la consulta y las uniones (joins)
-        datasets_query = (
-            self.model.query.join(DataSet.ds_meta_data)
-            .outerjoin(DSMetaData.authors)
-            .outerjoin(DataSet.feature_models)
-            .outerjoin(FeatureModel.fm_meta_data)
-            .filter(DSMetaData.dataset_doi.isnot(None))
-        )
+    ) -> Tuple[Optional[Query], Optional[Dict[int, float]]]:
+        """Consulta con todos los filtros, sin ordenar, y las puntuaciones BM25 si hay texto (None: sin resultados)."""
+        datasets_query = self.model.query.join(DataSet.ds_meta_data).filter(DSMetaData.dataset_doi.isnot(None))
 
         # -------------------------------------------------------------
         # 1. LÓGICA DE FILTRADO POR BÚSQUEDA (QUERY) + Advanced Search
         # -------------------------------------------------------------
-        aditional_filter = []
-
+        # Los filtros sobre autores y modelos son EXISTS: sin joins no hay filas repetidas ni distinct
         if author:
             # Busca que el autor contenga la subcadena
-            aditional_filter.append(Author.name.ilike(f"%{author}%"))
+            datasets_query = datasets_query.filter(DSMetaData.authors.any(Author.name.ilike(f"%{author}%")))
 
         if description:
-            aditional_filter.append(DSMetaData.description.ilike(f"%{description}%"))
+            datasets_query = datasets_query.filter(DSMetaData.description.ilike(f"%{description}%"))
 
         if uvl_files:
-            aditional_filter.append(FMMetaData.uvl_filename.ilike(f"%{uvl_files}%"))
+            uvl_file_match = FeatureModel.fm_meta_data.has(FMMetaData.uvl_filename.ilike(f"%{uvl_files}%"))
+            datasets_query = datasets_query.filter(DataSet.feature_models.any(uvl_file_match))
 
         if date:
-            aditional_filter.append(self.model.created_at.startswith(date))
-
-        if aditional_filter:
-            # Usamos 'and_' para combinar los filtros individuales
-            datasets_query = datasets_query.filter(and_(*aditional_filter))
-
-        # Lógica de búsqueda principal
-        if cleaned_query:
-
-            final_filters = []
-            words = cleaned_query.split()
-
-            # --- Condición A: Búsqueda OR Amplia (Frase Completa) ---
-            # Este es el filtro de búsqueda flexible: busca la frase exacta en CUALQUIER campo.
-            # Funciona para "Author 4", "tag1", "file.uvl", y "sample dataset 3".
-            phrase_match_in_any_field = or_(
-                DSMetaData.title.ilike(f"%{cleaned_query}%"),
-                DSMetaData.description.ilike(f"%{cleaned_query}%"),
-                DSMetaData.tags.ilike(f"%{cleaned_query}%"),
-                Author.name.ilike(f"%{cleaned_query}%"),
-                Author.affiliation.ilike(f"%{cleaned_query}%"),
-                FMMetaData.uvl_filename.ilike(f"%{cleaned_query}%"),
-                FMMetaData.title.ilike(f"%{cleaned_query}%"),
-                FMMetaData.description.ilike(f"%{cleaned_query}%"),
-                FMMetaData.tags.ilike(f"%{cleaned_query}%"),
-            )
-            final_filters.append(phrase_match_in_any_field)
-
-            # --- Condición B: Búsqueda Estricta AND (Solo para Títulos Multipalabra) ---
-            # Si hay más de una palabra, añadimos el requisito estricto en el título para reducir resultados.
-            if len(words) > 1:
-
-                strict_title_and_words = []
-
-                for word in words:
-                    # Requerimos que TODAS las palabras estén presentes en el TÍTULO.
-                    strict_title_and_words.append(DSMetaData.title.ilike(f"%{word}%"))
-
-                # Agregamos la condición B (AND en título) al filtro final OR
-                strict_title_and = and_(*strict_title_and_words)
-                final_filters.append(strict_title_and)
+            datasets_query = datasets_query.filter(self.model.created_at.startswith(date))
 
-            # Aplicamos la condición final: OR(Frase Completa) OR (AND en Título)
-            # Con solo estas dos condiciones (A y B), cubrimos todos los casos:
-            # - Búsqueda simple (Author 4): A se activa, B no se activa o falla, A encuentra.
-            # - Búsqueda estricta (sample dataset 3): A y B se activan, B fuerza el filtro.
-            datasets_query = datasets_query.filter(or_(*final_filters))
+        # Lógica de búsqueda principal: índice invertido, todas las palabras en algún campo
+        scores = None
+        if bm25.tokenize(query):
+            scores = self.search_index.search(query)
+            if not scores:
+                return None, None
+            datasets_query = datasets_query.filter(DataSet.id.in_(list(scores)))
 
         # -------------------------------------------------------------
         # 2. FILTRADO POR TIPO DE PUBLICACIÓN
@@ -128,6 +122,24 @@ class ExploreRepository(BaseRepository):
             # Aplicamos el filtro: (tags contiene 'tag1' OR tags contiene 'tag2')
             datasets_query = datasets_query.filter(or_(*tag_conditions))
 
+        return datasets_query, scores
+
+    def filter(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=None,
+        author="",
+        description="",
+        date="",
+        uvl_files="",
+        **kwargs,
+    ):
+        datasets_query, scores = self._filtered(query, publication_type, tags, author, description, date, uvl_files)
+        if datasets_query is None:
+            return []
+
         # -------------------------------------------------------------
         # 4. ORDENAMIENTO
         # -------------------------------------------------------------
@@ -136,5 +148,334 @@ class ExploreRepository(BaseRepository):
         else:
             datasets_query = datasets_query.order_by(self.model.created_at.desc())
 
-        # Aseguramos que solo se devuelvan resultados únicos.
-        return datasets_query.distinct().all()
+        datasets = datasets_query.all()
+        if scores is not None and sorting == "relevance":
+            # Orden estable: a igual puntuación, el orden por fecha de arriba
+            datasets.sort(key=lambda dataset: scores[dataset.id], reverse=True)
+        return datasets
+
+    def count(self, **criteria) -> int:
+        datasets_query, _ = self._filtered(**criteria)
+        return datasets_query.count() if datasets_query is not None else 0
+
+    def page(
+        self, sorting: str = "newest", limit: int = 20, after: Optional[list] = None, **criteria
+    ) -> Tuple[List[Row], Optional[list]]:
+        """
+        Una página de tarjetas (ver CARD_COLUMNS) por keyset: `after` es la clave de la última
+        fila de la página anterior y se devuelve la de esta si hay más resultados. Por fecha la
+        clave es (created_at, id) y la página sale del índice ix_dataset_created_at_id; por
+        relevancia es (puntuación, id) y se ordenan en memoria solo los ids que casan.
+        """
+        datasets_query, scores = self._filtered(**criteria)
+        if datasets_query is None:
+            return [], None
+
+        if sorting == "relevance" and scores is not None:
+            return self._relevance_page(datasets_query, scores, limit, after)
+
+        descending = sorting != "oldest"
+        if after is not None:
+            created_at, dataset_id = datetime.fromisoformat(after[0]), int(after[1])
+            if descending:
+                datasets_query = datasets_query.filter(
+                    or_(
+                        DataSet.created_at < created_at,
+                        and_(DataSet.created_at == created_at, DataSet.id < dataset_id),
+                    )
+                )
+            else:
+                datasets_query = datasets_query.filter(
+                    or_(
+                        DataSet.created_at > created_at,
+                        and_(DataSet.created_at == created_at, DataSet.id > dataset_id),
+                    )
+                )
+        if descending:
+            datasets_query = datasets_query.order_by(DataSet.created_at.desc(), DataSet.id.desc())
+        else:
+            datasets_query = datasets_query.order_by(DataSet.created_at.asc(), DataSet.id.asc())
+
+        rows = datasets_query.with_entities(*CARD_COLUMNS).limit(limit + 1).all()
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, [rows[-1].created_at.isoformat(), rows[-1].id]
+
+    def _relevance_page(self, datasets_query, scores: Dict[int, float], limit: int, after: Optional[list]):
+        ranked = sorted(
+            (dataset_id for (dataset_id,) in datasets_query.with_entities(DataSet.id)),
+            key=lambda dataset_id: (-scores[dataset_id], -dataset_id),
+        )
+        if after is not None:
+            last_key = (-float(after[0]), -int(after[1]))
+            ranked = [dataset_id for dataset_id in ranked if (-scores[dataset_id], -dataset_id) > last_key]
+
+        rows = self.cards_by_ids(ranked[:limit])
+        if len(ranked) <= limit or not rows:
+            return rows, None
+        return rows, [scores[rows[-1].id], rows[-1].id]
+
+    def ranked_keys(self, sorting: str = "newest", limit: Optional[int] = None, **criteria) -> List[tuple]:
+        """
+        Claves de orden de todos los resultados, ya ordenadas: (created_at, id) por fecha y
+        (puntuación, id) por relevancia. Es lo que se guarda en la caché de resultados de Explore;
+        las tarjetas de cada página se leen después con cards_by_ids.
+        """
+        datasets_query, scores = self._filtered(**criteria)
+        if datasets_query is None:
+            return []
+
+        if sorting == "relevance" and scores is not None:
+            ranked = sorted(
+                ((scores[dataset_id], dataset_id) for (dataset_id,) in datasets_query.with_entities(DataSet.id)),
+                reverse=True,
+            )
+            return ranked[:limit] if limit is not None else ranked
+
+        if sorting == "oldest":
+            datasets_query = datasets_query.order_by(DataSet.created_at.asc(), DataSet.id.asc())
+        else:
+            datasets_query = datasets_query.order_by(DataSet.created_at.desc(), DataSet.id.desc())
+        if limit is not None:
+            datasets_query = datasets_query.limit(limit)
+        return [tuple(row) for row in datasets_query.with_entities(DataSet.created_at, DataSet.id)]
+
+    def cards_by_ids(self, dataset_ids: List[int]) -> List[Row]:
+        """Filas de tarjeta (CARD_COLUMNS) de los datasets indicados, en el mismo orden."""
+        if not dataset_ids:
+            return []
+        rows = {
+            row.id: row
+            for row in self.model.query.join(DataSet.ds_meta_data)
+            .filter(DataSet.id.in_(dataset_ids))
+            .with_entities(*CARD_COLUMNS)
+        }
+        return [rows[dataset_id] for dataset_id in dataset_ids if dataset_id in rows]
+
+    def authors_by_metadata(self, ds_meta_data_ids: List[int]) -> Dict[int, List[dict]]:
+        authors: Dict[int, List[dict]] = {}
+        if not ds_meta_data_ids:
+            return authors
+        for ds_meta_data_id, name, affiliation, orcid in self.session.execute(
+            select(Author.ds_meta_data_id, Author.name, Author.affiliation, Author.orcid)
+            .where(Author.ds_meta_data_id.in_(ds_meta_data_ids))
+            .order_by(Author.id)
+        ):
+            authors.setdefault(ds_meta_data_id, []).append({"name": name, "affiliation": affiliation, "orcid": orcid})
+        return authors
+
+    def file_stats(self, dataset_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+        """Número de ficheros y bytes de cada dataset."""
+        if not dataset_ids:
+            return {}
+        return {
+            dataset_id: (int(files), int(size or 0))
+            for dataset_id, files, size in self.session.execute(
+                select(FeatureModel.dataset_id, func.count(Hubfile.id), func.sum(Hubfile.size))
+                .join(Hubfile, Hubfile.feature_model_id == FeatureModel.id)
+                .where(FeatureModel.dataset_id.in_(dataset_ids))
+                .group_by(FeatureModel.dataset_id)
+            )
+        }
+
+    def result_counts(self, dataset_ids: List[int]) -> Dict[int, int]:
+        """Filas de resultados de cada dataset de Fórmula."""
+        if not dataset_ids:
+            return {}
+        return dict(
+            self.session.execute(
+                select(FormulaResult.dataset_id, func.count())
+                .where(FormulaResult.dataset_id.in_(dataset_ids))
+                .group_by(FormulaResult.dataset_id)
+            ).all()
+        )
+
+
+class SearchIndexRepository(BaseRepository):
+    """
+    Índice invertido de los datasets (search_posting: término -> dataset, frecuencia) con la
+    longitud de cada documento (search_document) para puntuar con BM25. Una búsqueda solo lee
+    las listas de sus términos, así que su coste no crece con el catálogo sino con lo frecuentes
+    que sean las palabras buscadas.
+
+    Los métodos de escritura reciben una conexión: el índice se actualiza después del commit de
+    la sesión que cambió los datasets, en una transacción propia.
+    """
+
+    def __init__(self):
+        super().__init__(SearchDocument)
+
+    def documents(self, connection, dataset_ids: Iterable[int]) -> Dict[int, Counter]:
+        """Frecuencias ponderadas de los datasets indicados que existen."""
+        dataset_ids = list(dataset_ids)
+        fields: Dict[int, List[Tuple[object, int]]] = {}
+
+        for dataset_id, title, description, tags in connection.execute(
+            select(DataSet.id, DSMetaData.title, DSMetaData.description, DSMetaData.tags)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
+            .where(DataSet.id.in_(dataset_ids))
+        ):
+            fields[dataset_id] = [
+                (title, FIELD_WEIGHTS["title"]),
+                (description, FIELD_WEIGHTS["description"]),
+                (tags, FIELD_WEIGHTS["tags"]),
+            ]
+
+        for dataset_id, name, affiliation in connection.execute(
+            select(DataSet.id, Author.name, Author.affiliation)
+            .join(Author, Author.ds_meta_data_id == DataSet.ds_meta_data_id)
+            .where(DataSet.id.in_(dataset_ids))
+        ):
+            fields[dataset_id] += [(name, FIELD_WEIGHTS["author"]), (affiliation, FIELD_WEIGHTS["affiliation"])]
+
+        for dataset_id, uvl_filename, title, description, tags in connection.execute(
+            select(
+                FeatureModel.dataset_id,
+                FMMetaData.uvl_filename,
+                FMMetaData.title,
+                FMMetaData.description,
+                FMMetaData.tags,
+            )
+            .join(FMMetaData, FeatureModel.fm_meta_data_id == FMMetaData.id)
+            .where(FeatureModel.dataset_id.in_(dataset_ids))
+        ):
+            if dataset_id in fields:
+                fields[dataset_id] += [
+                    (uvl_filename, FIELD_WEIGHTS["uvl_filename"]),
+                    (title, FIELD_WEIGHTS["fm_title"]),
+                    (description, FIELD_WEIGHTS["fm_description"]),
+                    (tags, FIELD_WEIGHTS["fm_tags"]),
+                ]
+
+        races = FormulaDataSet.__table__
+        for dataset_id, nombre_gp, circuito, anio_temporada in connection.execute(
+            select(races.c.id, races.c.nombre_gp, races.c.circuito, races.c.anio_temporada).where(
+                races.c.id.in_(dataset_ids)
+            )
+        ):
+            if dataset_id in fields:
+                fields[dataset_id] += [
+                    (nombre_gp, FIELD_WEIGHTS["nombre_gp"]),
+                    (circuito, FIELD_WEIGHTS["circuito"]),
+                    (anio_temporada, FIELD_WEIGHTS["anio_temporada"]),
+                ]
+
+        results = FormulaResult.__table__
+        for dataset_id, piloto, equipo in connection.execute(
+            select(results.c.dataset_id, results.c.piloto_nombre, results.c.equipo)
+            .where(results.c.dataset_id.in_(dataset_ids))
+            .distinct()
+        ):
+            if dataset_id in fields:
+                fields[dataset_id] += [(piloto, FIELD_WEIGHTS["piloto"]), (equipo, FIELD_WEIGHTS["equipo"])]
+
+        return {dataset_id: bm25.term_frequencies(document) for dataset_id, document in fields.items()}
+
+    def affected_dataset_ids(
+        self, connection, dataset_ids: Iterable[int], ds_meta_data_ids: Iterable[int], fm_meta_data_ids: Iterable[int]
+    ) -> List[int]:
+        """Datasets a reindexar a partir de los ids de lo que ha cambiado (datasets, metadatos, modelos)."""
+        affected = set(dataset_ids)
+        ds_meta_data_ids, fm_meta_data_ids = list(ds_meta_data_ids), list(fm_meta_data_ids)
+        if ds_meta_data_ids:
+            affected.update(
+                connection.execute(select(DataSet.id).where(DataSet.ds_meta_data_id.in_(ds_meta_data_ids))).scalars()
+            )
+        if fm_meta_data_ids:
+            affected.update(
+                connection.execute(
+                    select(FeatureModel.dataset_id).where(FeatureModel.fm_meta_data_id.in_(fm_meta_data_ids))
+                ).scalars()
+            )
+        affected.discard(None)
+        return sorted(affected)
+
+    def replace(self, connection, dataset_ids: Iterable[int], documents: Dict[int, Counter]):
+        """Sustituye en el índice los datasets indicados; los que no tienen documento se quitan."""
+        dataset_ids = list(dataset_ids)
+        connection.execute(delete(SearchPosting).where(SearchPosting.dataset_id.in_(dataset_ids)))
+        connection.execute(delete(SearchDocument).where(SearchDocument.dataset_id.in_(dataset_ids)))
+        if not documents:
+            return
+
+        now = datetime.utcnow()
+        connection.execute(
+            insert(SearchDocument),
+            [
+                {"dataset_id": dataset_id, "length": sum(frequencies.values()), "indexed_at": now}
+                for dataset_id, frequencies in documents.items()
+            ],
+        )
+        postings = [
+            {"term": term, "dataset_id": dataset_id, "frequency": frequency}
+            for dataset_id, frequencies in documents.items()
+            for term, frequency in frequencies.items()
+        ]
+        if postings:
+            connection.execute(insert(SearchPosting), postings)
+
+    def clear(self, connection):
+        connection.execute(delete(SearchPosting))
+        connection.execute(delete(SearchDocument))
+
+    def all_dataset_ids(self, connection, after_id: int, limit: int) -> List[int]:
+        return list(
+            connection.execute(select(DataSet.id).where(DataSet.id > after_id).order_by(DataSet.id).limit(limit))
+            .scalars()
+            .all()
+        )
+
+    def collection_stats(self) -> Tuple[int, float]:
+        """(número de documentos, longitud media), calculados como mucho cada COLLECTION_STATS_TTL segundos."""
+        now = time.monotonic()
+        if _collection_stats["value"] is None or now >= _collection_stats["expires_at"]:
+            documents, average_length = self.session.execute(
+                select(func.count(), func.avg(SearchDocument.length))
+            ).one()
+            _collection_stats["value"] = (int(documents or 0), float(average_length or 0.0))
+            _collection_stats["expires_at"] = now + COLLECTION_STATS_TTL
+        return _collection_stats["value"]
+
+    def expand_prefix(self, prefix: str) -> List[str]:
+        return list(
+            self.session.execute(
+                select(SearchPosting.term)
+                .where(SearchPosting.term.like(f"{prefix}%"))
+                .group_by(SearchPosting.term)
+                .order_by(SearchPosting.term)
+                .limit(PREFIX_EXPANSIONS)
+            )
+            .scalars()
+            .all()
+        )
+
+    def search(self, query: str) -> Dict[int, float]:
+        """Datasets que contienen todas las palabras de la consulta, con su puntuación BM25."""
+        tokens = bm25.tokenize(query)
+        if not tokens:
+            return {}
+
+        positions: List[List[str]] = [[token] for token in tokens]
+        last = tokens[-1]
+        if len(last) >= MIN_PREFIX_LENGTH:
+            positions[-1] = sorted(set([last] + self.expand_prefix(last)))
+
+        terms = {term for terms in positions for term in terms}
+        postings: Dict[str, List[Tuple[int, int, int]]] = {term: [] for term in terms}
+        for term, dataset_id, frequency, length in self.session.execute(
+            select(SearchPosting.term, SearchPosting.dataset_id, SearchPosting.frequency, SearchDocument.length)
+            .join(SearchDocument, SearchDocument.dataset_id == SearchPosting.dataset_id)
+            .where(SearchPosting.term.in_(terms))
+        ):
+            postings[term].append((dataset_id, frequency, length))
+
+        documents, average_length = self.collection_stats()
+        # Un documento recién indexado puede no estar aún en las estadísticas cacheadas
+        documents = max(documents, max((len(entries) for entries in postings.values()), default=0))
+        groups = [{term: postings[term] for term in terms} for terms in positions]
+        return bm25.score(groups, documents, average_length)
+
+
+def invalidate_collection_stats():
+    _collection_stats["value"] = None
@@ -2,7 +2,7 @@ from flask import jsonify, render_template, request
 
 from app.modules.explore import explore_bp
 from app.modules.explore.forms import ExploreForm
-from app.modules.explore.services import ExploreService
+from app.modules.explore.services import ExplorePageError, ExploreService
 
 
 @explore_bp.route("/explore", methods=["GET", "POST"])
@@ -29,6 +29,9 @@ def index():
         )
 
     if request.method == "POST":
-        criteria = request.get_json()
-        datasets = ExploreService().filter(**criteria)
-        return jsonify([dataset.to_dict() for dataset in datasets])
+        criteria = request.get_json() or {}
+        try:
+            page = ExploreService().search(criteria, limit=criteria.get("limit"), cursor=criteria.get("cursor"))
+        except ExplorePageError as exc:
+            return jsonify({"message": str(exc)}), 400
+        return jsonify(page)
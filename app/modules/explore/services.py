@@ -1,10 +1,160 @@
-from app.modules.explore.repositories import ExploreRepository
+import base64
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import click
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.modules.dataset.models import Author, DataSet, DSMetaData, FormulaDataSet, FormulaResult
+from app.modules.dataset.signals import dataset_changed
+from app.modules.explore import explore_bp
+from app.modules.explore.repositories import (
+    ExploreRepository,
+    SearchIndexRepository,
+    invalidate_collection_stats,
+)
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from core.caching.invalidation import SharedInvalidationLog
+from core.caching.results import GenerationalCache
+from core.configuration.configuration import shared_cache_dir
+from core.search import bm25
 from core.services.BaseService import BaseService
 
+logger = logging.getLogger(__name__)
+
+# Clave en session.info con lo que ha cambiado desde el último commit
+PENDING_CHANGES = "search_index_pending"
+
+# Tarjetas por página de Explore
+EXPLORE_PAGE_SIZE = 20
+MAX_EXPLORE_PAGE_SIZE = 100
+
+# Criterios de búsqueda que admite ExploreRepository (el resto del cuerpo se ignora)
+SEARCH_CRITERIA = ("query", "publication_type", "tags", "author", "description", "date", "uvl_files")
+
+# Búsquedas distintas que guarda cada proceso y resultados por búsqueda a partir de los cuales
+# no se guardan las claves sino que cada página se pide a la base de datos (ExploreRepository.page)
+EXPLORE_RESULT_CACHE_SIZE = int(os.getenv("EXPLORE_RESULT_CACHE_SIZE", "256"))
+EXPLORE_RESULT_CACHE_MAX_IDS = int(os.getenv("EXPLORE_RESULT_CACHE_MAX_IDS", "5000"))
+
+
+class ExplorePageError(ValueError):
+    pass
+
+
+def _criteria_digest(sorting: str, criteria: dict) -> str:
+    return hashlib.sha1(json.dumps([sorting, criteria], sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(sorting: str, criteria: dict, key: list) -> str:
+    """Cursor opaco: la clave de la última tarjeta servida y una huella de la búsqueda que la produjo."""
+    payload = json.dumps([_criteria_digest(sorting, criteria), key]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sorting: str, criteria: dict) -> list:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        digest, key = json.loads(payload)
+    except (ValueError, TypeError):
+        raise ExplorePageError("Invalid cursor")
+    if digest != _criteria_digest(sorting, criteria) or not isinstance(key, list) or len(key) != 2:
+        raise ExplorePageError("The cursor belongs to a different search")
+    return key
+
+
+def normalize_criteria(criteria: dict) -> Tuple[str, dict]:
+    """
+    Ordenación y filtros con una única forma para cada búsqueda equivalente: el texto queda en
+    las palabras que ve el índice ("  Mónza GP" -> "monza gp"), los filtros ILIKE en minúsculas
+    y sin espacios alrededor, las etiquetas ordenadas y sin repetir, y fuera los vacíos. Es la
+    clave de la caché de resultados y de la huella de los cursores.
+    """
+    filters = {}
+    query = " ".join(bm25.tokenize(criteria.get("query")))
+    if query:
+        filters["query"] = query
+    for name in ("publication_type", "author", "description", "date", "uvl_files"):
+        value = str(criteria.get(name) or "").strip().lower()
+        if value and not (name == "publication_type" and value == "any"):
+            filters[name] = value
+    tags = criteria.get("tags")
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    tags = sorted({str(tag).strip().lower() for tag in tags or [] if str(tag).strip()})
+    if tags:
+        filters["tags"] = tags
+
+    sorting = criteria.get("sorting")
+    if sorting not in ("oldest", "relevance") or (sorting == "relevance" and "query" not in filters):
+        # Sin texto no hay puntuaciones: la relevancia es el orden por fecha
+        sorting = "newest"
+    return sorting, filters
+
+
+def parse_key(sorting: str, key: list) -> tuple:
+    """Clave de un cursor en la forma de ExploreRepository.ranked_keys."""
+    try:
+        value, dataset_id = key
+        if sorting == "relevance":
+            return float(value), int(dataset_id)
+        return datetime.fromisoformat(value), int(dataset_id)
+    except (ValueError, TypeError):
+        raise ExplorePageError("Invalid cursor")
+
+
+def cursor_key(sorting: str, key: tuple) -> list:
+    value, dataset_id = key
+    return [value if sorting == "relevance" else value.isoformat(), dataset_id]
+
+
+def position_after(keys, after: tuple, descending: bool) -> int:
+    """Posición de la primera clave que va detrás de `after` en una lista ya ordenada (búsqueda binaria)."""
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if (keys[middle] < after) if descending else (keys[middle] > after):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+# Cualquier escritura en datasets o metadatos incrementa la generación
+explore_result_cache = GenerationalCache(maxsize=EXPLORE_RESULT_CACHE_SIZE)
+
+
+def init_result_cache(app):
+    """Generación común a todos los procesos, en el SHARED_CACHE_DIR de la app."""
+    explore_result_cache.generation_log = SharedInvalidationLog(
+        os.path.join(shared_cache_dir(app), "explore_generation.json"), max_entries=1
+    )
+
+
+explore_bp.record(lambda state: init_result_cache(state.app))
+
+
+def parse_limit(value) -> int:
+    if value is None or value == "":
+        return EXPLORE_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ExplorePageError(f"Invalid limit: {value}")
+    return max(1, min(limit, MAX_EXPLORE_PAGE_SIZE))
+
 
 class ExploreService(BaseService):
-    def __init__(self):
+    def __init__(self, result_cache: Optional[GenerationalCache] = None):
         super().__init__(ExploreRepository())
+        self.result_cache = result_cache or explore_result_cache
 
     def filter(
         self,
@@ -21,3 +171,219 @@ class ExploreService(BaseService):
         return self.repository.filter(
             query, sorting, publication_type, tags, author, description, date, uvl_files, **kwargs
         )
+
+    def ranked_keys(self, sorting: str, filters: dict) -> tuple:
+        """
+        Claves ordenadas de todos los resultados de la búsqueda, desde la caché de resultados.
+        Mientras se escribe en el buscador cada pulsación repite búsquedas ya hechas: pasan a
+        ser aciertos en lugar de una consulta completa cada vez.
+        """
+        key = (sorting, json.dumps(filters, sort_keys=True))
+        return self.result_cache.get_or_compute(
+            key,
+            lambda: tuple(self.repository.ranked_keys(sorting, limit=EXPLORE_RESULT_CACHE_MAX_IDS + 1, **filters)),
+        )
+
+    def search(self, criteria: dict, limit=None, cursor: Optional[str] = None) -> dict:
+        """
+        Una página de resultados: {"items": [...], "next_cursor": ...} y, en la primera, "total".
+        Las tarjetas se leen de columnas sueltas (ver cards) en lugar de serializar los datasets.
+        """
+        sorting, filters = normalize_criteria(criteria)
+        limit = parse_limit(limit)
+        after = decode_cursor(cursor, sorting, filters) if cursor else None
+
+        keys = self.ranked_keys(sorting, filters)
+        if len(keys) > EXPLORE_RESULT_CACHE_MAX_IDS:
+            return self._database_page(sorting, filters, limit, after)
+
+        start = position_after(keys, parse_key(sorting, after), sorting != "oldest") if after else 0
+        page_keys = keys[start : start + limit]
+        page = {
+            "items": self.cards(self.repository.cards_by_ids([dataset_id for _, dataset_id in page_keys])),
+            "next_cursor": (
+                encode_cursor(sorting, filters, cursor_key(sorting, page_keys[-1]))
+                if start + limit < len(keys)
+                else None
+            ),
+        }
+        if cursor is None:
+            page["total"] = len(keys)
+        return page
+
+    def _database_page(self, sorting: str, filters: dict, limit: int, after: Optional[list]) -> dict:
+        # Demasiados resultados para guardar sus claves: keyset directamente sobre la base de datos
+        try:
+            rows, next_key = self.repository.page(sorting=sorting, limit=limit, after=after, **filters)
+        except (ValueError, TypeError):
+            # Una clave con la forma correcta pero valores imposibles
+            raise ExplorePageError("Invalid cursor")
+        page = {
+            "items": self.cards(rows),
+            "next_cursor": encode_cursor(sorting, filters, next_key) if next_key else None,
+        }
+        if after is None:
+            page["total"] = self.repository.count(**filters)
+        return page
+
+    def cards(self, rows) -> List[dict]:
+        """Tarjetas de Explore: tres consultas por página (autores, ficheros, resultados) sin cargar objetos."""
+        from app.modules.dataset.services import SizeService, uvlhub_doi_url
+
+        dataset_ids = [row.id for row in rows]
+        authors = self.repository.authors_by_metadata([row.ds_meta_data_id for row in rows])
+        file_stats = self.repository.file_stats(dataset_ids)
+        result_counts = self.repository.result_counts([row.id for row in rows if row.dataset_type == "formula"])
+        size_service = SizeService()
+
+        cards = []
+        for row in rows:
+            files_count, total_size = file_stats.get(row.id, (0, 0))
+            card = {
+                "id": row.id,
+                "title": row.title,
+                "description": row.description,
+                "created_at": row.created_at,
+                "created_at_timestamp": int(row.created_at.timestamp()),
+                "publication_type": row.publication_type.name.replace("_", " ").title(),
+                "dataset_doi": row.dataset_doi,
+                "tags": row.tags.split(",") if row.tags else [],
+                "authors": authors.get(row.ds_meta_data_id, []),
+                "url": uvlhub_doi_url(row.dataset_doi),
+                "download": f"/dataset/download/{row.id}",
+                "dataset_type": row.dataset_type,
+                "files_count": files_count,
+                "total_size_in_bytes": total_size,
+                "total_size_in_human_format": size_service.get_human_readable_size(total_size),
+            }
+            if row.id in result_counts:
+                card["results_count"] = result_counts[row.id]
+            cards.append(card)
+        return cards
+
+
+class SearchIndexService(BaseService):
+    """
+    Mantiene el índice de búsqueda de Explore. Cada commit que toca datasets, sus metadatos,
+    autores, modelos o resultados de Fórmula reindexa solo esos datasets, en una transacción
+    propia justo después (ver _collect_changes e _index_committed_changes).
+    """
+
+    def __init__(self):
+        super().__init__(SearchIndexRepository())
+
+    def index_datasets(self, dataset_ids: Iterable[int], engine=None):
+        dataset_ids = list(dataset_ids)
+        if not dataset_ids:
+            return
+        with (engine or db.engine).begin() as connection:
+            self.repository.replace(connection, dataset_ids, self.repository.documents(connection, dataset_ids))
+        invalidate_collection_stats()
+
+    def index_changes(self, changes: Dict[str, set], engine=None):
+        with (engine or db.engine).connect() as connection:
+            dataset_ids = self.repository.affected_dataset_ids(
+                connection, changes["dataset"], changes["ds_meta_data"], changes["fm_meta_data"]
+            )
+        self.index_datasets(dataset_ids, engine)
+
+    def rebuild(self, batch_size: int = 500) -> int:
+        """Vacía el índice y lo genera de nuevo para todos los datasets."""
+        with db.engine.begin() as connection:
+            self.repository.clear(connection)
+        indexed, last_id = 0, 0
+        while True:
+            with db.engine.connect() as connection:
+                dataset_ids = self.repository.all_dataset_ids(connection, last_id, batch_size)
+            if not dataset_ids:
+                break
+            self.index_datasets(dataset_ids)
+            last_id = dataset_ids[-1]
+            indexed += len(dataset_ids)
+        return indexed
+
+    def search(self, query: str) -> Dict[int, float]:
+        return self.repository.search(query)
+
+
+search_index_service = SearchIndexService()
+
+
+def _loaded(instance, attribute: str):
+    # Sin disparar cargas perezosas en mitad de un flush
+    return inspect(instance).dict.get(attribute)
+
+
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault(PENDING_CHANGES, {"dataset": set(), "ds_meta_data": set(), "fm_meta_data": set()})
+    for instance in chain(session.new, session.deleted):
+        if isinstance(instance, DataSet):
+            changes["dataset"].add(_loaded(instance, "id"))
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, FormulaDataSet):
+            changes["dataset"].add(_loaded(instance, "id"))
+        elif isinstance(instance, DSMetaData):
+            changes["ds_meta_data"].add(_loaded(instance, "id"))
+        elif isinstance(instance, Author):
+            changes["ds_meta_data"].add(_loaded(instance, "ds_meta_data_id"))
+            changes["fm_meta_data"].add(_loaded(instance, "fm_meta_data_id"))
+        elif isinstance(instance, (FeatureModel, FormulaResult)):
+            changes["dataset"].add(_loaded(instance, "dataset_id"))
+        elif isinstance(instance, FMMetaData):
+            changes["fm_meta_data"].add(_loaded(instance, "id"))
+    for ids in changes.values():
+        ids.discard(None)
+
+
+def _invalidate_results():
+    try:
+        explore_result_cache.bump()
+    except Exception as exc:
+        logger.exception(f"Error invalidating the Explore result cache: {exc}")
+
+
+def _index_committed_changes(session):
+    changes = session.info.pop(PENDING_CHANGES, None)
+    if not changes or not any(changes.values()):
+        return
+    try:
+        search_index_service.index_changes(changes, engine=session.get_bind())
+    except Exception as exc:
+        logger.exception(f"Error updating the search index: {exc}")
+    # Después de reindexar: una búsqueda que falle ahora ya ve el índice nuevo
+    _invalidate_results()
+
+
+def _discard_changes(session):
+    session.info.pop(PENDING_CHANGES, None)
+
+
+event.listen(Session, "after_flush", _collect_changes)
+event.listen(Session, "after_commit", _index_committed_changes)
+event.listen(Session, "after_rollback", _discard_changes)
+
+
+def _on_dataset_changed(sender, dataset_id, dataset_type, action, **kwargs):
+    # Los resultados de Fórmula se actualizan con sentencias masivas, sin pasar por la sesión
+    if action == "updated":
+        try:
+            search_index_service.index_datasets([dataset_id])
+        except Exception as exc:
+            logger.exception(f"Error reindexing dataset {dataset_id}: {exc}")
+    _invalidate_results()
+
+
+dataset_changed.connect(_on_dataset_changed)
+
+
+@explore_bp.cli.command("reindex")
+@click.option("--batch-size", default=500, show_default=True, help="Datasets indexed per transaction.")
+@click.option("--if-empty", is_flag=True, help="Only rebuild when nothing is indexed yet (after migrating).")
+def reindex_command(batch_size, if_empty):
+    """Rebuild the full-text search index of Explore."""
+    if if_empty and search_index_service.count():
+        click.echo("Search index already built, nothing to do")
+        return
+    indexed = search_index_service.rebuild(batch_size=batch_size)
+    explore_result_cache.bump()
+    click.echo(f"Indexed {indexed} datasets")
@@ -0,0 +1,118 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.modules.dataset.models import PublicationType
+from app.modules.explore import services as explore_services
+from app.modules.explore.services import (
+    MAX_EXPLORE_PAGE_SIZE,
+    ExplorePageError,
+    ExploreService,
+    decode_cursor,
+    encode_cursor,
+    parse_limit,
+)
+from core.caching.invalidation import SharedInvalidationLog
+from core.caching.results import GenerationalCache
+
+
+def card_row(dataset_id, dataset_type="uvl"):
+    return SimpleNamespace(
+        id=dataset_id,
+        created_at=datetime(2026, 10, dataset_id),
+        dataset_type=dataset_type,
+        ds_meta_data_id=dataset_id * 10,
+        title=f"Dataset {dataset_id}",
+        description="",
+        tags="f1, monza",
+        publication_type=PublicationType.JOURNAL_ARTICLE,
+        dataset_doi=f"10.1234/dataset{dataset_id}",
+    )
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = ExploreService(result_cache=GenerationalCache(SharedInvalidationLog(str(tmp_path / "generation.json"))))
+    service.repository = MagicMock()
+    service.repository.ranked_keys.return_value = [(datetime(2026, 10, day), day) for day in (3, 2, 1)]
+    service.repository.cards_by_ids.side_effect = lambda ids: [card_row(dataset_id) for dataset_id in ids]
+    service.repository.authors_by_metadata.return_value = {10: [{"name": "Alice", "affiliation": None, "orcid": None}]}
+    service.repository.file_stats.return_value = {1: (2, 2048)}
+    service.repository.result_counts.return_value = {2: 20}
+    service.repository.count.return_value = 41
+    return service
+
+
+def test_cursor_round_trip_is_bound_to_the_search():
+    cursor = encode_cursor("newest", {"query": "monza"}, ["2026-10-02T00:00:00", 2])
+
+    assert decode_cursor(cursor, "newest", {"query": "monza"}) == ["2026-10-02T00:00:00", 2]
+    with pytest.raises(ExplorePageError):
+        decode_cursor(cursor, "newest", {"query": "spa"})
+    with pytest.raises(ExplorePageError):
+        decode_cursor("not-a-cursor", "newest", {"query": "monza"})
+
+
+def test_limit_is_clamped():
+    assert parse_limit(None) == 20
+    assert parse_limit("5") == 5
+    assert parse_limit(10_000) == MAX_EXPLORE_PAGE_SIZE
+    with pytest.raises(ExplorePageError):
+        parse_limit("ten")
+
+
+def test_first_page_returns_cards_total_and_cursor(service):
+    service.repository.cards_by_ids.side_effect = lambda ids: [card_row(1), card_row(2, "formula")]
+
+    page = service.search({"query": "monza", "sorting": "newest", "csrf_token": "x", "author": ""}, limit=2)
+
+    service.repository.ranked_keys.assert_called_once_with("newest", limit=5001, query="monza")
+    service.repository.cards_by_ids.assert_called_once_with([3, 2])
+    assert page["total"] == 3
+    assert [card["id"] for card in page["items"]] == [1, 2]
+    first, second = page["items"]
+    assert first["authors"] == [{"name": "Alice", "affiliation": None, "orcid": None}]
+    assert first["tags"] == ["f1", " monza"]
+    assert first["publication_type"] == "Journal Article"
+    assert (first["files_count"], first["total_size_in_human_format"]) == (2, "2.0 KB")
+    assert second["results_count"] == 20 and "results_count" not in first
+    service.repository.result_counts.assert_called_once_with([2])
+
+    next_key = decode_cursor(page["next_cursor"], "newest", {"query": "monza"})
+    assert next_key == ["2026-10-02T00:00:00", 2]
+
+
+def test_next_pages_continue_after_the_cursor_without_total(service):
+    cursor = encode_cursor("newest", {"query": "monza"}, ["2026-10-02T00:00:00", 2])
+
+    page = service.search({"query": "monza"}, limit=2, cursor=cursor)
+
+    service.repository.cards_by_ids.assert_called_once_with([1])
+    assert page["next_cursor"] is None
+    assert "total" not in page
+    service.repository.count.assert_not_called()
+
+
+def test_relevance_pages_follow_the_scores(service):
+    service.repository.ranked_keys.return_value = [(2.5, 4), (1.5, 9), (1.5, 7), (0.5, 8)]
+    cursor = encode_cursor("relevance", {"query": "monza"}, [1.5, 9])
+
+    page = service.search({"query": "monza", "sorting": "relevance"}, limit=2, cursor=cursor)
+
+    service.repository.cards_by_ids.assert_called_once_with([7, 8])
+    assert page["next_cursor"] is None
+
+
+def test_large_results_are_paginated_in_the_database(service, monkeypatch):
+    monkeypatch.setattr(explore_services, "EXPLORE_RESULT_CACHE_MAX_IDS", 2)
+    service.repository.page.return_value = ([card_row(3)], None)
+    cursor = encode_cursor("relevance", {"query": "monza"}, [1.5, 7])
+
+    page = service.search({"query": "monza", "sorting": "relevance"}, cursor=cursor)
+
+    service.repository.page.assert_called_once_with(sorting="relevance", limit=20, after=[1.5, 7], query="monza")
+    assert page["next_cursor"] is None
+    assert "total" not in page
+    service.repository.count.assert_not_called()
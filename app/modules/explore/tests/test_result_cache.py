@@ -0,0 +1,124 @@
+import os
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.modules.explore.services import ExploreService, explore_result_cache, normalize_criteria, position_after
+from core.caching.invalidation import SharedInvalidationLog
+from core.caching.results import GenerationalCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GenerationalCache(SharedInvalidationLog(str(tmp_path / "generation.json")))
+
+
+def test_equivalent_searches_share_a_normalized_key():
+    assert normalize_criteria({"query": "  Mónza GP!", "tags": ["Spa", " f1", "spa"], "author": " Alice "}) == (
+        "newest",
+        {"query": "monza gp", "tags": ["f1", "spa"], "author": "alice"},
+    )
+    assert normalize_criteria({"query": "", "publication_type": "any", "tags": [], "sorting": "relevance"}) == (
+        "newest",
+        {},
+    )
+    assert normalize_criteria({"query": "monza", "sorting": "relevance"})[0] == "relevance"
+
+
+def test_position_after_in_both_directions():
+    descending = [(3, 3), (2, 2), (2, 1), (1, 5)]
+    assert position_after(descending, (2, 2), descending=True) == 2
+    assert position_after(descending, (2, 9), descending=True) == 1
+    assert position_after(descending, (0, 0), descending=True) == 4
+    ascending = list(reversed(descending))
+    assert position_after(ascending, (2, 1), descending=False) == 2
+
+
+def test_typing_in_the_search_box_turns_into_hits(cache):
+    service = ExploreService(result_cache=cache)
+    service.repository = MagicMock()
+    service.repository.ranked_keys.return_value = []
+
+    for query in ("monza", "Monza", " monza ", "MONZA"):
+        service.search({"query": query, "sorting": "newest"})
+
+    service.repository.ranked_keys.assert_called_once()
+    assert cache.cache.hits == 3
+
+
+def test_writes_bump_the_generation(cache):
+    computed = []
+
+    def compute():
+        computed.append(cache.generation())
+        return (len(computed),)
+
+    assert cache.get_or_compute("monza", compute) == (1,)
+    assert cache.get_or_compute("monza", compute) == (1,)
+    cache.bump()
+    assert cache.get_or_compute("monza", compute) == (2,)
+    assert computed == [0, 1]
+
+
+def test_without_a_shared_log_the_generation_is_local():
+    cache = GenerationalCache()
+
+    assert cache.get_or_compute("monza", lambda: 1) == 1
+    assert cache.bump() == 1
+    assert cache.get_or_compute("monza", lambda: 2) == 2
+
+
+def test_the_shared_generation_file_comes_from_the_app_config(test_app):
+    path = os.path.join(test_app.config["SHARED_CACHE_DIR"], "explore_generation.json")
+
+    assert explore_result_cache.generation_log.path == path
+
+
+def test_a_result_computed_before_a_write_is_not_served_after_it(cache):
+    def compute():
+        # Una escritura llega mientras se calcula
+        cache.bump()
+        return ("stale",)
+
+    cache.get_or_compute("monza", compute)
+
+    assert cache.get_or_compute("monza", lambda: ("fresh",)) == ("fresh",)
+
+
+def test_concurrent_misses_are_coalesced(cache):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return (1, 2, 3)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute("monza", compute)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("monza", compute))) for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+    while cache.coalesced < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [(1, 2, 3)] * 4
+
+
+def test_a_failed_miss_releases_the_waiters(cache):
+    def failing():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("monza", failing)
+    assert cache.get_or_compute("monza", lambda: ("ok",)) == ("ok",)
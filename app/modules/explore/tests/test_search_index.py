@@ -0,0 +1,143 @@
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import db
+from app.modules.dataset.models import Author, DataSet, DSMetaData, FormulaDataSet, FormulaResult, PublicationType
+from app.modules.explore.models import SearchDocument, SearchPosting
+from app.modules.explore.repositories import SearchIndexRepository, invalidate_collection_stats
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from core.search import bm25
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    db.metadata.create_all(engine)
+    invalidate_collection_stats()
+    with Session(engine) as session:
+        yield session
+    invalidate_collection_stats()
+
+
+@pytest.fixture
+def index(session):
+    repository = SearchIndexRepository()
+    repository.session = session
+    return repository
+
+
+def make_dataset(title, description="", tags="", authors=(), models=()):
+    metadata = DSMetaData(
+        title=title, description=description, tags=tags, publication_type=PublicationType.NONE, dataset_doi="10.1/x"
+    )
+    metadata.authors = [Author(name=name, affiliation=affiliation) for name, affiliation in authors]
+    dataset = DataSet(dataset_type="base", user_id=1, ds_meta_data=metadata)
+    for uvl_filename, model_title in models:
+        dataset.feature_models.append(
+            FeatureModel(
+                fm_meta_data=FMMetaData(
+                    uvl_filename=uvl_filename, title=model_title, description="", publication_type=PublicationType.NONE
+                )
+            )
+        )
+    return dataset
+
+
+def test_tokenize_normalizes_accents_and_punctuation():
+    assert bm25.tokenize("Fórmula-1: GP de España, file1.uvl") == ["formula", "1", "gp", "de", "espana", "file1", "uvl"]
+
+
+def test_score_requires_every_query_word_and_saturates_frequency():
+    groups = [
+        {"alpha": [(1, 3, 10), (2, 30, 10)]},
+        {"beta": [(1, 1, 10), (3, 1, 10)]},
+    ]
+
+    scores = bm25.score(groups, documents=10, average_length=10)
+
+    assert set(scores) == {1}
+    single = bm25.score([{"alpha": [(1, 3, 10), (2, 30, 10)]}], documents=10, average_length=10)
+    assert single[2] > single[1]
+    assert single[2] < single[1] * 10 / 3
+
+
+def test_commit_indexes_datasets_and_authors(session, index):
+    alpha = make_dataset("The Alpha Dataset", tags="tag1, common", authors=[("Alice Smith", "University A")])
+    beta = make_dataset(
+        "The Beta Collection",
+        description="About alpha",
+        authors=[("Bob Jones", "Company B")],
+        models=[("beta.uvl", "FM")],
+    )
+    session.add_all([alpha, beta])
+    session.commit()
+
+    assert set(index.search("alpha")) == {alpha.id, beta.id}
+    assert set(index.search("Bob Jones")) == {beta.id}
+    assert set(index.search("beta.uvl")) == {beta.id}
+    # El título pesa más que la descripción
+    scores = index.search("alpha")
+    assert scores[alpha.id] > scores[beta.id]
+    # La última palabra también se busca como prefijo
+    assert set(index.search("alice smi")) == {alpha.id}
+    assert index.search("alice jones") == {}
+
+
+def test_metadata_changes_and_deletions_update_the_index(session, index):
+    dataset = make_dataset("Gamma Ray Data", authors=[("Carol", None)])
+    session.add(dataset)
+    session.commit()
+
+    dataset.ds_meta_data.title = "Delta Data"
+    session.commit()
+    assert index.search("gamma") == {}
+    assert set(index.search("delta")) == {dataset.id}
+
+    session.delete(dataset)
+    session.commit()
+    assert index.search("delta") == {}
+    assert session.query(SearchPosting).count() == 0
+
+
+def test_formula_race_fields_are_indexed(session, index):
+    race = FormulaDataSet(
+        user_id=1,
+        ds_meta_data=DSMetaData(title="Race", description="", publication_type=PublicationType.NONE),
+        nombre_gp="Gran Premio de Mónaco",
+        anio_temporada=2024,
+        fecha_carrera=date(2024, 5, 26),
+        circuito="Circuit de Monaco",
+    )
+    race.results.append(
+        FormulaResult(piloto_nombre="Charles Leclerc", equipo="Ferrari", posicion_final="1", puntos_obtenidos=25)
+    )
+    session.add(race)
+    session.commit()
+
+    assert set(index.search("monaco 2024 leclerc")) == {race.id}
+
+
+def test_rolled_back_changes_are_not_indexed(session, index):
+    session.add(make_dataset("Epsilon"))
+    session.flush()
+    session.rollback()
+    session.commit()
+
+    assert session.query(SearchDocument).count() == 0
+
+
+@pytest.mark.parametrize("indexed, rebuilt", [(0, True), (3, False)])
+def test_reindex_if_empty_only_runs_after_migrating(test_app, monkeypatch, indexed, rebuilt):
+    service = MagicMock()
+    service.count.return_value = indexed
+    service.rebuild.return_value = 0
+    monkeypatch.setattr("app.modules.explore.services.search_index_service", service)
+
+    result = test_app.test_cli_runner().invoke(args=["explore", "reindex", "--if-empty"])
+
+    assert result.exit_code == 0, result.output
+    assert service.rebuild.called is rebuilt
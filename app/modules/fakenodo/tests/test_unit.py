@@ -10,7 +10,7 @@ from app.modules.fakenodo.services import FakenodoService
 @pytest.fixture
 def app():
     # Configuración de la aplicación
-    app = create_app()
+    app = create_app("testing")
     app.config["TESTING"] = True
 
     # Limpiar el estado global (FAKE_ZENODO_RECORDS) antes y después de cada test
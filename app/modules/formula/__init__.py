@@ -0,0 +1,3 @@
+from core.blueprints.base_blueprint import BaseBlueprint
+
+formula_bp = BaseBlueprint("formula", __name__, template_folder="templates")
@@ -0,0 +1 @@
+console.log("Hi, I am a script loaded from formula module");
\ No newline at end of file
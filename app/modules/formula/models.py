@@ -0,0 +1,177 @@
+from datetime import datetime
+
+from app import db
+
+
+class DriverStanding(db.Model):
+    """Clasificación de pilotos de una temporada, materializada a partir de formula_result."""
+
+    __tablename__ = "formula_driver_standing"
+
+    id = db.Column(db.Integer, primary_key=True)
+    anio_temporada = db.Column(db.Integer, nullable=False)
+    piloto_nombre = db.Column(db.String(120), nullable=False)
+    puntos = db.Column(db.Float, nullable=False, default=0.0)
+    carreras = db.Column(db.Integer, nullable=False, default=0)
+    victorias = db.Column(db.Integer, nullable=False, default=0)
+    podios = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("anio_temporada", "piloto_nombre", name="uq_formula_driver_standing_season_driver"),
+        db.Index("ix_formula_driver_standing_season_puntos", "anio_temporada", "puntos"),
+    )
+
+    def to_dict(self):
+        return {
+            "piloto_nombre": self.piloto_nombre,
+            "puntos": self.puntos,
+            "carreras": self.carreras,
+            "victorias": self.victorias,
+            "podios": self.podios,
+        }
+
+
+class ConstructorStanding(db.Model):
+    """Clasificación de constructores de una temporada, materializada a partir de formula_result."""
+
+    __tablename__ = "formula_constructor_standing"
+
+    id = db.Column(db.Integer, primary_key=True)
+    anio_temporada = db.Column(db.Integer, nullable=False)
+    equipo = db.Column(db.String(120), nullable=False)
+    puntos = db.Column(db.Float, nullable=False, default=0.0)
+    carreras = db.Column(db.Integer, nullable=False, default=0)
+    victorias = db.Column(db.Integer, nullable=False, default=0)
+    podios = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("anio_temporada", "equipo", name="uq_formula_constructor_standing_season_team"),
+        db.Index("ix_formula_constructor_standing_season_puntos", "anio_temporada", "puntos"),
+    )
+
+    def to_dict(self):
+        return {
+            "equipo": self.equipo,
+            "puntos": self.puntos,
+            "carreras": self.carreras,
+            "victorias": self.victorias,
+            "podios": self.podios,
+        }
+
+
+class StandingRace(db.Model):
+    """
+    Carreras incluidas en las clasificaciones y su temporada. Sin clave foránea a propósito:
+    tras borrar un dataset hay que saber qué temporada recalcular.
+    """
+
+    __tablename__ = "formula_standing_race"
+
+    dataset_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    anio_temporada = db.Column(db.Integer, nullable=False, index=True)
+
+
+class DriverCareerStats(db.Model):
+    """Totales de la carrera deportiva de un piloto, precalculados a partir de formula_result."""
+
+    __tablename__ = "formula_driver_career_stats"
+
+    id = db.Column(db.Integer, primary_key=True)
+    piloto_nombre = db.Column(db.String(120), nullable=False, unique=True)
+    carreras = db.Column(db.Integer, nullable=False, default=0)
+    victorias = db.Column(db.Integer, nullable=False, default=0)
+    podios = db.Column(db.Integer, nullable=False, default=0)
+    puntos = db.Column(db.Float, nullable=False, default=0.0)
+    abandonos = db.Column(db.Integer, nullable=False, default=0)
+    vueltas = db.Column(db.Integer, nullable=False, default=0)
+    mejor_posicion = db.Column(db.Integer, nullable=True)
+    primera_temporada = db.Column(db.Integer, nullable=True)
+    ultima_temporada = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "piloto_nombre": self.piloto_nombre,
+            "carreras": self.carreras,
+            "victorias": self.victorias,
+            "podios": self.podios,
+            "puntos": self.puntos,
+            "abandonos": self.abandonos,
+            "vueltas": self.vueltas,
+            "mejor_posicion": self.mejor_posicion,
+            "primera_temporada": self.primera_temporada,
+            "ultima_temporada": self.ultima_temporada,
+        }
+
+
+class TeamCareerStats(db.Model):
+    """Totales históricos de un equipo, precalculados a partir de formula_result."""
+
+    __tablename__ = "formula_team_career_stats"
+
+    id = db.Column(db.Integer, primary_key=True)
+    equipo = db.Column(db.String(120), nullable=False, unique=True)
+    carreras = db.Column(db.Integer, nullable=False, default=0)
+    victorias = db.Column(db.Integer, nullable=False, default=0)
+    podios = db.Column(db.Integer, nullable=False, default=0)
+    puntos = db.Column(db.Float, nullable=False, default=0.0)
+    abandonos = db.Column(db.Integer, nullable=False, default=0)
+    vueltas = db.Column(db.Integer, nullable=False, default=0)
+    mejor_posicion = db.Column(db.Integer, nullable=True)
+    primera_temporada = db.Column(db.Integer, nullable=True)
+    ultima_temporada = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "equipo": self.equipo,
+            "carreras": self.carreras,
+            "victorias": self.victorias,
+            "podios": self.podios,
+            "puntos": self.puntos,
+            "abandonos": self.abandonos,
+            "vueltas": self.vueltas,
+            "mejor_posicion": self.mejor_posicion,
+            "primera_temporada": self.primera_temporada,
+            "ultima_temporada": self.ultima_temporada,
+        }
+
+
+class DriverCircuitStats(db.Model):
+    """Resultados de un piloto en un circuito concreto (carreras, victorias, mejor posición)."""
+
+    __tablename__ = "formula_driver_circuit_stats"
+
+    id = db.Column(db.Integer, primary_key=True)
+    piloto_nombre = db.Column(db.String(120), nullable=False)
+    circuito = db.Column(db.String(200), nullable=False)
+    carreras = db.Column(db.Integer, nullable=False, default=0)
+    victorias = db.Column(db.Integer, nullable=False, default=0)
+    mejor_posicion = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint("piloto_nombre", "circuito", name="uq_formula_driver_circuit_stats_driver_circuit"),
+    )
+
+    def to_dict(self):
+        return {
+            "circuito": self.circuito,
+            "carreras": self.carreras,
+            "victorias": self.victorias,
+            "mejor_posicion": self.mejor_posicion,
+        }
+
+
+class StatsEntry(db.Model):
+    """
+    Pilotos y equipos de cada carrera incluidos en las estadísticas. Sin clave foránea a
+    propósito: tras borrar o corregir una carrera hay que saber a quién recalcular.
+    """
+
+    __tablename__ = "formula_stats_entry"
+
+    dataset_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    piloto_nombre = db.Column(db.String(120), primary_key=True)
+    equipo = db.Column(db.String(120), nullable=False)
@@ -0,0 +1,566 @@
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from app.modules.dataset.models import DataSet, DSMetaData, FormulaDataSet, FormulaResult, FormulaResultDelta
+from app.modules.formula.models import (
+    ConstructorStanding,
+    DriverCareerStats,
+    DriverCircuitStats,
+    DriverStanding,
+    StandingRace,
+    StatsEntry,
+    TeamCareerStats,
+)
+from core.repositories.BaseRepository import BaseRepository
+
+SNAPSHOT_FETCH_SIZE = 10000
+
+# Campos de formula_result que se pueden corregir con un parche (la clave es dataset_id + piloto_nombre)
+RESULT_FIELDS = (
+    "equipo",
+    "motor",
+    "posicion_final",
+    "puntos_obtenidos",
+    "tiempo_carrera",
+    "vueltas_completadas",
+    "estado_carrera",
+)
+
+
+class FormulaSnapshotRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FormulaResult)
+
+    def stream_rows(self, dataset_ids: Optional[Iterable[int]] = None) -> Iterator[dict]:
+        """Recorre formula_result junto a los datos de su carrera sin construir objetos ORM."""
+        statement = (
+            select(
+                FormulaResult.dataset_id,
+                FormulaDataSet.anio_temporada,
+                FormulaResult.puntos_obtenidos,
+                FormulaResult.vueltas_completadas,
+                FormulaResult.piloto_nombre,
+                FormulaResult.equipo,
+                FormulaResult.motor,
+                FormulaResult.posicion_final,
+                FormulaResult.estado_carrera,
+                FormulaDataSet.nombre_gp,
+                FormulaDataSet.circuito,
+            )
+            .join(FormulaDataSet, FormulaDataSet.id == FormulaResult.dataset_id)
+            .order_by(FormulaResult.id)
+            .execution_options(yield_per=SNAPSHOT_FETCH_SIZE)
+        )
+        if dataset_ids is not None:
+            statement = statement.where(FormulaResult.dataset_id.in_(list(dataset_ids)))
+
+        for row in self.session.execute(statement).mappings():
+            yield dict(row)
+
+
+class FormulaTimingRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FormulaResult)
+
+    def race_gaps(self, dataset_id: int) -> List[dict]:
+        """
+        Clasificación de una carrera con la diferencia al ganador y al coche de delante.
+
+        Se calcula en la base de datos con funciones de ventana sobre tiempo_carrera_ms
+        (índice dataset_id + tiempo_carrera_ms). Los pilotos doblados no tienen diferencia en
+        tiempo sino en vueltas (vueltas_perdidas).
+        """
+        # Orden de clasificación: más vueltas primero y, a igualdad, menor tiempo (sin tiempo al final)
+        order = (
+            FormulaResult.vueltas_completadas.desc(),
+            FormulaResult.tiempo_carrera_ms.is_(None),
+            FormulaResult.tiempo_carrera_ms,
+            FormulaResult.id,
+        )
+        leader_laps = func.max(FormulaResult.vueltas_completadas).over()
+        leader_time = func.first_value(FormulaResult.tiempo_carrera_ms).over(order_by=order)
+        ahead_laps = func.lag(FormulaResult.vueltas_completadas).over(order_by=order)
+        ahead_time = func.lag(FormulaResult.tiempo_carrera_ms).over(order_by=order)
+
+        ranked = (
+            select(
+                FormulaResult.piloto_nombre,
+                FormulaResult.equipo,
+                FormulaResult.posicion_final,
+                FormulaResult.vueltas_completadas,
+                FormulaResult.estado_carrera,
+                FormulaResult.tiempo_carrera,
+                FormulaResult.tiempo_carrera_ms,
+                func.row_number().over(order_by=order).label("orden"),
+                (leader_laps - FormulaResult.vueltas_completadas).label("vueltas_perdidas"),
+                case(
+                    (FormulaResult.vueltas_completadas == leader_laps, FormulaResult.tiempo_carrera_ms - leader_time),
+                    else_=None,
+                ).label("gap_ms"),
+                case(
+                    (FormulaResult.vueltas_completadas == ahead_laps, FormulaResult.tiempo_carrera_ms - ahead_time),
+                    else_=None,
+                ).label("interval_ms"),
+            )
+            .where(FormulaResult.dataset_id == dataset_id)
+            .subquery()
+        )
+        statement = select(ranked).order_by(ranked.c.orden)
+        return [dict(row) for row in self.session.execute(statement).mappings()]
+
+    def fastest_races(self, season: Optional[int] = None, limit: int = 10) -> List[dict]:
+        """Carreras más rápidas según el tiempo del ganador."""
+        statement = (
+            select(
+                FormulaResult.dataset_id,
+                FormulaDataSet.nombre_gp,
+                FormulaDataSet.anio_temporada,
+                FormulaDataSet.circuito,
+                FormulaResult.piloto_nombre,
+                FormulaResult.equipo,
+                FormulaResult.tiempo_carrera,
+                FormulaResult.tiempo_carrera_ms,
+            )
+            .join(FormulaDataSet, FormulaDataSet.id == FormulaResult.dataset_id)
+            .where(FormulaResult.posicion_numero == 1, FormulaResult.tiempo_carrera_ms.isnot(None))
+            .order_by(FormulaResult.tiempo_carrera_ms)
+            .limit(limit)
+        )
+        if season is not None:
+            statement = statement.where(FormulaDataSet.anio_temporada == season)
+        return [dict(row) for row in self.session.execute(statement).mappings()]
+
+
+# Solo la tabla formula_dataset: las clasificaciones no necesitan la tabla base "dataset"
+RACES = FormulaDataSet.__table__
+
+
+class FormulaStandingsRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(DriverStanding)
+
+    def seasons_of(self, dataset_id: int) -> set:
+        """Temporada actual del dataset y la que tenía la última vez que se calcularon las clasificaciones."""
+        seasons = set()
+        registered = self.session.get(StandingRace, dataset_id)
+        if registered is not None:
+            seasons.add(registered.anio_temporada)
+        current = self.session.execute(
+            select(RACES.c.anio_temporada).where(RACES.c.id == dataset_id)
+        ).scalar_one_or_none()
+        if current is not None:
+            seasons.add(current)
+        return seasons
+
+    def all_seasons(self) -> List[int]:
+        statement = select(RACES.c.anio_temporada).union(select(StandingRace.anio_temporada))
+        return sorted(self.session.execute(statement).scalars())
+
+    def _aggregate(self, season: int, key):
+        # posicion_numero se obtiene una sola vez con parse_position, igual que en las estadísticas de carrera
+        wins = func.sum(case((FormulaResult.posicion_numero == 1, 1), else_=0))
+        podiums = func.sum(case((FormulaResult.posicion_numero <= 3, 1), else_=0))
+        return (
+            select(
+                literal(season),
+                key,
+                func.sum(FormulaResult.puntos_obtenidos),
+                func.count(func.distinct(FormulaResult.dataset_id)),
+                wins,
+                podiums,
+                literal(datetime.utcnow()),
+            )
+            .join(RACES, RACES.c.id == FormulaResult.dataset_id)
+            .where(RACES.c.anio_temporada == season)
+            .group_by(key)
+        )
+
+    def refresh_season(self, season: int):
+        """
+        Recalcula las clasificaciones de una temporada con INSERT ... SELECT agregado en la base de
+        datos. Solo lee los resultados de esa temporada.
+        """
+        columns = ("anio_temporada", "{key}", "puntos", "carreras", "victorias", "podios", "updated_at")
+        for model, key in ((DriverStanding, "piloto_nombre"), (ConstructorStanding, "equipo")):
+            self.session.execute(delete(model).where(model.anio_temporada == season))
+            self.session.execute(
+                insert(model).from_select(
+                    [column.format(key=key) for column in columns],
+                    self._aggregate(season, getattr(FormulaResult, key)),
+                )
+            )
+
+        self.session.execute(delete(StandingRace).where(StandingRace.anio_temporada == season))
+        self.session.execute(
+            insert(StandingRace).from_select(
+                ["dataset_id", "anio_temporada"],
+                select(RACES.c.id, RACES.c.anio_temporada).where(RACES.c.anio_temporada == season),
+            )
+        )
+
+    def _standings(self, model, season: int, key) -> list:
+        return (
+            self.session.query(model)
+            .filter(model.anio_temporada == season)
+            .order_by(model.puntos.desc(), model.victorias.desc(), model.podios.desc(), key)
+            .all()
+        )
+
+    def driver_standings(self, season: int) -> List[DriverStanding]:
+        return self._standings(DriverStanding, season, DriverStanding.piloto_nombre)
+
+    def constructor_standings(self, season: int) -> List[ConstructorStanding]:
+        return self._standings(ConstructorStanding, season, ConstructorStanding.equipo)
+
+
+class FormulaResultDeltaRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FormulaResultDelta)
+
+    def _result_columns(self):
+        return [FormulaResult.piloto_nombre] + [getattr(FormulaResult, field) for field in RESULT_FIELDS]
+
+    def get_results(self, dataset_id: int, drivers: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """Resultados actuales por piloto. Con `drivers` solo se leen (y bloquean) esas filas."""
+        statement = select(*self._result_columns()).where(FormulaResult.dataset_id == dataset_id)
+        if drivers is not None:
+            statement = statement.where(FormulaResult.piloto_nombre.in_(list(drivers))).with_for_update()
+        return {row["piloto_nombre"]: dict(row) for row in self.session.execute(statement).mappings()}
+
+    def upsert_results(self, rows: List[dict]):
+        """Inserta o actualiza las filas por (dataset_id, piloto_nombre) en una sola sentencia."""
+        statement = mysql_insert(FormulaResult.__table__)
+        derived = ("tiempo_carrera_ms", "posicion_numero")
+        updated = {field: statement.inserted[field] for field in RESULT_FIELDS + derived}
+        self.session.execute(statement.on_duplicate_key_update(**updated), rows)
+
+    def bump_version(self, dataset_id: int, expected_version: int) -> bool:
+        """
+        Incrementa results_version si sigue siendo `expected_version` (bloqueo optimista). Los
+        resultados dejan de ser los del CSV subido, así que se olvida su checksum: una nueva subida
+        del mismo fichero no debe copiar los resultados corregidos.
+        """
+        result = self.session.execute(
+            update(FormulaDataSet.__table__)
+            .where(
+                FormulaDataSet.__table__.c.id == dataset_id,
+                FormulaDataSet.__table__.c.results_version == expected_version,
+            )
+            .values(results_version=expected_version + 1, csv_checksum=None)
+        )
+        return result.rowcount == 1
+
+    def list_versions(self, dataset_id: int) -> List[FormulaResultDelta]:
+        return (
+            self.session.query(FormulaResultDelta)
+            .filter(FormulaResultDelta.dataset_id == dataset_id)
+            .order_by(FormulaResultDelta.version.desc())
+            .all()
+        )
+
+    def deltas_after(self, dataset_id: int, version: int) -> List[FormulaResultDelta]:
+        """Deltas posteriores a `version`, del más reciente al más antiguo."""
+        return (
+            self.session.query(FormulaResultDelta)
+            .filter(FormulaResultDelta.dataset_id == dataset_id, FormulaResultDelta.version > version)
+            .order_by(FormulaResultDelta.version.desc())
+            .all()
+        )
+
+
+# Columnas por las que se puede ordenar la consulta entre datasets; el desempate siempre es formula_result.id
+QUERY_SORT_COLUMNS = {
+    "id": FormulaResult.id,
+    "season": RACES.c.anio_temporada,
+    "points": FormulaResult.puntos_obtenidos,
+    "time": FormulaResult.tiempo_carrera_ms,
+    "position": FormulaResult.posicion_numero,
+}
+QUERY_FETCH_SIZE = 1000
+
+
+class FormulaResultQueryRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FormulaResult)
+
+    def build_statement(
+        self,
+        filters: dict,
+        sort: str = "id",
+        descending: bool = False,
+        after: Optional[tuple] = None,
+        limit: int = 1000,
+    ):
+        """
+        Consulta sobre los resultados de todos los datasets publicados (con DOI).
+
+        Todos los filtros son igualdades o rangos sobre columnas indexadas (ver los índices de
+        FormulaResult y FormulaDataSet) y la paginación es por clave (valor de orden, id), así que
+        la base de datos nunca recorre las páginas anteriores.
+        """
+        dataset_table = DataSet.__table__
+        statement = (
+            select(
+                FormulaResult.id,
+                FormulaResult.dataset_id,
+                RACES.c.nombre_gp,
+                RACES.c.anio_temporada,
+                RACES.c.fecha_carrera,
+                RACES.c.circuito,
+                FormulaResult.piloto_nombre,
+                FormulaResult.equipo,
+                FormulaResult.motor,
+                FormulaResult.posicion_final,
+                FormulaResult.posicion_numero,
+                FormulaResult.puntos_obtenidos,
+                FormulaResult.tiempo_carrera,
+                FormulaResult.tiempo_carrera_ms,
+                FormulaResult.vueltas_completadas,
+                FormulaResult.estado_carrera,
+            )
+            .join(RACES, RACES.c.id == FormulaResult.dataset_id)
+            .join(dataset_table, dataset_table.c.id == FormulaResult.dataset_id)
+            .join(DSMetaData, DSMetaData.id == dataset_table.c.ds_meta_data_id)
+            .where(DSMetaData.dataset_doi.isnot(None))
+        )
+
+        if filters.get("season_from") is not None:
+            statement = statement.where(RACES.c.anio_temporada >= filters["season_from"])
+        if filters.get("season_to") is not None:
+            statement = statement.where(RACES.c.anio_temporada <= filters["season_to"])
+        if filters.get("circuit"):
+            statement = statement.where(RACES.c.circuito.in_(filters["circuit"]))
+        for name, column in (
+            ("driver", FormulaResult.piloto_nombre),
+            ("team", FormulaResult.equipo),
+            ("engine", FormulaResult.motor),
+            ("status", FormulaResult.estado_carrera),
+            ("position", FormulaResult.posicion_final),
+        ):
+            if filters.get(name):
+                statement = statement.where(column.in_(filters[name]))
+        if filters.get("position_min") is not None:
+            statement = statement.where(FormulaResult.posicion_numero >= filters["position_min"])
+        if filters.get("position_max") is not None:
+            statement = statement.where(FormulaResult.posicion_numero <= filters["position_max"])
+
+        column = QUERY_SORT_COLUMNS[sort]
+        if column is not FormulaResult.id:
+            # Las filas sin valor (sin tiempo, DNF...) no entran en una ordenación por esa columna
+            statement = statement.where(column.isnot(None))
+
+        if after is not None:
+            value, last_id = after
+            if column is FormulaResult.id:
+                statement = statement.where(FormulaResult.id < last_id if descending else FormulaResult.id > last_id)
+            elif descending:
+                statement = statement.where(or_(column < value, and_(column == value, FormulaResult.id < last_id)))
+            else:
+                statement = statement.where(or_(column > value, and_(column == value, FormulaResult.id > last_id)))
+
+        order = [column.desc(), FormulaResult.id.desc()] if descending else [column, FormulaResult.id]
+        if column is FormulaResult.id:
+            order = order[:1]
+        return statement.order_by(*order).limit(limit)
+
+    def stream(self, statement) -> Iterator[dict]:
+        """Recorre el resultado por bloques sin construir objetos ORM."""
+        result = self.session.execute(statement.execution_options(yield_per=QUERY_FETCH_SIZE))
+        for row in result.mappings():
+            yield dict(row)
+
+
+# Posiciones que cuentan como abandono en las estadísticas
+DNF_POSITIONS = ("DNF", "RET")
+CAREER_COLUMNS = (
+    "carreras",
+    "victorias",
+    "podios",
+    "puntos",
+    "abandonos",
+    "vueltas",
+    "mejor_posicion",
+    "primera_temporada",
+    "ultima_temporada",
+    "updated_at",
+)
+
+
+class FormulaCareerStatsRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(DriverCareerStats)
+
+    def affected_by(self, dataset_id: int) -> Tuple[Set[str], Set[str]]:
+        """Pilotos y equipos que están (o estaban, antes de borrar o corregir) en una carrera."""
+        previous = select(StatsEntry.piloto_nombre, StatsEntry.equipo).where(StatsEntry.dataset_id == dataset_id)
+        current = select(FormulaResult.piloto_nombre, FormulaResult.equipo).where(
+            FormulaResult.dataset_id == dataset_id
+        )
+        rows = self.session.execute(previous.union(current)).all()
+        return {row[0] for row in rows}, {row[1] for row in rows}
+
+    def _career_select(self, key, names: Optional[Iterable[str]]):
+        statement = (
+            select(
+                key,
+                func.count(func.distinct(FormulaResult.dataset_id)),
+                func.sum(case((FormulaResult.posicion_numero == 1, 1), else_=0)),
+                func.sum(case((FormulaResult.posicion_numero <= 3, 1), else_=0)),
+                func.sum(FormulaResult.puntos_obtenidos),
+                func.sum(case((FormulaResult.posicion_final.in_(DNF_POSITIONS), 1), else_=0)),
+                func.coalesce(func.sum(FormulaResult.vueltas_completadas), 0),
+                func.min(FormulaResult.posicion_numero),
+                func.min(RACES.c.anio_temporada),
+                func.max(RACES.c.anio_temporada),
+                literal(datetime.utcnow()),
+            )
+            .join(RACES, RACES.c.id == FormulaResult.dataset_id)
+            .group_by(key)
+        )
+        if names is not None:
+            statement = statement.where(key.in_(list(names)))
+        return statement
+
+    def _circuit_select(self, drivers: Optional[Iterable[str]]):
+        statement = (
+            select(
+                FormulaResult.piloto_nombre,
+                RACES.c.circuito,
+                func.count(func.distinct(FormulaResult.dataset_id)),
+                func.sum(case((FormulaResult.posicion_numero == 1, 1), else_=0)),
+                func.min(FormulaResult.posicion_numero),
+            )
+            .join(RACES, RACES.c.id == FormulaResult.dataset_id)
+            .group_by(FormulaResult.piloto_nombre, RACES.c.circuito)
+        )
+        if drivers is not None:
+            statement = statement.where(FormulaResult.piloto_nombre.in_(list(drivers)))
+        return statement
+
+    def refresh(self, drivers: Optional[Set[str]] = None, teams: Optional[Set[str]] = None):
+        """
+        Recalcula las estadísticas de los pilotos y equipos indicados (None = todos) con
+        INSERT ... SELECT agregado, usando los índices por piloto_nombre y equipo.
+        """
+        for model, key, names in (
+            (DriverCareerStats, "piloto_nombre", drivers),
+            (TeamCareerStats, "equipo", teams),
+        ):
+            if names is not None and not names:
+                continue
+            column = getattr(model, key)
+            cleanup = delete(model) if names is None else delete(model).where(column.in_(list(names)))
+            self.session.execute(cleanup)
+            self.session.execute(
+                insert(model).from_select(
+                    [key, *CAREER_COLUMNS], self._career_select(getattr(FormulaResult, key), names)
+                )
+            )
+
+        if drivers is None or drivers:
+            cleanup = delete(DriverCircuitStats)
+            if drivers is not None:
+                cleanup = cleanup.where(DriverCircuitStats.piloto_nombre.in_(list(drivers)))
+            self.session.execute(cleanup)
+            self.session.execute(
+                insert(DriverCircuitStats).from_select(
+                    ["piloto_nombre", "circuito", "carreras", "victorias", "mejor_posicion"],
+                    self._circuit_select(drivers),
+                )
+            )
+
+    def register_entries(self, dataset_id: Optional[int] = None):
+        """Guarda los pilotos y equipos actuales de una carrera (o de todas) en formula_stats_entry."""
+        entries = select(FormulaResult.dataset_id, FormulaResult.piloto_nombre, FormulaResult.equipo)
+        cleanup = delete(StatsEntry)
+        if dataset_id is not None:
+            entries = entries.where(FormulaResult.dataset_id == dataset_id)
+            cleanup = cleanup.where(StatsEntry.dataset_id == dataset_id)
+        self.session.execute(cleanup)
+        self.session.execute(insert(StatsEntry).from_select(["dataset_id", "piloto_nombre", "equipo"], entries))
+
+    def get_driver(self, name: str) -> Optional[DriverCareerStats]:
+        return self.session.query(DriverCareerStats).filter(DriverCareerStats.piloto_nombre == name).one_or_none()
+
+    def get_driver_circuits(self, name: str) -> List[DriverCircuitStats]:
+        return (
+            self.session.query(DriverCircuitStats)
+            .filter(DriverCircuitStats.piloto_nombre == name)
+            .order_by(DriverCircuitStats.circuito)
+            .all()
+        )
+
+    def get_team(self, name: str) -> Optional[TeamCareerStats]:
+        return self.session.query(TeamCareerStats).filter(TeamCareerStats.equipo == name).one_or_none()
+
+
+class FormulaHeadToHeadRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FormulaResult)
+
+    def _per_race(self, key, name: str):
+        """Mejor posición, puntos, abandonos y coches de un piloto o equipo en cada carrera."""
+        return (
+            select(
+                FormulaResult.dataset_id,
+                func.min(FormulaResult.posicion_numero).label("mejor"),
+                func.sum(FormulaResult.puntos_obtenidos).label("puntos"),
+                func.sum(case((FormulaResult.posicion_final.in_(DNF_POSITIONS), 1), else_=0)).label("abandonos"),
+                func.count().label("coches"),
+            )
+            .where(key == name)
+            .group_by(FormulaResult.dataset_id)
+            .subquery()
+        )
+
+    def compare(
+        self, key, name_a: str, name_b: str, season_from: Optional[int] = None, season_to: Optional[int] = None
+    ) -> dict:
+        """
+        Compara dos pilotos (o equipos) en las carreras que disputaron ambos, con un único join
+        entre sus resultados agrupados por carrera. Un coche clasificado va por delante de uno sin
+        posición (DNF, DSQ...); si ninguno tiene posición, no cuenta para ninguno.
+        """
+        a = self._per_race(key, name_a)
+        b = self._per_race(key, name_b)
+
+        def ahead(first, second):
+            return func.coalesce(
+                func.sum(
+                    case(
+                        (
+                            and_(
+                                first.c.mejor.isnot(None), or_(second.c.mejor.is_(None), first.c.mejor < second.c.mejor)
+                            ),
+                            1,
+                        ),
+                        else_=0,
+                    )
+                ),
+                0,
+            )
+
+        statement = (
+            select(
+                func.count().label("carreras"),
+                ahead(a, b).label("por_delante_a"),
+                ahead(b, a).label("por_delante_b"),
+                func.coalesce(func.sum(a.c.puntos), 0).label("puntos_a"),
+                func.coalesce(func.sum(b.c.puntos), 0).label("puntos_b"),
+                func.coalesce(func.sum(a.c.abandonos), 0).label("abandonos_a"),
+                func.coalesce(func.sum(b.c.abandonos), 0).label("abandonos_b"),
+                func.coalesce(func.sum(a.c.coches), 0).label("coches_a"),
+                func.coalesce(func.sum(b.c.coches), 0).label("coches_b"),
+            )
+            .select_from(a)
+            .join(b, b.c.dataset_id == a.c.dataset_id)
+            .join(RACES, RACES.c.id == a.c.dataset_id)
+        )
+        if season_from is not None:
+            statement = statement.where(RACES.c.anio_temporada >= season_from)
+        if season_to is not None:
+            statement = statement.where(RACES.c.anio_temporada <= season_to)
+        return dict(self.session.execute(statement).mappings().one())
@@ -0,0 +1,222 @@
+from flask import Response, jsonify, request, stream_with_context
+from flask_login import current_user, login_required
+
+from app.modules.dataset.models import FormulaDataSet
+from app.modules.formula import formula_bp
+from app.modules.formula.services import (
+    HEAD_TO_HEAD_KINDS,
+    FormulaPatchError,
+    FormulaQueryError,
+    FormulaResultDeltaService,
+    FormulaResultQueryService,
+    FormulaTimingService,
+    FormulaVersionConflict,
+    formula_career_stats_service,
+    formula_head_to_head_service,
+    formula_snapshot_service,
+    formula_standings_service,
+    read_patch_csv,
+)
+from app.modules.formula.snapshot import STRING_COLUMNS
+
+formula_timing_service = FormulaTimingService()
+formula_result_delta_service = FormulaResultDeltaService()
+formula_result_query_service = FormulaResultQueryService()
+
+MAX_FASTEST_LIMIT = 100
+
+
+@formula_bp.route("/formula/analytics/points", methods=["GET"])
+def analytics_points():
+    """Puntos totales agrupados por piloto, equipo, motor... calculados sobre el snapshot columnar."""
+    group_by = request.args.get("by", "piloto_nombre")
+    season = request.args.get("season", type=int)
+
+    if group_by not in STRING_COLUMNS:
+        return jsonify({"error": f"'by' must be one of: {', '.join(STRING_COLUMNS)}"}), 400
+
+    snapshot = formula_snapshot_service.get_snapshot()
+    if snapshot is None:
+        return jsonify({"message": "Analytics snapshot is being built, try again in a few seconds"}), 503
+
+    totals = snapshot.group_sum(group_by, season=season)
+    races = snapshot.group_count(group_by, season=season)
+    ranking = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    return jsonify(
+        {
+            "version": snapshot.version,
+            "by": group_by,
+            "season": season,
+            "results": [{group_by: key, "points": points, "entries": races.get(key, 0)} for key, points in ranking],
+        }
+    )
+
+
+@formula_bp.route("/formula/datasets/<int:dataset_id>/gaps", methods=["GET"])
+def race_gaps(dataset_id):
+    """Clasificación de la carrera con diferencia al ganador e intervalo con el coche de delante."""
+    race = formula_timing_service.race_gaps(dataset_id)
+    if race is None:
+        return jsonify({"error": "Formula dataset not found"}), 404
+    return jsonify(race)
+
+
+@formula_bp.route("/formula/analytics/fastest", methods=["GET"])
+def fastest_races():
+    """Carreras más rápidas según el tiempo del ganador."""
+    season = request.args.get("season", type=int)
+    limit = min(max(request.args.get("limit", 10, type=int), 1), MAX_FASTEST_LIMIT)
+    return jsonify({"season": season, "results": formula_timing_service.fastest_races(season=season, limit=limit)})
+
+
+@formula_bp.route("/formula/standings/<int:season>/drivers", methods=["GET"])
+def driver_standings(season):
+    """Clasificación de pilotos de una temporada."""
+    return jsonify({"season": season, "results": formula_standings_service.driver_standings(season)})
+
+
+@formula_bp.route("/formula/standings/<int:season>/constructors", methods=["GET"])
+def constructor_standings(season):
+    """Clasificación de constructores de una temporada."""
+    return jsonify({"season": season, "results": formula_standings_service.constructor_standings(season)})
+
+
+@formula_bp.route("/formula/drivers/<string:name>/stats", methods=["GET"])
+def driver_career_stats(name):
+    """Estadísticas de carrera de un piloto, con su mejor resultado en cada circuito."""
+    stats = formula_career_stats_service.driver_stats(name)
+    if stats is None:
+        return jsonify({"error": "Driver not found"}), 404
+    return jsonify(stats)
+
+
+@formula_bp.route("/formula/teams/<string:name>/stats", methods=["GET"])
+def team_career_stats(name):
+    """Estadísticas históricas de un equipo."""
+    stats = formula_career_stats_service.team_stats(name)
+    if stats is None:
+        return jsonify({"error": "Team not found"}), 404
+    return jsonify(stats)
+
+
+@formula_bp.route("/formula/head-to-head/<string:kind>", methods=["GET"])
+def head_to_head(kind):
+    """Compara dos pilotos (kind=drivers) o dos equipos (kind=teams): ?a=...&b=...&season_from=&season_to="""
+    if kind not in HEAD_TO_HEAD_KINDS:
+        return jsonify({"error": f"Kind must be one of: {', '.join(HEAD_TO_HEAD_KINDS)}"}), 404
+    name_a = request.args.get("a", "").strip()
+    name_b = request.args.get("b", "").strip()
+    if not name_a or not name_b or name_a == name_b:
+        return jsonify({"error": "Provide two different names in 'a' and 'b'"}), 400
+
+    comparison = formula_head_to_head_service.compare(
+        kind,
+        name_a,
+        name_b,
+        season_from=request.args.get("season_from", type=int),
+        season_to=request.args.get("season_to", type=int),
+    )
+    return jsonify(comparison)
+
+
+@formula_bp.route("/formula/results/query", methods=["GET"])
+def query_results():
+    """
+    Resultados de todas las carreras publicadas, filtrados y ordenados, en NDJSON (una fila por línea).
+
+    Filtros: season, season_from, season_to, circuit, driver, team, engine, status, position
+    (admiten varios valores separados por comas), position_min y position_max. Orden con
+    sort=id|season|points|time|position ("-" delante para descendente), limit y cursor.
+    """
+    try:
+        query = formula_result_query_service.parse_args(request.args)
+    except FormulaQueryError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    return Response(
+        stream_with_context(formula_result_query_service.stream_ndjson(query)), mimetype="application/x-ndjson"
+    )
+
+
+def _get_owned_dataset(dataset_id):
+    """Devuelve (dataset, None) o (None, respuesta de error) si no existe o no es del usuario."""
+    dataset = FormulaDataSet.query.get(dataset_id)
+    if dataset is None:
+        return None, (jsonify({"error": "Formula dataset not found"}), 404)
+    if dataset.user_id != current_user.id:
+        return None, (jsonify({"error": "You are not the owner of this dataset"}), 403)
+    return dataset, None
+
+
+@formula_bp.route("/formula/datasets/<int:dataset_id>/results", methods=["PATCH"])
+@login_required
+def patch_results(dataset_id):
+    """
+    Corrige o añade resultados de pilotos sin volver a subir el CSV completo.
+
+    Acepta JSON {"rows": [{"piloto_nombre": ..., "<campo>": ...}], "comment": ..., "base_version": ...}
+    o un formulario multipart con csv_file (piloto_nombre + columnas a cambiar), comment y base_version.
+    """
+    dataset, error = _get_owned_dataset(dataset_id)
+    if error:
+        return error
+
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        rows = data.get("rows")
+        comment = data.get("comment")
+        base_version = data.get("base_version")
+    else:
+        csv_file = request.files.get("csv_file")
+        rows = read_patch_csv(csv_file.stream) if csv_file else None
+        comment = request.form.get("comment")
+        base_version = request.form.get("base_version", type=int)
+
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"error": "Send a non-empty 'rows' list or a 'csv_file'"}), 400
+    if base_version is not None and not isinstance(base_version, int):
+        return jsonify({"error": "'base_version' must be an integer"}), 400
+
+    try:
+        delta = formula_result_delta_service.apply_patch(
+            dataset, rows, user_id=current_user.id, comment=comment, base_version=base_version
+        )
+    except FormulaPatchError as exc:
+        return jsonify({"error": str(exc), "errors": exc.errors}), 400
+    except FormulaVersionConflict as exc:
+        return jsonify({"error": str(exc), "current_version": exc.current_version}), 409
+
+    if delta is None:
+        return jsonify({"message": "No changes", "version": dataset.results_version}), 200
+    return jsonify({"message": "Results updated", "version": delta.version, "changes": delta.get_changes()}), 200
+
+
+@formula_bp.route("/formula/datasets/<int:dataset_id>/versions", methods=["GET"])
+@login_required
+def list_result_versions(dataset_id):
+    """Historial de correcciones de los resultados, de la más reciente a la más antigua."""
+    dataset, error = _get_owned_dataset(dataset_id)
+    if error:
+        return error
+    return jsonify(
+        {
+            "dataset_id": dataset.id,
+            "current_version": dataset.results_version,
+            "versions": formula_result_delta_service.list_versions(dataset),
+        }
+    )
+
+
+@formula_bp.route("/formula/datasets/<int:dataset_id>/versions/<int:version>", methods=["GET"])
+@login_required
+def get_result_version(dataset_id, version):
+    """Resultados de la carrera tal y como estaban en una versión anterior."""
+    dataset, error = _get_owned_dataset(dataset_id)
+    if error:
+        return error
+
+    results = formula_result_delta_service.get_version(dataset, version)
+    if results is None:
+        return jsonify({"error": "Version not found"}), 404
+    return jsonify({"dataset_id": dataset.id, "version": version, "results": results})
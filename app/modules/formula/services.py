@@ -0,0 +1,700 @@
+import base64
+import binascii
+import csv
+import fcntl
+import io
+import json
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import click
+from flask import current_app
+
+from app.modules.dataset.models import FormulaDataSet, FormulaResult, FormulaResultDelta
+from app.modules.dataset.services import parse_position, parse_race_time_ms
+from app.modules.dataset.signals import dataset_changed, send_dataset_changed
+from app.modules.dataset.validators import COLUMN_CHECKS, NULL_VALUES
+from app.modules.formula import formula_bp
+from app.modules.formula.repositories import (
+    QUERY_SORT_COLUMNS,
+    RESULT_FIELDS,
+    FormulaCareerStatsRepository,
+    FormulaHeadToHeadRepository,
+    FormulaResultDeltaRepository,
+    FormulaResultQueryRepository,
+    FormulaSnapshotRepository,
+    FormulaStandingsRepository,
+    FormulaTimingRepository,
+)
+from app.modules.formula.snapshot import ColumnarSnapshot, ColumnarSnapshotStore
+from core.caching.invalidation import SharedInvalidationLog
+from core.caching.lru import LRUCache
+from core.configuration.configuration import shared_cache_dir, uploads_folder_name
+from core.services.BaseService import BaseService
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_directory() -> str:
+    return os.getenv(
+        "FORMULA_SNAPSHOT_DIR", os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name(), "formula_snapshot")
+    )
+
+
+class FormulaSnapshotService:
+    """
+    Construye y sirve el snapshot columnar de formula_result.
+
+    Las reconstrucciones se hacen en un hilo de fondo; un flock sobre el directorio evita que
+    dos workers de gunicorn escriban a la vez. Los lectores reabren el snapshot solo cuando
+    cambia el manifest.
+    """
+
+    def __init__(self, directory: Optional[str] = None, repository: Optional[FormulaSnapshotRepository] = None):
+        self.store = ColumnarSnapshotStore(directory or snapshot_directory())
+        self.repository = repository or FormulaSnapshotRepository()
+        self._snapshot = None
+        self._manifest_mtime = None
+        self._jobs = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    @contextmanager
+    def _writer_lock(self):
+        os.makedirs(self.store.directory, exist_ok=True)
+        with open(os.path.join(self.store.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def rebuild(self):
+        """Reconstruye el snapshot completo a partir de la base de datos."""
+        with self._writer_lock():
+            manifest = self.store.replace_all(self.repository.stream_rows())
+        logger.info(f"Formula snapshot rebuilt (version {manifest['version']})")
+
+    def apply(self, action: str, dataset_id: int):
+        """Aplica de forma incremental el alta, cambio o baja de un FormulaDataSet."""
+        with self._writer_lock():
+            manifest = self.store.read_manifest()
+            if manifest is None:
+                manifest = self.store.replace_all(self.repository.stream_rows())
+            elif action == "deleted":
+                manifest = self.store.remove([dataset_id])
+            else:
+                manifest = self.store.append([dataset_id], self.repository.stream_rows([dataset_id]))
+
+            if self.store.needs_compaction(manifest):
+                manifest = self.store.replace_all(self.repository.stream_rows())
+        logger.info(f"Formula snapshot updated after {action} of dataset {dataset_id} (version {manifest['version']})")
+
+    def schedule(self, action: str, dataset_id: Optional[int] = None):
+        """Encola una actualización para el hilo de fondo. Sin dataset_id se reconstruye entero."""
+        self._jobs.put((current_app._get_current_object(), action, dataset_id))
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="formula-snapshot", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                app, action, dataset_id = self._jobs.get(timeout=5)
+            except queue.Empty:
+                return
+            try:
+                with app.app_context():
+                    if dataset_id is None:
+                        self.rebuild()
+                    else:
+                        self.apply(action, dataset_id)
+            except Exception as exc:
+                logger.exception(f"Error updating formula snapshot: {exc}")
+
+    def get_snapshot(self) -> Optional[ColumnarSnapshot]:
+        """Devuelve el snapshot actual. Si aún no existe, lanza su construcción y devuelve None."""
+        try:
+            mtime = os.stat(self.store.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            if self._jobs.empty():
+                self.schedule("rebuild")
+            return None
+
+        if mtime != self._manifest_mtime:
+            try:
+                self._snapshot = self.store.open()
+                self._manifest_mtime = mtime
+            except FileNotFoundError:
+                # Se ha compactado entre la lectura del manifest y la de los segmentos; se usa el anterior
+                logger.info("Formula snapshot changed while opening it, keeping the previous version")
+        return self._snapshot
+
+
+formula_snapshot_service = FormulaSnapshotService()
+
+
+def format_gap(milliseconds: Optional[int]) -> Optional[str]:
+    """Formatea una diferencia en milisegundos como en las clasificaciones: "+1:02.345", "+0.320"."""
+    if milliseconds is None:
+        return None
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds = milliseconds / 1000
+    return f"+{minutes}:{seconds:06.3f}" if minutes else f"+{seconds:.3f}"
+
+
+class FormulaTimingService(BaseService):
+    def __init__(self):
+        super().__init__(FormulaTimingRepository())
+
+    def race_gaps(self, dataset_id: int) -> Optional[dict]:
+        dataset = FormulaDataSet.query.get(dataset_id)
+        if dataset is None:
+            return None
+
+        results = self.repository.race_gaps(dataset_id)
+        for result in results:
+            result["gap"] = format_gap(result["gap_ms"]) if result["orden"] > 1 else None
+            result["interval"] = format_gap(result["interval_ms"])
+            if result["vueltas_perdidas"]:
+                result["gap"] = f"+{result['vueltas_perdidas']} vuelta(s)"
+        return {
+            "dataset_id": dataset.id,
+            "nombre_gp": dataset.nombre_gp,
+            "anio_temporada": dataset.anio_temporada,
+            "results": results,
+        }
+
+    def fastest_races(self, season: Optional[int] = None, limit: int = 10):
+        return self.repository.fastest_races(season=season, limit=limit)
+
+
+class FormulaPatchError(Exception):
+    """El parche no es válido; lleva la lista de errores por fila para devolverla al cliente."""
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"El parche no es válido: {len(errors)} errores encontrados.")
+        self.errors = errors
+
+
+class FormulaVersionConflict(Exception):
+    """Otro parche se ha aplicado antes que este sobre la misma versión de los resultados."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Los resultados han cambiado, la versión actual es {current_version}.")
+        self.current_version = current_version
+
+
+def _convert_field(field: str, value):
+    if field == "puntos_obtenidos":
+        return float(value)
+    if field == "vueltas_completadas":
+        return None if value in NULL_VALUES else int(value)
+    return None if value in NULL_VALUES else value
+
+
+def parse_patch_rows(rows: List[dict]) -> Dict[str, dict]:
+    """
+    Valida y convierte las filas de un parche. Cada fila lleva piloto_nombre y solo los campos
+    que cambian; se devuelve {piloto: {campo: valor}}. Lanza FormulaPatchError si hay errores.
+    """
+    errors = []
+    changes = {}
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "column": "", "value": "", "error": "Cada fila debe ser un objeto"})
+            continue
+        driver = str(row.get("piloto_nombre") or "").strip()
+        if not driver:
+            errors.append({"row": index, "column": "piloto_nombre", "value": "", "error": "Valor obligatorio"})
+            continue
+        if driver in changes:
+            errors.append({"row": index, "column": "piloto_nombre", "value": driver, "error": "Piloto repetido"})
+            continue
+
+        values = {}
+        for field, raw_value in row.items():
+            if field == "piloto_nombre":
+                continue
+            if field not in RESULT_FIELDS:
+                errors.append({"row": index, "column": field, "value": raw_value, "error": "Campo no modificable"})
+                continue
+            value = "" if raw_value is None else str(raw_value).strip()
+            check = COLUMN_CHECKS.get(field)
+            message = check(value) if check else None
+            if field in ("equipo", "posicion_final", "puntos_obtenidos") and value in NULL_VALUES:
+                message = "Valor obligatorio"
+            if message:
+                errors.append({"row": index, "column": field, "value": value, "error": message})
+                continue
+            values[field] = _convert_field(field, value)
+        changes[driver] = values
+
+    if errors:
+        raise FormulaPatchError(errors)
+    return changes
+
+
+def read_patch_csv(stream: BinaryIO) -> List[dict]:
+    """Lee un CSV de parche: piloto_nombre y las columnas a corregir. Las celdas vacías no cambian."""
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        reader = csv.DictReader(text_stream)
+        rows = []
+        for row in reader:
+            rows.append({key.strip(): value for key, value in row.items() if key and (value or key == "piloto_nombre")})
+        return rows
+    except UnicodeDecodeError:
+        raise FormulaPatchError(
+            [{"row": 0, "column": "", "value": "", "error": "El archivo no está codificado en UTF-8"}]
+        )
+    finally:
+        text_stream.detach()
+
+
+def _apply_values(row: dict, values: dict):
+    row.update(values)
+    row["tiempo_carrera_ms"] = parse_race_time_ms(row.get("tiempo_carrera"))
+    row["posicion_numero"] = parse_position(row.get("posicion_final"))
+
+
+class FormulaResultDeltaService(BaseService):
+    """
+    Correcciones incrementales de los resultados de una carrera.
+
+    Un parche solo lee y escribe las filas de los pilotos afectados (upsert por dataset_id +
+    piloto_nombre) y guarda un delta con los valores anterior y nuevo de los campos que cambian.
+    Una versión antigua se reconstruye deshaciendo, sobre los resultados actuales, los deltas
+    posteriores a ella, así que el coste depende del número de correcciones y no del tamaño del CSV.
+    """
+
+    def __init__(self):
+        super().__init__(FormulaResultDeltaRepository())
+
+    def apply_patch(
+        self,
+        dataset: FormulaDataSet,
+        rows: List[dict],
+        user_id: Optional[int] = None,
+        comment: Optional[str] = None,
+        base_version: Optional[int] = None,
+    ) -> Optional[FormulaResultDelta]:
+        """
+        Aplica un parche y devuelve el delta guardado (None si no cambia nada).
+
+        `base_version` es la versión sobre la que el cliente ha preparado el parche; si no se indica
+        se usa la actual. Lanza FormulaVersionConflict si otro parche se ha aplicado entretanto.
+        """
+        patch = parse_patch_rows(rows)
+        if not patch:
+            return None
+
+        version = dataset.results_version if base_version is None else base_version
+        try:
+            # El UPDATE bloquea la fila del dataset hasta el commit: los parches concurrentes se serializan
+            if not self.repository.bump_version(dataset.id, version):
+                self.repository.session.rollback()
+                raise FormulaVersionConflict(FormulaDataSet.query.get(dataset.id).results_version)
+
+            current = self.repository.get_results(dataset.id, drivers=patch.keys())
+            changes = []
+            upserts = []
+            errors = []
+            for driver, values in patch.items():
+                before_row = current.get(driver)
+                if before_row is None:
+                    missing = [field for field in ("equipo", "posicion_final") if field not in values]
+                    if missing:
+                        errors.append(
+                            {
+                                "row": 0,
+                                "column": ",".join(missing),
+                                "value": driver,
+                                "error": "Faltan campos en un piloto nuevo",
+                            }
+                        )
+                        continue
+                    row = {"piloto_nombre": driver, **dict.fromkeys(RESULT_FIELDS), "puntos_obtenidos": 0.0}
+                    changed = dict(values)
+                    before = None
+                else:
+                    row = dict(before_row)
+                    changed = {field: value for field, value in values.items() if row.get(field) != value}
+                    if not changed:
+                        continue
+                    before = {field: row.get(field) for field in changed}
+
+                _apply_values(row, changed)
+                upserts.append({"dataset_id": dataset.id, **row})
+                changes.append({"piloto_nombre": driver, "before": before, "after": changed})
+
+            if errors:
+                raise FormulaPatchError(errors)
+            if not changes:
+                self.repository.session.rollback()
+                return None
+
+            self.repository.upsert_results(upserts)
+            delta = self.repository.create(
+                commit=False,
+                dataset_id=dataset.id,
+                version=version + 1,
+                user_id=user_id,
+                comment=(comment or None) and comment[:255],
+                changes=json.dumps(changes),
+            )
+            self.repository.session.commit()
+        except Exception:
+            self.repository.session.rollback()
+            raise
+
+        send_dataset_changed(dataset.id, "formula", "updated")
+        return delta
+
+    def list_versions(self, dataset: FormulaDataSet) -> List[dict]:
+        return [
+            {
+                "version": delta.version,
+                "user_id": delta.user_id,
+                "comment": delta.comment,
+                "created_at": delta.created_at.isoformat() if delta.created_at else None,
+                "drivers": [change["piloto_nombre"] for change in delta.get_changes()],
+            }
+            for delta in self.repository.list_versions(dataset.id)
+        ]
+
+    def get_version(self, dataset: FormulaDataSet, version: int) -> Optional[List[dict]]:
+        """Resultados tal y como estaban en `version`. None si esa versión no existe."""
+        if version < 0 or version > dataset.results_version:
+            return None
+
+        results = self.repository.get_results(dataset.id)
+        for delta in self.repository.deltas_after(dataset.id, version):
+            for change in delta.get_changes():
+                driver = change["piloto_nombre"]
+                if change["before"] is None:
+                    results.pop(driver, None)
+                elif driver in results:
+                    results[driver].update(change["before"])
+        return list(results.values())
+
+
+class FormulaStandingsService(BaseService):
+    """
+    Clasificaciones de pilotos y constructores por temporada.
+
+    Se guardan materializadas (una fila por piloto o equipo y temporada) y se mantienen al día
+    cada vez que se crea, corrige o borra una carrera: solo se recalcula la temporada afectada.
+    Leer una clasificación cuesta lo mismo que el número de pilotos, no que el de resultados.
+    """
+
+    def __init__(self):
+        super().__init__(FormulaStandingsRepository())
+
+    def refresh_for_dataset(self, dataset_id: int) -> List[int]:
+        """Recalcula las temporadas en las que está (o estaba, si se ha borrado) la carrera."""
+        seasons = sorted(self.repository.seasons_of(dataset_id))
+        self._refresh(seasons)
+        return seasons
+
+    def rebuild(self) -> List[int]:
+        seasons = self.repository.all_seasons()
+        self._refresh(seasons)
+        return seasons
+
+    def _refresh(self, seasons: List[int]):
+        try:
+            for season in seasons:
+                self.repository.refresh_season(season)
+            self.repository.session.commit()
+        except Exception:
+            self.repository.session.rollback()
+            raise
+
+    def _ranked(self, standings) -> List[dict]:
+        return [{"posicion": position, **standing.to_dict()} for position, standing in enumerate(standings, start=1)]
+
+    def driver_standings(self, season: int) -> List[dict]:
+        return self._ranked(self.repository.driver_standings(season))
+
+    def constructor_standings(self, season: int) -> List[dict]:
+        return self._ranked(self.repository.constructor_standings(season))
+
+
+formula_standings_service = FormulaStandingsService()
+
+
+class FormulaCareerStatsService(BaseService):
+    """
+    Estadísticas de carrera de pilotos y equipos (carreras, victorias, podios, puntos, abandonos,
+    vueltas y mejor posición por circuito), precalculadas en tablas con clave única por nombre.
+
+    Al crear, corregir o borrar una carrera solo se recalculan sus pilotos y equipos; las
+    consultas son una búsqueda por clave, independiente de cuántas temporadas haya cargadas.
+    """
+
+    def __init__(self):
+        super().__init__(FormulaCareerStatsRepository())
+
+    def refresh_for_dataset(self, dataset_id: int):
+        try:
+            drivers, teams = self.repository.affected_by(dataset_id)
+            self.repository.refresh(drivers=drivers, teams=teams)
+            self.repository.register_entries(dataset_id)
+            self.repository.session.commit()
+        except Exception:
+            self.repository.session.rollback()
+            raise
+
+    def rebuild(self):
+        try:
+            self.repository.refresh()
+            self.repository.register_entries()
+            self.repository.session.commit()
+        except Exception:
+            self.repository.session.rollback()
+            raise
+
+    def driver_stats(self, name: str) -> Optional[dict]:
+        stats = self.repository.get_driver(name)
+        if stats is None:
+            return None
+        data = stats.to_dict()
+        data["circuitos"] = [circuit.to_dict() for circuit in self.repository.get_driver_circuits(name)]
+        return data
+
+    def team_stats(self, name: str) -> Optional[dict]:
+        stats = self.repository.get_team(name)
+        return stats.to_dict() if stats is not None else None
+
+
+formula_career_stats_service = FormulaCareerStatsService()
+
+
+HEAD_TO_HEAD_CACHE_SIZE = 4096
+# Tipo de comparación -> (columna de formula_result, prefijo de la etiqueta de caché)
+HEAD_TO_HEAD_KINDS = {
+    "drivers": (FormulaResult.piloto_nombre, "driver"),
+    "teams": (FormulaResult.equipo, "team"),
+}
+
+
+def _side(name: str, por_delante: int, puntos: float, abandonos: int, coches: int) -> dict:
+    return {
+        "nombre": name,
+        "por_delante": por_delante,
+        "puntos": puntos,
+        "abandonos": abandonos,
+        "fiabilidad": round(1 - abandonos / coches, 4) if coches else None,
+    }
+
+
+class FormulaHeadToHeadService(BaseService):
+    """
+    Comparación cara a cara de dos pilotos o dos equipos en las carreras que disputaron ambos.
+
+    Los resultados se guardan en una caché LRU por (tipo, pareja, rango de temporadas). Las
+    entradas llevan la etiqueta de cada entidad y solo se invalidan cuando cambia una carrera en
+    la que participa alguna de las dos; la invalidación llega al resto de procesos a través de un
+    SharedInvalidationLog, que init_app crea en el SHARED_CACHE_DIR de la app.
+    """
+
+    def __init__(self, cache: Optional[LRUCache] = None):
+        super().__init__(FormulaHeadToHeadRepository())
+        # Una LRUCache vacía es falsa (__len__): no vale `cache or ...`
+        self.cache = LRUCache(HEAD_TO_HEAD_CACHE_SIZE) if cache is None else cache
+
+    def init_app(self, app):
+        self.cache = LRUCache(
+            HEAD_TO_HEAD_CACHE_SIZE,
+            invalidation_log=SharedInvalidationLog(os.path.join(shared_cache_dir(app), "head_to_head.json")),
+        )
+
+    def compare(
+        self, kind: str, name_a: str, name_b: str, season_from: Optional[int] = None, season_to: Optional[int] = None
+    ) -> dict:
+        column, tag = HEAD_TO_HEAD_KINDS[kind]
+        # (A, B) y (B, A) comparten la misma entrada de caché
+        first, second = sorted((name_a, name_b))
+        key = (kind, first, second, season_from, season_to)
+
+        totals = self.cache.get(key)
+        if totals is None:
+            # Si llega una invalidación mientras se calcula, el resultado no se guarda
+            generation = self.cache.generation()
+            totals = self.repository.compare(column, first, second, season_from=season_from, season_to=season_to)
+            self.cache.set(key, totals, tags=(f"{tag}:{first}", f"{tag}:{second}"), generation=generation)
+
+        sides = {
+            first: _side(first, totals["por_delante_a"], totals["puntos_a"], totals["abandonos_a"], totals["coches_a"]),
+            second: _side(
+                second, totals["por_delante_b"], totals["puntos_b"], totals["abandonos_b"], totals["coches_b"]
+            ),
+        }
+        return {
+            "tipo": kind,
+            "season_from": season_from,
+            "season_to": season_to,
+            "carreras": totals["carreras"],
+            "a": sides[name_a],
+            "b": sides[name_b],
+            "diferencia_puntos": sides[name_a]["puntos"] - sides[name_b]["puntos"],
+        }
+
+    def invalidate_entities(self, drivers: Iterable[str], teams: Iterable[str]):
+        tags = [f"driver:{name}" for name in drivers] + [f"team:{name}" for name in teams]
+        if tags:
+            self.cache.invalidate_tags(tags)
+
+
+formula_head_to_head_service = FormulaHeadToHeadService()
+formula_bp.record(lambda state: formula_head_to_head_service.init_app(state.app))
+
+
+QUERY_DEFAULT_LIMIT = 1000
+QUERY_MAX_LIMIT = 50000
+QUERY_LIST_FILTERS = ("circuit", "driver", "team", "engine", "status", "position")
+QUERY_INT_FILTERS = ("season_from", "season_to", "position_min", "position_max")
+QUERY_BATCH_LINES = 500
+
+
+class FormulaQueryError(ValueError):
+    """Parámetros de consulta no válidos."""
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    data = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, row_id = json.loads(data)
+    except (binascii.Error, ValueError, TypeError):
+        raise FormulaQueryError("Invalid cursor")
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise FormulaQueryError("The cursor belongs to a different query")
+    return value, row_id
+
+
+class FormulaResultQueryService(BaseService):
+    """
+    Consulta de resultados entre todos los datasets publicados ("todos los DNF de un equipo en un
+    circuito entre 2015 y 2024"). Los filtros se resuelven en la base de datos y las filas se
+    envían como NDJSON según se leen, sin construir objetos ORM ni cargar la respuesta entera.
+    """
+
+    def __init__(self):
+        super().__init__(FormulaResultQueryRepository())
+
+    def parse_args(self, args) -> dict:
+        """Convierte los parámetros de la petición (MultiDict) en una consulta. Lanza FormulaQueryError."""
+        filters = {}
+        for name in QUERY_LIST_FILTERS:
+            values = [value.strip() for raw in args.getlist(name) for value in raw.split(",") if value.strip()]
+            if values:
+                filters[name] = values
+        for name in QUERY_INT_FILTERS:
+            raw = args.get(name)
+            if raw not in (None, ""):
+                try:
+                    filters[name] = int(raw)
+                except ValueError:
+                    raise FormulaQueryError(f"'{name}' must be an integer")
+        season = args.get("season")
+        if season not in (None, ""):
+            try:
+                filters["season_from"] = filters["season_to"] = int(season)
+            except ValueError:
+                raise FormulaQueryError("'season' must be an integer")
+
+        sort = (args.get("sort") or "id").strip()
+        descending = sort.startswith("-")
+        sort = sort.lstrip("-")
+        if sort not in QUERY_SORT_COLUMNS:
+            raise FormulaQueryError(f"'sort' must be one of: {', '.join(QUERY_SORT_COLUMNS)} (prefix '-' for desc)")
+
+        try:
+            limit = int(args.get("limit", QUERY_DEFAULT_LIMIT))
+        except ValueError:
+            raise FormulaQueryError("'limit' must be an integer")
+        limit = min(max(limit, 1), QUERY_MAX_LIMIT)
+
+        cursor = args.get("cursor")
+        # El cursor guarda la ordenación normalizada, la misma que usa stream_ndjson al emitirlo
+        after = decode_cursor(cursor, ("-" if descending else "") + sort) if cursor else None
+        return {"filters": filters, "sort": sort, "descending": descending, "after": after, "limit": limit}
+
+    def stream_ndjson(self, query: dict) -> Iterator[str]:
+        """
+        Genera las filas como NDJSON. Si hay más resultados, la última línea es
+        {"next_cursor": "..."} para pedir la página siguiente con ?cursor=.
+        """
+        sort_key = QUERY_SORT_COLUMNS[query["sort"]].key
+        sort_param = ("-" if query["descending"] else "") + query["sort"]
+        statement = self.repository.build_statement(
+            query["filters"],
+            sort=query["sort"],
+            descending=query["descending"],
+            after=query["after"],
+            limit=query["limit"] + 1,
+        )
+
+        lines = []
+        last = None
+        for count, row in enumerate(self.repository.stream(statement)):
+            if count == query["limit"]:
+                lines.append(json.dumps({"next_cursor": encode_cursor(sort_param, last[sort_key], last["id"])}) + "\n")
+                break
+            if row["fecha_carrera"] is not None:
+                row["fecha_carrera"] = row["fecha_carrera"].isoformat()
+            lines.append(json.dumps(row) + "\n")
+            last = row
+            if len(lines) >= QUERY_BATCH_LINES:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+
+
+def _on_dataset_changed(sender, dataset_id, dataset_type, action, **kwargs):
+    if dataset_type == "formula" and action in ("created", "updated", "deleted"):
+        formula_snapshot_service.schedule(action, dataset_id)
+        try:
+            # Antes de recalcular las estadísticas, que actualizan el registro de participantes
+            drivers, teams = formula_career_stats_service.repository.affected_by(dataset_id)
+            formula_head_to_head_service.invalidate_entities(drivers, teams)
+        except Exception as exc:
+            logger.exception(f"Error invalidating head-to-head cache after {action} of dataset {dataset_id}: {exc}")
+        try:
+            formula_standings_service.refresh_for_dataset(dataset_id)
+        except Exception as exc:
+            # El dataset ya está guardado; las clasificaciones se pueden rehacer con `flask formula standings`
+            logger.exception(f"Error updating standings after {action} of dataset {dataset_id}: {exc}")
+        try:
+            formula_career_stats_service.refresh_for_dataset(dataset_id)
+        except Exception as exc:
+            logger.exception(f"Error updating career stats after {action} of dataset {dataset_id}: {exc}")
+
+
+dataset_changed.connect(_on_dataset_changed)
+
+
+@formula_bp.cli.command("standings")
+def standings_command():
+    """Rebuild the driver and constructor standings of every season."""
+    seasons = formula_standings_service.rebuild()
+    click.echo(f"Standings rebuilt for {len(seasons)} seasons")
+
+
+@formula_bp.cli.command("career-stats")
+def career_stats_command():
+    """Rebuild the driver and team career statistics."""
+    formula_career_stats_service.rebuild()
+    click.echo("Career statistics rebuilt")
@@ -0,0 +1,232 @@
+"""
+Snapshot columnar de formula_result guardado en ficheros binarios mapeados en memoria.
+
+Cada segmento es un directorio con un fichero por columna: las numéricas se guardan como
+arrays tipados y las de texto como códigos enteros más un diccionario (dictionaries.json).
+Los workers de gunicorn abren los ficheros con mmap en solo lectura, de modo que todos
+comparten las mismas páginas del page cache sin copiar los datos.
+
+manifest.json describe los segmentos vivos. Las altas añaden un segmento nuevo y las bajas
+marcan el dataset como borrado en los segmentos que lo contienen; cuando hay demasiados
+segmentos o filas borradas el servicio reconstruye el snapshot en un único segmento.
+"""
+
+import json
+import mmap
+import os
+import shutil
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from app.modules.dataset.services import iter_chunks
+
+NUMERIC_COLUMNS = {
+    "dataset_id": "i",
+    "anio_temporada": "i",
+    "puntos_obtenidos": "d",
+    "vueltas_completadas": "i",
+}
+STRING_COLUMNS = ("piloto_nombre", "equipo", "motor", "posicion_final", "estado_carrera", "nombre_gp", "circuito")
+NULL_VALUES = {"i": -1, "d": 0.0}
+
+MANIFEST_FILE = "manifest.json"
+DICTIONARIES_FILE = "dictionaries.json"
+WRITE_CHUNK_SIZE = 10000
+
+# Umbrales a partir de los cuales conviene compactar en un único segmento
+MAX_SEGMENTS = 16
+MAX_DELETED_RATIO = 0.25
+
+
+def write_segment(path: str, rows: Iterable[dict]) -> Dict[str, int]:
+    """Escribe las filas en un segmento nuevo. Devuelve el número de filas por dataset."""
+    os.makedirs(path, exist_ok=True)
+    dictionaries = {name: {} for name in STRING_COLUMNS}
+    dataset_rows = Counter()
+    files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name in (*NUMERIC_COLUMNS, *STRING_COLUMNS)}
+
+    try:
+        for chunk in iter_chunks(rows, WRITE_CHUNK_SIZE):
+            buffers = {name: array(typecode) for name, typecode in NUMERIC_COLUMNS.items()}
+            buffers.update({name: array("i") for name in STRING_COLUMNS})
+
+            for row in chunk:
+                for name, typecode in NUMERIC_COLUMNS.items():
+                    value = row[name]
+                    buffers[name].append(NULL_VALUES[typecode] if value is None else value)
+                for name in STRING_COLUMNS:
+                    codes = dictionaries[name]
+                    buffers[name].append(codes.setdefault(row[name], len(codes)))
+                dataset_rows[row["dataset_id"]] += 1
+
+            for name, buffer in buffers.items():
+                buffer.tofile(files[name])
+    finally:
+        for file in files.values():
+            file.close()
+
+    with open(os.path.join(path, DICTIONARIES_FILE), "w") as file:
+        json.dump({name: list(codes) for name, codes in dictionaries.items()}, file)
+
+    return {str(dataset_id): count for dataset_id, count in dataset_rows.items()}
+
+
+class Segment:
+    """Segmento abierto en solo lectura. Las columnas son memoryviews sobre los ficheros mapeados."""
+
+    def __init__(self, path: str, rows: int, deleted: Iterable[int] = ()):
+        self.rows = rows
+        self.deleted = set(deleted)
+        self.columns = {}
+
+        for name, typecode in NUMERIC_COLUMNS.items():
+            self.columns[name] = self._map_column(path, name, typecode)
+        for name in STRING_COLUMNS:
+            self.columns[name] = self._map_column(path, name, "i")
+
+        with open(os.path.join(path, DICTIONARIES_FILE)) as file:
+            self.dictionaries = json.load(file)
+
+    def _map_column(self, path: str, name: str, typecode: str) -> memoryview:
+        if self.rows == 0:
+            return memoryview(array(typecode))
+        with open(os.path.join(path, f"{name}.bin"), "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(typecode)
+
+    def live_mask(self, season: Optional[int] = None) -> Optional[List[bool]]:
+        """Máscara de filas visibles (no borradas y de la temporada pedida). None si son todas."""
+        if not self.deleted and season is None:
+            return None
+        dataset_ids = self.columns["dataset_id"]
+        seasons = self.columns["anio_temporada"]
+        deleted = self.deleted
+        return [
+            dataset_id not in deleted and (season is None or row_season == season)
+            for dataset_id, row_season in zip(dataset_ids, seasons)
+        ]
+
+
+class ColumnarSnapshot:
+    """Vista de solo lectura sobre todos los segmentos vivos de un manifest."""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.version = manifest["version"]
+        self.segments = [
+            Segment(os.path.join(directory, segment["name"]), segment["rows"], segment.get("deleted", []))
+            for segment in manifest["segments"]
+        ]
+
+    def group_sum(self, key_column: str, value_column: str = "puntos_obtenidos", season: Optional[int] = None):
+        """Suma value_column agrupando por key_column (columna de texto). Devuelve {valor: suma}."""
+        totals = defaultdict(float)
+        for segment in self.segments:
+            partial = defaultdict(float)
+            keys = segment.columns[key_column]
+            values = segment.columns[value_column]
+            mask = segment.live_mask(season)
+
+            if mask is None:
+                for code, value in zip(keys, values):
+                    partial[code] += value
+            else:
+                for code, value, visible in zip(keys, values, mask):
+                    if visible:
+                        partial[code] += value
+
+            dictionary = segment.dictionaries[key_column]
+            for code, value in partial.items():
+                totals[dictionary[code]] += value
+        return dict(totals)
+
+    def group_count(self, key_column: str, season: Optional[int] = None) -> Dict[str, int]:
+        """Cuenta filas agrupando por key_column (columna de texto)."""
+        totals = Counter()
+        for segment in self.segments:
+            keys = segment.columns[key_column]
+            mask = segment.live_mask(season)
+            partial = Counter(keys) if mask is None else Counter(code for code, ok in zip(keys, mask) if ok)
+
+            dictionary = segment.dictionaries[key_column]
+            for code, count in partial.items():
+                totals[dictionary[code]] += count
+        return dict(totals)
+
+
+class ColumnarSnapshotStore:
+    """Gestiona el manifest y los segmentos del snapshot en disco."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file)
+        # os.replace es atómico: los lectores ven el manifest anterior o el nuevo, nunca uno a medias
+        os.replace(tmp_path, self.manifest_path)
+
+    def _new_segment(self, version: int, rows: Iterable[dict]) -> dict:
+        name = f"segment_{version:08d}"
+        dataset_rows = write_segment(os.path.join(self.directory, name), rows)
+        return {"name": name, "rows": sum(dataset_rows.values()), "dataset_rows": dataset_rows, "deleted": []}
+
+    def replace_all(self, rows: Iterable[dict]) -> dict:
+        """Reconstruye el snapshot completo en un único segmento."""
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self.read_manifest()
+        version = (previous["version"] if previous else 0) + 1
+
+        manifest = {"version": version, "segments": [self._new_segment(version, rows)]}
+        self._write_manifest(manifest)
+
+        # Los workers que aún tengan mapeados los segmentos viejos siguen leyéndolos sin problema
+        for segment in (previous or {}).get("segments", []):
+            shutil.rmtree(os.path.join(self.directory, segment["name"]), ignore_errors=True)
+        return manifest
+
+    def remove(self, dataset_ids: Iterable[int]) -> dict:
+        """Marca como borrados los datasets indicados en todos los segmentos que los contienen."""
+        manifest = self.read_manifest()
+        dataset_ids = set(dataset_ids)
+        for segment in manifest["segments"]:
+            present = {int(dataset_id) for dataset_id in segment["dataset_rows"]} & dataset_ids
+            segment["deleted"] = sorted(set(segment["deleted"]) | present)
+        manifest["version"] += 1
+        self._write_manifest(manifest)
+        return manifest
+
+    def append(self, dataset_ids: Iterable[int], rows: Iterable[dict]) -> dict:
+        """Añade (o sustituye) los datasets indicados escribiendo un segmento nuevo con sus filas."""
+        dataset_ids = list(dataset_ids)
+        manifest = self.remove(dataset_ids)
+        manifest["segments"].append(self._new_segment(manifest["version"], rows))
+        self._write_manifest(manifest)
+        return manifest
+
+    def needs_compaction(self, manifest: dict) -> bool:
+        total_rows = sum(segment["rows"] for segment in manifest["segments"])
+        deleted_rows = sum(
+            segment["dataset_rows"].get(str(dataset_id), 0)
+            for segment in manifest["segments"]
+            for dataset_id in segment["deleted"]
+        )
+        return len(manifest["segments"]) > MAX_SEGMENTS or (
+            total_rows > 0 and deleted_rows / total_rows > MAX_DELETED_RATIO
+        )
+
+    def open(self) -> Optional[ColumnarSnapshot]:
+        manifest = self.read_manifest()
+        return ColumnarSnapshot(self.directory, manifest) if manifest else None
@@ -0,0 +1,95 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from app.modules.formula import services
+from app.modules.formula.models import DriverCareerStats, DriverCircuitStats
+from app.modules.formula.repositories import FormulaCareerStatsRepository
+from app.modules.formula.services import FormulaCareerStatsService
+
+
+def executed_sql(repository):
+    return [
+        str(call.args[0].compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+        for call in repository.session.execute.call_args_list
+    ]
+
+
+def test_refresh_only_recalculates_given_drivers_and_teams():
+    repository = FormulaCareerStatsRepository()
+    repository.session = MagicMock()
+
+    repository.refresh(drivers={"Fernando Alonso"}, teams={"Aston Martin"})
+
+    statements = executed_sql(repository)
+    assert len(statements) == 6
+    assert "formula_driver_career_stats.piloto_nombre IN ('Fernando Alonso')" in statements[0]
+    assert statements[1].startswith("INSERT INTO formula_driver_career_stats")
+    assert "WHERE formula_result.piloto_nombre IN ('Fernando Alonso')" in statements[1]
+    assert "WHERE formula_result.equipo IN ('Aston Martin')" in statements[3]
+    assert "GROUP BY formula_result.piloto_nombre, formula_dataset.circuito" in statements[5]
+
+
+def test_refresh_skips_empty_sets():
+    repository = FormulaCareerStatsRepository()
+    repository.session = MagicMock()
+
+    repository.refresh(drivers=set(), teams=set())
+
+    repository.session.execute.assert_not_called()
+
+
+def test_refresh_for_dataset_includes_previous_entries():
+    service = FormulaCareerStatsService()
+    service.repository = MagicMock()
+    service.repository.affected_by.return_value = ({"Fernando Alonso"}, {"Aston Martin"})
+
+    service.refresh_for_dataset(7)
+
+    service.repository.refresh.assert_called_once_with(drivers={"Fernando Alonso"}, teams={"Aston Martin"})
+    service.repository.register_entries.assert_called_once_with(7)
+    service.repository.session.commit.assert_called_once()
+
+
+def test_refresh_for_dataset_rolls_back_on_error():
+    service = FormulaCareerStatsService()
+    service.repository = MagicMock()
+    service.repository.affected_by.return_value = ({"Fernando Alonso"}, set())
+    service.repository.refresh.side_effect = RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        service.refresh_for_dataset(7)
+    service.repository.session.rollback.assert_called_once()
+
+
+def test_driver_stats_includes_circuits():
+    service = FormulaCareerStatsService()
+    service.repository = MagicMock()
+    service.repository.get_driver.return_value = DriverCareerStats(
+        piloto_nombre="Fernando Alonso", carreras=380, victorias=32, podios=106, puntos=2267.0, mejor_posicion=1
+    )
+    service.repository.get_driver_circuits.return_value = [
+        DriverCircuitStats(circuito="Circuit de Barcelona-Catalunya", carreras=21, victorias=2, mejor_posicion=1)
+    ]
+
+    stats = service.driver_stats("Fernando Alonso")
+
+    assert stats["victorias"] == 32
+    assert stats["circuitos"] == [
+        {"circuito": "Circuit de Barcelona-Catalunya", "carreras": 21, "victorias": 2, "mejor_posicion": 1}
+    ]
+    service.repository.get_driver.return_value = None
+    assert service.driver_stats("Nadie") is None
+
+
+def test_dataset_changed_refreshes_career_stats(monkeypatch):
+    monkeypatch.setattr(services, "formula_snapshot_service", MagicMock())
+    monkeypatch.setattr(services, "formula_head_to_head_service", MagicMock())
+    monkeypatch.setattr(services, "formula_standings_service", MagicMock())
+    career = MagicMock()
+    monkeypatch.setattr(services, "formula_career_stats_service", career)
+
+    services._on_dataset_changed(None, dataset_id=3, dataset_type="formula", action="created")
+
+    career.refresh_for_dataset.assert_called_once_with(3)
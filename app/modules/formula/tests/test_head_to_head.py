@@ -0,0 +1,133 @@
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import mysql
+
+from app.modules.dataset.models import FormulaResult
+from app.modules.formula import services
+from app.modules.formula.repositories import FormulaHeadToHeadRepository
+from app.modules.formula.services import FormulaHeadToHeadService
+from core.caching.invalidation import SharedInvalidationLog
+from core.caching.lru import LRUCache
+
+TOTALS = {
+    "carreras": 22,
+    "por_delante_a": 17,
+    "por_delante_b": 5,
+    "puntos_a": 206.0,
+    "puntos_b": 49.0,
+    "abandonos_a": 1,
+    "abandonos_b": 2,
+    "coches_a": 22,
+    "coches_b": 22,
+}
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
+
+
+def test_lru_cache_invalidates_by_tag_across_processes(tmp_path):
+    path = str(tmp_path / "log.json")
+    cache = LRUCache(invalidation_log=SharedInvalidationLog(path))
+    other_process = LRUCache(invalidation_log=SharedInvalidationLog(path))
+    for lru in (cache, other_process):
+        lru.set("alonso-stroll", 1, tags=("driver:Fernando Alonso", "driver:Lance Stroll"))
+        lru.set("hamilton-russell", 2, tags=("driver:Lewis Hamilton", "driver:George Russell"))
+
+    cache.invalidate_tags(["driver:Lance Stroll"])
+
+    assert cache.get("alonso-stroll") is None
+    assert other_process.get("alonso-stroll") is None
+    assert other_process.get("hamilton-russell") == 2
+
+
+def test_compare_does_not_cache_a_result_invalidated_while_computing(tmp_path):
+    path = str(tmp_path / "log.json")
+    service = FormulaHeadToHeadService(cache=LRUCache(invalidation_log=SharedInvalidationLog(path)))
+    other_process = LRUCache(invalidation_log=SharedInvalidationLog(path))
+    service.repository = MagicMock()
+
+    def compare(*args, **kwargs):
+        # Otro worker corrige una carrera de Stroll mientras se calcula la comparación
+        other_process.invalidate_tags(["driver:Lance Stroll"])
+        return TOTALS
+
+    service.repository.compare.side_effect = compare
+    service.compare("drivers", "Fernando Alonso", "Lance Stroll")
+    service.repository.compare.side_effect = None
+    service.repository.compare.return_value = {**TOTALS, "puntos_b": 55.0}
+
+    assert service.compare("drivers", "Fernando Alonso", "Lance Stroll")["b"]["puntos"] == 55.0
+    assert service.repository.compare.call_count == 2
+
+
+def test_invalidation_log_asks_to_clear_when_too_far_behind(tmp_path):
+    log = SharedInvalidationLog(str(tmp_path / "log.json"), max_entries=2)
+    for name in ("a", "b", "c"):
+        log.publish([name])
+
+    assert log.changes_since(2) == (3, ["c"])
+    assert log.changes_since(0) == (3, None)
+    assert log.changes_since(None) == (3, None)
+
+
+def test_compare_statement_joins_both_sides_by_race():
+    repository = FormulaHeadToHeadRepository()
+    repository.session = MagicMock()
+    repository.session.execute.return_value.mappings.return_value.one.return_value = TOTALS
+
+    repository.compare(FormulaResult.piloto_nombre, "Fernando Alonso", "Lance Stroll", season_from=2023)
+
+    sql = str(
+        repository.session.execute.call_args.args[0].compile(
+            dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    assert sql.count("GROUP BY formula_result.dataset_id") == 2
+    assert "anon_2.dataset_id = anon_1.dataset_id" in sql
+    assert "formula_dataset.anio_temporada >= 2023" in sql
+
+
+def test_compare_is_cached_for_both_orders():
+    service = FormulaHeadToHeadService(cache=LRUCache())
+    service.repository = MagicMock()
+    service.repository.compare.return_value = TOTALS
+
+    first = service.compare("drivers", "Fernando Alonso", "Lance Stroll")
+    second = service.compare("drivers", "Lance Stroll", "Fernando Alonso")
+
+    service.repository.compare.assert_called_once()
+    assert first["a"]["nombre"] == "Fernando Alonso"
+    assert first["a"]["por_delante"] == 17
+    assert first["diferencia_puntos"] == 157.0
+    assert second["a"]["nombre"] == "Lance Stroll"
+    assert second["diferencia_puntos"] == -157.0
+    assert second["b"]["fiabilidad"] == round(1 - 1 / 22, 4)
+
+
+def test_dataset_change_invalidates_only_its_drivers(monkeypatch):
+    service = FormulaHeadToHeadService(cache=LRUCache())
+    service.repository = MagicMock()
+    service.repository.compare.return_value = TOTALS
+    service.compare("drivers", "Fernando Alonso", "Lance Stroll")
+    service.compare("drivers", "Lewis Hamilton", "George Russell")
+    career = MagicMock()
+    career.repository.affected_by.return_value = ({"Lance Stroll"}, {"Aston Martin"})
+    monkeypatch.setattr(services, "formula_head_to_head_service", service)
+    monkeypatch.setattr(services, "formula_career_stats_service", career)
+    monkeypatch.setattr(services, "formula_snapshot_service", MagicMock())
+    monkeypatch.setattr(services, "formula_standings_service", MagicMock())
+
+    services._on_dataset_changed(None, dataset_id=9, dataset_type="formula", action="updated")
+    service.compare("drivers", "Fernando Alonso", "Lance Stroll")
+    service.compare("drivers", "Lewis Hamilton", "George Russell")
+
+    assert service.repository.compare.call_count == 3
@@ -0,0 +1,186 @@
+import io
+import json
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import db
+from app.modules.dataset.models import DSMetaData, FormulaDataSet, FormulaResult, PublicationType
+from app.modules.dataset.repositories import FormulaResultRepository
+from app.modules.formula.repositories import FormulaResultDeltaRepository
+from app.modules.formula.services import (
+    FormulaPatchError,
+    FormulaResultDeltaService,
+    FormulaVersionConflict,
+    parse_patch_rows,
+    read_patch_csv,
+)
+
+ALONSO = {
+    "piloto_nombre": "Fernando Alonso",
+    "equipo": "Aston Martin",
+    "motor": "Mercedes",
+    "posicion_final": "3",
+    "puntos_obtenidos": 15.0,
+    "tiempo_carrera": "1:33:50.900",
+    "vueltas_completadas": 57,
+    "estado_carrera": "Finished",
+}
+
+
+def make_service(current):
+    service = FormulaResultDeltaService()
+    service.repository = MagicMock()
+    service.repository.bump_version.return_value = True
+    service.repository.get_results.side_effect = lambda dataset_id, drivers=None: {
+        driver: dict(row) for driver, row in current.items() if drivers is None or driver in drivers
+    }
+    service.repository.create.side_effect = lambda commit, **kwargs: MagicMock(**kwargs)
+    return service
+
+
+@pytest.fixture
+def signal(monkeypatch):
+    send = MagicMock()
+    monkeypatch.setattr("app.modules.formula.services.send_dataset_changed", send)
+    return send
+
+
+def test_parse_patch_rows_converts_and_validates():
+    changes = parse_patch_rows([{"piloto_nombre": "Fernando Alonso", "puntos_obtenidos": "10", "posicion_final": "4"}])
+
+    assert changes == {"Fernando Alonso": {"puntos_obtenidos": 10.0, "posicion_final": "4"}}
+
+    with pytest.raises(FormulaPatchError) as exc:
+        parse_patch_rows([{"piloto_nombre": "Fernando Alonso", "posicion_final": "cuarto", "dataset_id": 9}])
+    assert {error["column"] for error in exc.value.errors} == {"posicion_final", "dataset_id"}
+
+
+def test_read_patch_csv_skips_empty_cells():
+    stream = io.BytesIO("piloto_nombre,posicion_final,puntos_obtenidos\nFernando Alonso,DSQ,\n".encode())
+
+    assert read_patch_csv(stream) == [{"piloto_nombre": "Fernando Alonso", "posicion_final": "DSQ"}]
+
+
+def test_apply_patch_stores_only_changed_fields(signal):
+    service = make_service({"Fernando Alonso": ALONSO})
+    dataset = MagicMock(id=4, results_version=0)
+
+    delta = service.apply_patch(
+        dataset,
+        [
+            {
+                "piloto_nombre": "Fernando Alonso",
+                "posicion_final": "DSQ",
+                "puntos_obtenidos": 0,
+                "equipo": "Aston Martin",
+            }
+        ],
+        user_id=1,
+        comment="Descalificado",
+    )
+
+    service.repository.bump_version.assert_called_once_with(4, 0)
+    service.repository.get_results.assert_called_once()
+    assert delta.version == 1
+    assert json.loads(delta.changes) == [
+        {
+            "piloto_nombre": "Fernando Alonso",
+            "before": {"posicion_final": "3", "puntos_obtenidos": 15.0},
+            "after": {"posicion_final": "DSQ", "puntos_obtenidos": 0.0},
+        }
+    ]
+    upserted = service.repository.upsert_results.call_args.args[0]
+    assert upserted[0]["dataset_id"] == 4
+    assert upserted[0]["tiempo_carrera_ms"] == (1 * 3600 + 33 * 60 + 50) * 1000 + 900
+    signal.assert_called_once_with(4, "formula", "updated")
+
+
+def test_apply_patch_new_driver_requires_team_and_position(signal):
+    service = make_service({})
+
+    with pytest.raises(FormulaPatchError):
+        service.apply_patch(MagicMock(id=4, results_version=0), [{"piloto_nombre": "Nuevo", "puntos_obtenidos": "1"}])
+
+    service.repository.upsert_results.assert_not_called()
+    signal.assert_not_called()
+
+
+def test_apply_patch_version_conflict(monkeypatch, signal):
+    monkeypatch.setattr(
+        "app.modules.formula.services.FormulaDataSet", MagicMock(**{"query.get.return_value.results_version": 3})
+    )
+    service = make_service({"Fernando Alonso": ALONSO})
+    service.repository.bump_version.return_value = False
+
+    with pytest.raises(FormulaVersionConflict) as exc:
+        service.apply_patch(
+            MagicMock(id=4, results_version=2), [{"piloto_nombre": "Fernando Alonso", "posicion_final": "4"}]
+        )
+
+    assert exc.value.current_version == 3
+    service.repository.upsert_results.assert_not_called()
+
+
+def test_get_version_reverts_newer_deltas():
+    current = {
+        "Fernando Alonso": {**ALONSO, "posicion_final": "DSQ", "puntos_obtenidos": 0.0},
+        "Nuevo": {**ALONSO, "piloto_nombre": "Nuevo"},
+    }
+    service = make_service(current)
+    service.repository.deltas_after.return_value = [
+        MagicMock(get_changes=lambda: [{"piloto_nombre": "Nuevo", "before": None, "after": {"equipo": "X"}}]),
+        MagicMock(
+            get_changes=lambda: [
+                {
+                    "piloto_nombre": "Fernando Alonso",
+                    "before": {"posicion_final": "3", "puntos_obtenidos": 15.0},
+                    "after": {"posicion_final": "DSQ", "puntos_obtenidos": 0.0},
+                }
+            ]
+        ),
+    ]
+
+    results = service.get_version(MagicMock(id=4, results_version=2), 0)
+
+    service.repository.deltas_after.assert_called_once_with(4, 0)
+    assert [row["piloto_nombre"] for row in results] == ["Fernando Alonso"]
+    assert results[0]["posicion_final"] == "3"
+    assert results[0]["puntos_obtenidos"] == 15.0
+    assert service.get_version(MagicMock(id=4, results_version=2), 5) is None
+
+
+def test_uploading_the_original_csv_after_a_patch_does_not_copy_the_patched_results(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'deltas.db'}")
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        race = FormulaDataSet(
+            user_id=1,
+            ds_meta_data=DSMetaData(title="GP", description="", publication_type=PublicationType.NONE),
+            nombre_gp="Gran Premio de España",
+            anio_temporada=2023,
+            fecha_carrera=date(2023, 6, 4),
+            circuito="Montmeló",
+            csv_checksum="a" * 64,
+        )
+        race.results.append(FormulaResult(piloto_nombre="Fernando Alonso", equipo="Aston Martin", posicion_final="3"))
+        session.add(race)
+        session.commit()
+
+        results = FormulaResultRepository()
+        results.session = session
+        assert results.get_dataset_by_csv_checksum("a" * 64).id == race.id
+
+        # El UPDATE de versión con el que empieza la transacción de apply_patch
+        deltas = FormulaResultDeltaRepository()
+        deltas.session = session
+        assert deltas.bump_version(race.id, 0)
+        session.commit()
+
+        # La misma subida ya no encuentra el dataset: se validará y se parseará de nuevo
+        assert results.get_dataset_by_csv_checksum("a" * 64) is None
+        session.refresh(race)
+        assert (race.results_version, race.csv_checksum) == (1, None)
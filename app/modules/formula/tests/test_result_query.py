@@ -0,0 +1,117 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.dialects import mysql
+from werkzeug.datastructures import MultiDict
+
+from app.modules.formula.repositories import FormulaResultQueryRepository
+from app.modules.formula.services import FormulaQueryError, FormulaResultQueryService, decode_cursor, encode_cursor
+
+
+def compile_sql(statement):
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_parse_args_builds_filters():
+    service = FormulaResultQueryService()
+
+    query = service.parse_args(
+        MultiDict(
+            [
+                ("team", "Ferrari,McLaren"),
+                ("status", "DNF"),
+                ("season_from", "2015"),
+                ("season_to", "2024"),
+                ("sort", "-points"),
+                ("limit", "999999"),
+            ]
+        )
+    )
+
+    assert query["filters"] == {
+        "team": ["Ferrari", "McLaren"],
+        "status": ["DNF"],
+        "season_from": 2015,
+        "season_to": 2024,
+    }
+    assert query["sort"] == "points"
+    assert query["descending"] is True
+    assert query["limit"] == 50000
+
+
+def test_parse_args_rejects_bad_values():
+    service = FormulaResultQueryService()
+
+    with pytest.raises(FormulaQueryError):
+        service.parse_args(MultiDict({"sort": "piloto"}))
+    with pytest.raises(FormulaQueryError):
+        service.parse_args(MultiDict({"season": "dos mil"}))
+    with pytest.raises(FormulaQueryError):
+        service.parse_args(MultiDict({"sort": "time", "cursor": encode_cursor("points", 1.0, 5)}))
+
+
+def test_parse_args_accepts_cursors_issued_for_equivalent_sorts():
+    service = FormulaResultQueryService()
+
+    # Sin 'sort' la ordenación es "id", y "--points" es lo mismo que "-points"
+    assert service.parse_args(MultiDict({"cursor": encode_cursor("id", 5, 5)}))["after"] == (5, 5)
+    query = service.parse_args(MultiDict({"sort": "--points", "cursor": encode_cursor("-points", 18.0, 2)}))
+    assert (query["sort"], query["descending"], query["after"]) == ("points", True, (18.0, 2))
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("-time", 5748333, 12), "-time") == (5748333, 12)
+    with pytest.raises(FormulaQueryError):
+        decode_cursor("not-a-cursor", "id")
+
+
+def test_statement_pushes_filters_and_keyset_to_sql():
+    repository = FormulaResultQueryRepository()
+
+    sql = compile_sql(
+        repository.build_statement(
+            {"team": ["Ferrari"], "circuit": ["Monza"], "season_from": 2015, "position_max": 10},
+            sort="time",
+            after=(5748333, 12),
+            limit=101,
+        )
+    )
+
+    assert "formula_result.equipo IN ('Ferrari')" in sql
+    assert "formula_dataset.circuito IN ('Monza')" in sql
+    assert "formula_dataset.anio_temporada >= 2015" in sql
+    assert "formula_result.posicion_numero <= 10" in sql
+    assert "ds_meta_data.dataset_doi IS NOT NULL" in sql
+    assert "formula_result.tiempo_carrera_ms > 5748333" in sql
+    assert "formula_result.id > 12" in sql
+    assert sql.endswith("ORDER BY formula_result.tiempo_carrera_ms, formula_result.id \n LIMIT 101")
+
+
+def row(row_id, points):
+    return {"id": row_id, "fecha_carrera": None, "puntos_obtenidos": points, "piloto_nombre": f"Piloto {row_id}"}
+
+
+def test_stream_ndjson_adds_next_cursor_when_more_rows():
+    service = FormulaResultQueryService()
+    service.repository = MagicMock()
+    service.repository.stream.return_value = iter([row(1, 25.0), row(2, 18.0), row(3, 15.0)])
+    query = service.parse_args(MultiDict({"sort": "-points", "limit": "2"}))
+
+    lines = "".join(service.stream_ndjson(query)).splitlines()
+
+    assert service.repository.build_statement.call_args.kwargs["limit"] == 3
+    assert [json.loads(line).get("id") for line in lines[:2]] == [1, 2]
+    next_cursor = json.loads(lines[2])["next_cursor"]
+    assert decode_cursor(next_cursor, "-points") == (18.0, 2)
+
+
+def test_stream_ndjson_last_page_has_no_cursor():
+    service = FormulaResultQueryService()
+    service.repository = MagicMock()
+    service.repository.stream.return_value = iter([row(1, 25.0)])
+
+    lines = "".join(service.stream_ndjson(service.parse_args(MultiDict()))).splitlines()
+
+    assert len(lines) == 1
+    assert "next_cursor" not in lines[0]
@@ -0,0 +1,82 @@
+import pytest
+
+from app.modules.formula.snapshot import ColumnarSnapshotStore
+
+
+def result(dataset_id, piloto, equipo, puntos, anio=2023, vueltas=57):
+    return {
+        "dataset_id": dataset_id,
+        "anio_temporada": anio,
+        "puntos_obtenidos": puntos,
+        "vueltas_completadas": vueltas,
+        "piloto_nombre": piloto,
+        "equipo": equipo,
+        "motor": None,
+        "posicion_final": "1",
+        "estado_carrera": "Finished",
+        "nombre_gp": f"GP {dataset_id}",
+        "circuito": "Sakhir",
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ColumnarSnapshotStore(str(tmp_path))
+    store.replace_all(
+        [
+            result(1, "Max Verstappen", "Red Bull", 25),
+            result(1, "Sergio Perez", "Red Bull", 18),
+            result(2, "Max Verstappen", "Red Bull", 25, anio=2022),
+            result(2, "Fernando Alonso", "Aston Martin", 18, anio=2022, vueltas=None),
+        ]
+    )
+    return store
+
+
+def test_group_sum_over_full_snapshot(store):
+    snapshot = store.open()
+
+    assert snapshot.group_sum("piloto_nombre") == {"Max Verstappen": 50, "Sergio Perez": 18, "Fernando Alonso": 18}
+    assert snapshot.group_sum("equipo", season=2022) == {"Red Bull": 25, "Aston Martin": 18}
+
+
+def test_group_count_filters_by_season(store):
+    snapshot = store.open()
+
+    assert snapshot.group_count("equipo", season=2023) == {"Red Bull": 2}
+
+
+def test_null_integers_are_stored_as_sentinel(store):
+    segment = store.open().segments[0]
+
+    assert list(segment.columns["vueltas_completadas"]) == [57, 57, 57, -1]
+
+
+def test_remove_hides_dataset_rows(store):
+    store.remove([1])
+    snapshot = store.open()
+
+    assert snapshot.group_sum("piloto_nombre") == {"Max Verstappen": 25, "Fernando Alonso": 18}
+
+
+def test_append_replaces_previous_rows_of_the_dataset(store):
+    manifest = store.append([1], [result(1, "Max Verstappen", "Red Bull", 26)])
+    snapshot = store.open()
+
+    assert len(manifest["segments"]) == 2
+    assert snapshot.group_sum("piloto_nombre") == {"Max Verstappen": 51, "Fernando Alonso": 18}
+
+
+def test_needs_compaction_after_deleting_most_rows(store):
+    manifest = store.remove([1, 2])
+
+    assert store.needs_compaction(manifest)
+    assert store.open().group_count("piloto_nombre") == {}
+
+
+def test_replace_all_compacts_into_single_segment(store):
+    store.append([3], [result(3, "Lando Norris", "McLaren", 10)])
+    manifest = store.replace_all([result(3, "Lando Norris", "McLaren", 10)])
+
+    assert [segment["rows"] for segment in manifest["segments"]] == [1]
+    assert store.open().group_sum("equipo") == {"McLaren": 10}
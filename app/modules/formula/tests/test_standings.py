@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from app.modules.formula import services
+from app.modules.formula.models import DriverStanding
+from app.modules.formula.repositories import FormulaStandingsRepository
+from app.modules.formula.services import FormulaStandingsService
+
+
+def test_refresh_season_only_aggregates_that_season():
+    repository = FormulaStandingsRepository()
+    repository.session = MagicMock()
+
+    repository.refresh_season(2023)
+
+    statements = [
+        str(call.args[0].compile(dialect=mysql.dialect())) for call in repository.session.execute.call_args_list
+    ]
+    assert len(statements) == 6
+    assert statements[1].startswith("INSERT INTO formula_driver_standing")
+    assert "GROUP BY formula_result.piloto_nombre" in statements[1]
+    assert "GROUP BY formula_result.equipo" in statements[3]
+    assert all("WHERE" in statement for statement in statements)
+    # No hace falta la tabla base dataset para agregar
+    assert "JOIN dataset" not in statements[1]
+    # Victorias y podios con la posición numérica, igual que las estadísticas de carrera
+    assert "formula_result.posicion_numero = %s" in statements[1]
+    assert "posicion_final" not in statements[1]
+
+
+def test_refresh_for_dataset_recalculates_old_and_new_season():
+    service = FormulaStandingsService()
+    service.repository = MagicMock()
+    service.repository.seasons_of.return_value = {2023, 2022}
+
+    assert service.refresh_for_dataset(8) == [2022, 2023]
+    assert [call.args[0] for call in service.repository.refresh_season.call_args_list] == [2022, 2023]
+    service.repository.session.commit.assert_called_once()
+
+
+def test_refresh_rolls_back_on_error():
+    service = FormulaStandingsService()
+    service.repository = MagicMock()
+    service.repository.seasons_of.return_value = {2023}
+    service.repository.refresh_season.side_effect = RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        service.refresh_for_dataset(8)
+    service.repository.session.rollback.assert_called_once()
+
+
+def test_driver_standings_are_ranked():
+    service = FormulaStandingsService()
+    service.repository = MagicMock()
+    service.repository.driver_standings.return_value = [
+        DriverStanding(piloto_nombre="Max Verstappen", puntos=575.0, carreras=22, victorias=19, podios=21),
+        DriverStanding(piloto_nombre="Sergio Perez", puntos=285.0, carreras=22, victorias=2, podios=9),
+    ]
+
+    standings = service.driver_standings(2023)
+
+    assert [(row["posicion"], row["piloto_nombre"]) for row in standings] == [
+        (1, "Max Verstappen"),
+        (2, "Sergio Perez"),
+    ]
+
+
+def test_dataset_changed_refreshes_standings(monkeypatch):
+    monkeypatch.setattr(services, "formula_snapshot_service", MagicMock())
+    monkeypatch.setattr(services, "formula_head_to_head_service", MagicMock())
+    standings = MagicMock()
+    monkeypatch.setattr(services, "formula_standings_service", standings)
+    monkeypatch.setattr(services, "formula_career_stats_service", MagicMock())
+
+    services._on_dataset_changed(None, dataset_id=3, dataset_type="formula", action="deleted")
+    services._on_dataset_changed(None, dataset_id=4, dataset_type="uvl", action="deleted")
+
+    standings.refresh_for_dataset.assert_called_once_with(3)
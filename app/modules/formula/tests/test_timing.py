@@ -0,0 +1,28 @@
+from unittest.mock import MagicMock
+
+from app.modules.formula.services import FormulaTimingService, format_gap
+
+
+def test_format_gap():
+    assert format_gap(320) == "+0.320"
+    assert format_gap(22167) == "+22.167"
+    assert format_gap(62345) == "+1:02.345"
+    assert format_gap(None) is None
+
+
+def test_race_gaps_formats_gaps_and_lapped_cars(monkeypatch):
+    dataset = MagicMock(id=3, nombre_gp="GP Bahrein", anio_temporada=2023)
+    monkeypatch.setattr("app.modules.formula.services.FormulaDataSet", MagicMock(**{"query.get.return_value": dataset}))
+    service = FormulaTimingService()
+    service.repository = MagicMock()
+    service.repository.race_gaps.return_value = [
+        {"orden": 1, "vueltas_perdidas": 0, "gap_ms": 0, "interval_ms": None},
+        {"orden": 2, "vueltas_perdidas": 0, "gap_ms": 11987, "interval_ms": 11987},
+        {"orden": 3, "vueltas_perdidas": 1, "gap_ms": None, "interval_ms": None},
+    ]
+
+    race = service.race_gaps(3)
+
+    assert race["nombre_gp"] == "GP Bahrein"
+    assert [result["gap"] for result in race["results"]] == [None, "+11.987", "+1 vuelta(s)"]
+    assert [result["interval"] for result in race["results"]] == [None, "+11.987", None]
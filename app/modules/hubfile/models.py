@@ -1,12 +1,27 @@
 from datetime import datetime, timezone
 
 from flask import request
+from sqlalchemy import event, update
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 
 
+class ContentBlob(db.Model):
+    """Contenido de un fichero guardado una sola vez en uploads/blobs, direccionado por su SHA-256."""
+
+    __tablename__ = "content_blob"
+    id = db.Column(db.Integer, primary_key=True)
+    checksum = db.Column(db.String(64), nullable=False, unique=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"ContentBlob<{self.checksum[:12]} refs={self.ref_count}>"
+
+
 class Hubfile(db.Model):
     __tablename__ = "file"
     id = db.Column(db.Integer, primary_key=True)
@@ -14,6 +29,9 @@ class Hubfile(db.Model):
     checksum = db.Column(db.String(120), nullable=False)
     size = db.Column(db.Integer, nullable=False)
     feature_model_id = db.Column(db.Integer, db.ForeignKey("feature_model.id"), nullable=False)
+    blob_id = db.Column(db.Integer, db.ForeignKey("content_blob.id"), nullable=True)
+
+    blob = db.relationship("ContentBlob")
 
     def get_formatted_size(self):
         from app.modules.dataset.services import SizeService
@@ -49,6 +67,18 @@ class Hubfile(db.Model):
         return f"File<{self.id}>"
 
 
+@event.listens_for(Hubfile, "after_delete")
+def _release_blob(mapper, connection, target):
+    # Los ficheros se borran en cascada con su dataset; cada borrado suelta una referencia al blob.
+    # Los blobs que se quedan sin referencias los elimina ContentBlobService.collect_garbage.
+    if target.blob_id is not None:
+        connection.execute(
+            update(ContentBlob.__table__)
+            .where(ContentBlob.id == target.blob_id)
+            .values(ref_count=ContentBlob.ref_count - 1)
+        )
+
+
 class HubfileViewRecord(db.Model):
     __tablename__ = "file_view_record"
     id = db.Column(db.Integer, primary_key=True)
@@ -56,6 +86,12 @@ class HubfileViewRecord(db.Model):
     file_id = db.Column(db.Integer, db.ForeignKey("file.id"), nullable=False)
     view_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     view_cookie = db.Column(db.String(36))
+    # user_id sin NULL, para que la clave única también descarte las visitas anónimas repetidas
+    user_key = db.Column(db.Integer, db.Computed("coalesce(user_id, 0)", persisted=True))
+
+    __table_args__ = (
+        db.UniqueConstraint("file_id", "view_cookie", "user_key", name="uq_file_view_record_file_id_cookie_user_key"),
+    )
 
     def __repr__(self):
         return "<FileViewRecord {}>".format(self.id)
@@ -68,6 +104,13 @@ class HubfileDownloadRecord(db.Model):
     file_id = db.Column(db.Integer, db.ForeignKey("file.id"))
     download_date = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     download_cookie = db.Column(db.String(36), nullable=False)
+    user_key = db.Column(db.Integer, db.Computed("coalesce(user_id, 0)", persisted=True))
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "file_id", "download_cookie", "user_key", name="uq_file_download_record_file_id_cookie_user_key"
+        ),
+    )
 
     def __repr__(self):
         return (
@@ -76,3 +119,14 @@ class HubfileDownloadRecord(db.Model):
             f"date={self.download_date} "
             f"cookie={self.download_cookie}>"
         )
+
+
+class HubfileDailyStats(db.Model):
+    """Visitas y descargas de cada fichero por día, consolidadas desde file_view_record y file_download_record."""
+
+    __tablename__ = "file_daily_stats"
+
+    file_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    downloads = db.Column(db.Integer, nullable=False, default=0, server_default="0")
@@ -1,11 +1,20 @@
-from sqlalchemy import func
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
-from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.hubfile.models import (
+    ContentBlob,
+    Hubfile,
+    HubfileDailyStats,
+    HubfileDownloadRecord,
+    HubfileViewRecord,
+)
 from core.repositories.BaseRepository import BaseRepository
+from core.repositories.DailyStatsRepository import DailyStatsRepository
 
 
 class HubfileRepository(BaseRepository):
@@ -25,20 +34,59 @@ class HubfileRepository(BaseRepository):
     def get_dataset_by_hubfile(self, hubfile: Hubfile) -> DataSet:
         return db.session.query(DataSet).join(FeatureModel).join(Hubfile).filter(Hubfile.id == hubfile.id).first()
 
+    def get_checksums_by_dataset(self, dataset_id: int) -> Dict[str, str]:
+        """Checksum de cada fichero del dataset, por nombre."""
+        rows = (
+            db.session.query(Hubfile.name, Hubfile.checksum)
+            .join(FeatureModel)
+            .filter(FeatureModel.dataset_id == dataset_id)
+            .all()
+        )
+        return {name: checksum for name, checksum in rows}
+
+
+class HubfileDailyStatsRepository(DailyStatsRepository):
+    def __init__(self):
+        super().__init__(
+            HubfileDailyStats,
+            "file_id",
+            {"views": (HubfileViewRecord, "view_date"), "downloads": (HubfileDownloadRecord, "download_date")},
+        )
+
 
 class HubfileViewRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(HubfileViewRecord)
+        self.daily_stats_repository = HubfileDailyStatsRepository()
 
     def total_hubfile_views(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+        return self.daily_stats_repository.total("views")
 
 
 class HubfileDownloadRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(HubfileDownloadRecord)
+        self.daily_stats_repository = HubfileDailyStatsRepository()
 
     def total_hubfile_downloads(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+        return self.daily_stats_repository.total("downloads")
+
+
+class ContentBlobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(ContentBlob)
+
+    def get_by_checksum(self, checksum: str) -> Optional[ContentBlob]:
+        return self.model.query.filter_by(checksum=checksum).first()
+
+    def add_reference(self, blob: ContentBlob):
+        # Incremento en SQL para que dos subidas simultáneas del mismo contenido no se pisen
+        blob.ref_count = ContentBlob.ref_count + 1
+        self.session.flush()
+
+    def get_unreferenced(self) -> List[ContentBlob]:
+        return self.model.query.filter(ContentBlob.ref_count <= 0).all()
+
+    def delete_if_unreferenced(self, blob_id: int) -> bool:
+        result = self.session.execute(delete(ContentBlob).where(ContentBlob.id == blob_id, ContentBlob.ref_count <= 0))
+        return result.rowcount == 1
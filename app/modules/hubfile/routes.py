@@ -1,14 +1,22 @@
 import os
 import uuid
 from datetime import datetime, timezone
+from typing import Optional
 
-from flask import current_app, jsonify, make_response, request, send_from_directory
+from flask import abort, current_app, jsonify, make_response, request
 from flask_login import current_user
+from werkzeug.security import safe_join
 
-from app import db
 from app.modules.hubfile import hubfile_bp
-from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
-from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService
+from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService, HubfileViewRecordService
+from core.caching.http import is_resumed_download, not_modified, send_upload
+
+
+def file_last_modified(path: str) -> Optional[datetime]:
+    try:
+        return datetime.fromtimestamp(int(os.stat(path).st_mtime), timezone.utc)
+    except FileNotFoundError:
+        return None
 
 
 @hubfile_bp.route("/file/download/<int:file_id>", methods=["GET"])
@@ -19,28 +27,34 @@ def download_file(file_id):
     directory_path = f"uploads/user_{file.feature_model.dataset.user_id}/dataset_{file.feature_model.dataset_id}/"
     parent_directory_path = os.path.dirname(current_app.root_path)
     file_path = os.path.join(parent_directory_path, directory_path)
+    full_path = safe_join(file_path, filename)
+    if full_path is None or not os.path.isfile(full_path):
+        abort(404)
+    last_modified = file_last_modified(full_path)
+
+    # ETag fuerte a partir del checksum: una revalidación se responde con 304 sin tocar la base de datos
+    cached = not_modified(file.checksum, last_modified)
+    if cached is not None:
+        return cached
 
     # Get the cookie from the request or generate a new one if it does not exist
     user_cookie = request.cookies.get("file_download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
 
-    # Check if the download record already exists for this cookie
-    existing_record = HubfileDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None, file_id=file_id, download_cookie=user_cookie
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        HubfileDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            file_id=file_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
+    # Resumed downloads are not new ones; repeated downloads are discarded by the record's unique key
+    if not is_resumed_download():
+        HubfileDownloadRecordService().record_download(
+            file_id, current_user.id if current_user.is_authenticated else None, user_cookie
         )
 
     # Save the cookie to the user's browser
-    resp = make_response(send_from_directory(directory=file_path, path=filename, as_attachment=True))
+    # send_upload atiende Range (206) e If-Range con el mismo ETag, o delega el envío en nginx
+    resp = make_response(
+        send_upload(
+            full_path, as_attachment=True, download_name=filename, etag=file.checksum, last_modified=last_modified
+        )
+    )
     resp.set_cookie("file_download_cookie", user_cookie)
 
     return resp
@@ -57,6 +71,11 @@ def view_file(file_id):
 
     try:
         if os.path.exists(file_path):
+            last_modified = file_last_modified(file_path)
+            cached = not_modified(file.checksum, last_modified)
+            if cached is not None:
+                return cached
+
             with open(file_path, "r") as f:
                 content = f.read()
 
@@ -64,26 +83,15 @@ def view_file(file_id):
             if not user_cookie:
                 user_cookie = str(uuid.uuid4())
 
-            # Check if the view record already exists for this cookie
-            existing_record = HubfileViewRecord.query.filter_by(
-                user_id=current_user.id if current_user.is_authenticated else None,
-                file_id=file_id,
-                view_cookie=user_cookie,
-            ).first()
-
-            if not existing_record:
-                # Register file view
-                new_view_record = HubfileViewRecord(
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    file_id=file_id,
-                    view_date=datetime.now(),
-                    view_cookie=user_cookie,
-                )
-                db.session.add(new_view_record)
-                db.session.commit()
+            # Register file view (repeated views are discarded by the record's unique key)
+            HubfileViewRecordService().record_view(
+                file_id, current_user.id if current_user.is_authenticated else None, user_cookie
+            )
 
             # Prepare response
             response = jsonify({"success": True, "content": content})
+            response.set_etag(file.checksum)
+            response.last_modified = last_modified
             if not request.cookies.get("view_cookie"):
                 response = make_response(response)
                 response.set_cookie("view_cookie", user_cookie, max_age=60 * 60 * 24 * 365 * 2)
@@ -1,15 +1,51 @@
+import hashlib
+import logging
 import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from typing import BinaryIO, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
 
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
-from app.modules.hubfile.models import Hubfile
+from app.modules.dataset.signals import dataset_changed
+from app.modules.hubfile.models import ContentBlob, Hubfile, HubfileDownloadRecord, HubfileViewRecord
 from app.modules.hubfile.repositories import (
+    ContentBlobRepository,
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from core.configuration.configuration import uploads_folder_name
+from core.managers.record_manager import record_manager
 from core.services.BaseService import BaseService
 
+logger = logging.getLogger(__name__)
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+def sha256_stream(stream: BinaryIO) -> Tuple[str, int]:
+    """SHA-256 y tamaño de un stream binario, leído por bloques. Deja el stream al principio."""
+    digest = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: stream.read(HASH_READ_SIZE), b""):
+        digest.update(block)
+        size += len(block)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+def sha256_file(file_path: str) -> Tuple[str, int]:
+    with open(file_path, "rb") as file:
+        return sha256_stream(file)
+
+
+def blob_directory() -> str:
+    return os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name(), "blobs")
+
 
 class HubfileService(BaseService):
     def __init__(self):
@@ -43,6 +79,130 @@ class HubfileService(BaseService):
         return hubfile_download_record_repository.total_hubfile_downloads()
 
 
+class HubfileViewRecordService(BaseService):
+    def __init__(self):
+        super().__init__(HubfileViewRecordRepository())
+
+    def record_view(self, file_id: int, user_id: Optional[int], view_cookie: str):
+        # Escritura diferida; la clave única (fichero, cookie, usuario) descarta las visitas repetidas
+        record_manager.record(
+            HubfileViewRecord,
+            {
+                "user_id": user_id,
+                "file_id": file_id,
+                "view_date": datetime.now(timezone.utc),
+                "view_cookie": view_cookie,
+            },
+            key=("file_id", "view_cookie", "user_id"),
+        )
+
+
 class HubfileDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(HubfileDownloadRecordRepository())
+
+    def record_download(self, file_id: int, user_id: Optional[int], download_cookie: str):
+        record_manager.record(
+            HubfileDownloadRecord,
+            {
+                "user_id": user_id,
+                "file_id": file_id,
+                "download_date": datetime.now(timezone.utc),
+                "download_cookie": download_cookie,
+            },
+            key=("file_id", "download_cookie", "user_id"),
+        )
+
+
+class ContentBlobService(BaseService):
+    """
+    Almacén de contenido direccionado por SHA-256 (uploads/blobs/ab/abcdef...).
+
+    Cada contenido distinto se guarda una sola vez; los ficheros de los datasets son enlaces
+    duros al blob, así que el resto de la aplicación sigue leyendo las rutas de siempre.
+    Las referencias se cuentan en content_blob.ref_count y se buscan por el checksum indexado.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        super().__init__(ContentBlobRepository())
+        self.directory = directory or blob_directory()
+
+    def blob_path(self, checksum: str) -> str:
+        return os.path.join(self.directory, checksum[:2], checksum)
+
+    def store_file(self, file_path: str) -> ContentBlob:
+        """Añade una referencia al blob con el contenido de file_path, guardándolo si es nuevo."""
+        checksum, size = sha256_file(file_path)
+        return self._store(checksum, size, lambda target: _link_or_copy(file_path, target))
+
+    def store_bytes(self, content: bytes) -> ContentBlob:
+        checksum = hashlib.sha256(content).hexdigest()
+
+        def write(target):
+            with open(target, "wb") as file:
+                file.write(content)
+
+        return self._store(checksum, len(content), write)
+
+    def _store(self, checksum: str, size: int, write) -> ContentBlob:
+        path = self.blob_path(checksum)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            write(tmp_path)
+            os.replace(tmp_path, path)
+
+        blob = self.repository.get_by_checksum(checksum)
+        if blob is None:
+            try:
+                with self.repository.session.begin_nested():
+                    blob = self.repository.create(commit=False, checksum=checksum, size=size, ref_count=1)
+                return blob
+            except IntegrityError:
+                # Otra petición ha registrado el mismo contenido a la vez
+                blob = self.repository.get_by_checksum(checksum)
+
+        self.repository.add_reference(blob)
+        return blob
+
+    def link(self, blob: ContentBlob, dest_path: str):
+        """Deja en dest_path el contenido del blob (enlace duro, o copia si no es posible)."""
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        _link_or_copy(self.blob_path(blob.checksum), dest_path)
+
+    def collect_garbage(self) -> int:
+        """Elimina los blobs que ya no tienen referencias. Devuelve cuántos se han borrado."""
+        removed = 0
+        for blob in self.repository.get_unreferenced():
+            checksum = blob.checksum
+            if self.repository.delete_if_unreferenced(blob.id):
+                self.repository.session.commit()
+                try:
+                    os.remove(self.blob_path(checksum))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+        return removed
+
+
+def _link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        # Distinto sistema de ficheros o sin soporte de enlaces duros
+        shutil.copyfile(source, target)
+
+
+def _on_dataset_changed(sender, dataset_id, dataset_type, action, **kwargs):
+    if action == "deleted":
+        try:
+            removed = ContentBlobService().collect_garbage()
+            if removed:
+                logger.info(f"Removed {removed} unreferenced blobs after deleting dataset {dataset_id}")
+        except Exception as exc:
+            logger.exception(f"Error collecting unreferenced blobs: {exc}")
+
+
+dataset_changed.connect(_on_dataset_changed)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.modules.hubfile.services import ContentBlobService, sha256_file
+
+
+@pytest.fixture
+def blob_service(tmp_path):
+    service = ContentBlobService(directory=str(tmp_path / "blobs"))
+    service.repository = MagicMock()
+    service.repository.get_by_checksum.return_value = None
+    service.repository.create.side_effect = lambda commit, **kwargs: MagicMock(**kwargs)
+    return service
+
+
+def test_sha256_file(tmp_path):
+    path = tmp_path / "model.uvl"
+    path.write_bytes(b"features\n    Root")
+
+    assert sha256_file(str(path)) == (hashlib.sha256(b"features\n    Root").hexdigest(), 17)
+
+
+def test_store_bytes_writes_new_blob_once(blob_service):
+    blob = blob_service.store_bytes(b"features")
+
+    checksum = hashlib.sha256(b"features").hexdigest()
+    assert blob.checksum == checksum
+    assert blob.ref_count == 1
+    with open(blob_service.blob_path(checksum), "rb") as file:
+        assert file.read() == b"features"
+    blob_service.repository.add_reference.assert_not_called()
+
+
+def test_store_known_content_adds_reference(blob_service, tmp_path):
+    existing = MagicMock(checksum=hashlib.sha256(b"features").hexdigest(), size=8)
+    blob_service.repository.get_by_checksum.return_value = existing
+    path = tmp_path / "copy.uvl"
+    path.write_bytes(b"features")
+
+    blob = blob_service.store_file(str(path))
+
+    assert blob is existing
+    blob_service.repository.create.assert_not_called()
+    blob_service.repository.add_reference.assert_called_once_with(existing)
+
+
+def test_link_shares_the_blob_content(blob_service, tmp_path):
+    blob = blob_service.store_bytes(b"features")
+    dest = tmp_path / "uploads" / "user_1" / "dataset_1" / "model.uvl"
+
+    blob_service.link(blob, str(dest))
+
+    assert dest.read_bytes() == b"features"
+    assert os.stat(dest).st_ino == os.stat(blob_service.blob_path(blob.checksum)).st_ino
+
+
+def test_collect_garbage_removes_unreferenced_blobs(blob_service):
+    blob = blob_service.store_bytes(b"features")
+    blob_service.repository.get_unreferenced.return_value = [blob]
+    blob_service.repository.delete_if_unreferenced.return_value = True
+
+    assert blob_service.collect_garbage() == 1
+    assert not os.path.exists(blob_service.blob_path(blob.checksum))
@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask, send_file
+
+from core.caching.http import is_resumed_download, not_modified, send_upload
+
+CHECKSUM = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+MODIFIED = datetime(2024, 6, 23, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "model.uvl"
+    path.write_bytes(b"0123456789" * 100)
+    app = Flask(__name__)
+    recorded = []
+
+    @app.route("/file")
+    def download():
+        cached = not_modified(CHECKSUM, MODIFIED)
+        if cached is not None:
+            return cached
+        if not is_resumed_download():
+            recorded.append(1)
+        return send_file(str(path), etag=CHECKSUM, last_modified=MODIFIED)
+
+    client = app.test_client()
+    client.recorded = recorded
+    return client
+
+
+def test_full_download_has_strong_etag(client):
+    response = client.get("/file")
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{CHECKSUM}"'
+    assert len(response.data) == 1000
+
+
+def test_if_none_match_returns_304_without_recording(client):
+    response = client.get("/file", headers={"If-None-Match": f'"{CHECKSUM}"'})
+
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.recorded == []
+
+
+def test_if_modified_since_returns_304(client):
+    response = client.get("/file", headers={"If-Modified-Since": "Sun, 23 Jun 2024 12:00:00 GMT"})
+
+    assert response.status_code == 304
+
+
+def test_stale_etag_sends_the_file(client):
+    response = client.get("/file", headers={"If-None-Match": '"other"'})
+
+    assert response.status_code == 200
+    assert client.recorded == [1]
+
+
+def test_range_returns_206_and_resumes_without_recording(client):
+    response = client.get("/file", headers={"Range": "bytes=990-"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 990-999/1000"
+    assert response.data == b"0123456789"
+    assert client.recorded == []
+
+
+def test_suffix_range_is_a_resumed_download(client):
+    response = client.get("/file", headers={"Range": "bytes=-10"})
+
+    assert response.status_code == 206
+    assert response.data == b"0123456789"
+    assert client.recorded == []
+
+
+def test_range_from_the_first_byte_is_a_new_download(client):
+    response = client.get("/file", headers={"Range": "bytes=0-"})
+
+    assert response.status_code == 206
+    assert client.recorded == [1]
+
+
+def test_if_range_with_old_etag_sends_full_file(client):
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+
+    assert response.status_code == 200
+    assert len(response.data) == 1000
+
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    path = tmp_path / "uploads" / "user_1" / "dataset_2" / "model file.uvl"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"features")
+    return path
+
+
+def test_send_upload_x_accel_redirect(upload, monkeypatch):
+    monkeypatch.setenv("FILE_DELIVERY", "x-accel")
+    app = Flask(__name__)
+
+    with app.test_request_context("/file"):
+        response = send_upload(str(upload), etag=CHECKSUM, last_modified=MODIFIED)
+
+    assert response.headers["X-Accel-Redirect"] == "/protected/uploads/user_1/dataset_2/model%20file.uvl"
+    assert response.headers["ETag"] == f'"{CHECKSUM}"'
+    assert "attachment" in response.headers["Content-Disposition"]
+    assert response.get_data() == b""
+
+
+def test_send_upload_defaults_to_app_delivery(upload, monkeypatch):
+    monkeypatch.delenv("FILE_DELIVERY", raising=False)
+    app = Flask(__name__)
+
+    with app.test_request_context("/file"):
+        response = send_upload(str(upload), etag=CHECKSUM)
+        response.direct_passthrough = False
+
+        assert "X-Accel-Redirect" not in response.headers
+        assert response.get_data() == b"features"
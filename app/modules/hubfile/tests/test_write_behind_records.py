@@ -0,0 +1,98 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from core.managers.record_manager import RecordManager
+
+metadata = sa.MetaData()
+RECORDS = sa.Table(
+    "file_view_record",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("file_id", sa.Integer, nullable=False),
+    sa.Column("view_cookie", sa.String(36)),
+    sa.UniqueConstraint("file_id", "view_cookie"),
+)
+Record = SimpleNamespace(__table__=RECORDS)
+KEY = ("file_id", "view_cookie")
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'records.db'}"
+    app.config["RECORD_FLUSH_INTERVAL"] = 60
+    db = SQLAlchemy(app)
+    with app.app_context():
+        metadata.create_all(db.engine)
+
+    recorder = RecordManager(app)
+
+    def rows():
+        with app.app_context():
+            with db.engine.connect() as connection:
+                return connection.execute(sa.select(RECORDS.c.file_id, RECORDS.c.view_cookie)).all()
+
+    recorder.rows = rows
+    return recorder
+
+
+def test_write_behind_defers_inserts_until_flush(recorder):
+    with patch.object(RecordManager, "_run"):
+        recorder.record(Record, {"file_id": 1, "view_cookie": "a"}, key=KEY)
+        recorder.record(Record, {"file_id": 1, "view_cookie": "a"}, key=KEY)
+        recorder.record(Record, {"file_id": 2, "view_cookie": "a"}, key=KEY)
+
+        assert recorder.rows() == []
+        recorder.flush()
+
+    assert sorted(recorder.rows()) == [(1, "a"), (2, "a")]
+
+
+def test_insert_ignore_skips_records_written_in_earlier_batches(recorder):
+    recorder.app.config["RECORD_WRITE_BEHIND"] = False
+
+    recorder.record(Record, {"file_id": 1, "view_cookie": "a"}, key=KEY)
+    recorder.record_many(Record, [{"file_id": 1, "view_cookie": "a"}, {"file_id": 1, "view_cookie": "b"}], key=KEY)
+
+    assert sorted(recorder.rows()) == [(1, "a"), (1, "b")]
+
+
+def test_full_queue_writes_in_the_request(recorder):
+    recorder.app.config["RECORD_QUEUE_SIZE"] = 1
+    with patch.object(RecordManager, "_run"):
+        recorder.record_many(Record, [{"file_id": 1, "view_cookie": "a"}, {"file_id": 2, "view_cookie": "a"}], key=KEY)
+
+        assert recorder.rows() == [(2, "a")]
+        recorder.flush()
+
+    assert sorted(recorder.rows()) == [(1, "a"), (2, "a")]
+
+
+def test_flusher_writes_batches_in_the_background(recorder):
+    recorder.app.config["RECORD_FLUSH_INTERVAL"] = 0.01
+    recorder.record(Record, {"file_id": 5, "view_cookie": "a"}, key=KEY)
+
+    recorder._thread.join(timeout=0.5)
+
+    assert recorder.rows() == [(5, "a")]
+    assert recorder._pid == os.getpid()
+
+
+def test_flush_hooks_receive_deduplicated_rows(recorder):
+    recorder.app.config["RECORD_WRITE_BEHIND"] = False
+    received = []
+    recorder.add_flush_hook(Record, lambda rows, inserted: received.append((rows, inserted)))
+
+    recorder.record_many(Record, [{"file_id": 1, "view_cookie": "a"}, {"file_id": 1, "view_cookie": "a"}], key=KEY)
+    recorder.record_many(Record, [{"file_id": 1, "view_cookie": "a"}, {"file_id": 2, "view_cookie": "a"}], key=KEY)
+
+    assert received == [
+        ([{"file_id": 1, "view_cookie": "a"}], 1),
+        ([{"file_id": 1, "view_cookie": "a"}, {"file_id": 2, "view_cookie": "a"}], 1),
+    ]
@@ -3,8 +3,8 @@ import logging
 from flask import render_template
 
 from app.modules.dataset.services import DataSetService
-from app.modules.featuremodel.services import FeatureModelService
 from app.modules.public import public_bp
+from app.modules.public.services import site_statistics_service
 
 logger = logging.getLogger(__name__)
 
@@ -13,27 +13,12 @@ logger = logging.getLogger(__name__)
 def index():
     logger.info("Access index")
     dataset_service = DataSetService()
-    feature_model_service = FeatureModelService()
 
-    # Statistics: total datasets and feature models
-    datasets_counter = dataset_service.count_synchronized_datasets()
-    feature_models_counter = feature_model_service.count_feature_models()
-
-    # Statistics: total downloads
-    total_dataset_downloads = dataset_service.total_dataset_downloads()
-    total_feature_model_downloads = feature_model_service.total_feature_model_downloads()
-
-    # Statistics: total views
-    total_dataset_views = dataset_service.total_dataset_views()
-    total_feature_model_views = feature_model_service.total_feature_model_views()
+    # Statistics: datasets, feature models, downloads, views and unique visitors (shared counters)
+    statistics = site_statistics_service.get_statistics()
 
     return render_template(
         "public/index.html",
         datasets=dataset_service.latest_synchronized(),
-        datasets_counter=datasets_counter,
-        feature_models_counter=feature_models_counter,
-        total_dataset_downloads=total_dataset_downloads,
-        total_feature_model_downloads=total_feature_model_downloads,
-        total_dataset_views=total_dataset_views,
-        total_feature_model_views=total_feature_model_views,
+        **statistics,
     )
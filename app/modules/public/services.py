@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from app.modules.dataset.models import DSDownloadRecord, DSViewRecord
+from app.modules.dataset.services import DataSetService, unique_visitors_service
+from app.modules.dataset.signals import dataset_changed
+from app.modules.featuremodel.services import FeatureModelService
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.public import public_bp
+from core.caching.counters import SharedCounters
+from core.configuration.configuration import shared_cache_dir
+from core.managers.record_manager import record_manager
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se cuadran los contadores con la base de datos
+HOME_STATS_RECONCILE_SECONDS = float(os.getenv("HOME_STATS_RECONCILE_SECONDS", "300"))
+
+
+class SiteStatisticsService:
+    """
+    Estadísticas de la portada (datasets, modelos, visitas, descargas y visitantes únicos).
+
+    Los valores viven en un SharedCounters común a todos los procesos. Los registros de visitas
+    y descargas los incrementan al escribirse (hooks del record_manager) y las altas, bajas y
+    publicaciones de datasets recuentan los datasets y modelos (señal dataset_changed), así que
+    la portada no hace ninguna consulta de recuento. Cada HOME_STATS_RECONCILE_SECONDS un único
+    proceso los recalcula desde la base de datos para corregir cualquier desviación.
+
+    El fichero de los contadores lo fija init_app con el SHARED_CACHE_DIR de la app.
+    """
+
+    def __init__(self, counters: Optional[SharedCounters] = None, reconcile_seconds: float = None):
+        self.counters = counters
+        self.reconcile_seconds = HOME_STATS_RECONCILE_SECONDS if reconcile_seconds is None else reconcile_seconds
+        self.dataset_service = DataSetService()
+        self.feature_model_service = FeatureModelService()
+
+    def init_app(self, app):
+        self.counters = SharedCounters(os.path.join(shared_cache_dir(app), "site_stats.json"))
+
+    def compute_catalog(self) -> Dict[str, int]:
+        return {
+            "datasets_counter": self.dataset_service.count_synchronized_datasets(),
+            "feature_models_counter": self.feature_model_service.count_feature_models(),
+        }
+
+    def compute(self) -> Dict[str, int]:
+        """Todas las estadísticas, calculadas en la base de datos."""
+        return {
+            **self.compute_catalog(),
+            "total_dataset_downloads": self.dataset_service.total_dataset_downloads(),
+            "total_feature_model_downloads": self.feature_model_service.total_feature_model_downloads(),
+            "total_dataset_views": self.dataset_service.total_dataset_views(),
+            "total_feature_model_views": self.feature_model_service.total_feature_model_views(),
+            "unique_dataset_visitors": unique_visitors_service.unique_visitors("dataset"),
+            "unique_feature_model_visitors": unique_visitors_service.unique_visitors("file"),
+        }
+
+    def reconcile(self) -> Dict[str, int]:
+        values = self.compute()
+        self.counters.set(values, reconciled=True)
+        return values
+
+    def get_statistics(self) -> Dict[str, int]:
+        values = self.counters.values()
+        reconciled_at = self.counters.reconciled_at()
+        if reconciled_at is not None and time.time() - reconciled_at < self.reconcile_seconds:
+            return values
+
+        with self.counters.reconciling() as acquired:
+            if acquired:
+                return self.reconcile()
+        # Otro proceso está recalculando: se sirven los valores que hay, salvo en el primer uso
+        return values if reconciled_at is not None else self.compute()
+
+    def increment(self, **deltas: int):
+        self.counters.increment(deltas)
+
+    def refresh(self, **values: int):
+        self.counters.set(values)
+
+
+site_statistics_service = SiteStatisticsService()
+public_bp.record(lambda state: site_statistics_service.init_app(state.app))
+
+
+def _record_hook(counter: str, visitors: Optional[tuple] = None):
+    def hook(rows, inserted):
+        site_statistics_service.increment(**{counter: inserted})
+        if visitors and inserted:
+            # El sketch ya se ha actualizado en su propio hook; leerlo es una sola fila
+            name, object_type = visitors
+            site_statistics_service.refresh(**{name: unique_visitors_service.unique_visitors(object_type)})
+
+    return hook
+
+
+record_manager.add_flush_hook(DSViewRecord, _record_hook("total_dataset_views", ("unique_dataset_visitors", "dataset")))
+record_manager.add_flush_hook(
+    HubfileViewRecord, _record_hook("total_feature_model_views", ("unique_feature_model_visitors", "file"))
+)
+record_manager.add_flush_hook(DSDownloadRecord, _record_hook("total_dataset_downloads"))
+record_manager.add_flush_hook(HubfileDownloadRecord, _record_hook("total_feature_model_downloads"))
+
+
+def _on_dataset_changed(sender, dataset_id, dataset_type, action, **kwargs):
+    # Un dataset cuenta en la portada cuando tiene DOI; sus modelos, desde que se crea
+    if action in ("created", "published", "deleted"):
+        try:
+            site_statistics_service.refresh(**site_statistics_service.compute_catalog())
+        except Exception as exc:
+            logger.exception(f"Error refreshing site statistics after dataset {dataset_id} was {action}: {exc}")
+
+
+dataset_changed.connect(_on_dataset_changed)
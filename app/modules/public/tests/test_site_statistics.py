@@ -0,0 +1,78 @@
+import os
+import time
+from unittest.mock import MagicMock
+
+from app.modules.public.services import SiteStatisticsService
+from core.caching.counters import SharedCounters
+
+COMPUTED = {
+    "datasets_counter": 3,
+    "feature_models_counter": 12,
+    "total_dataset_downloads": 40,
+    "total_feature_model_downloads": 9,
+    "total_dataset_views": 100,
+    "total_feature_model_views": 25,
+    "unique_dataset_visitors": 30,
+    "unique_feature_model_visitors": 8,
+}
+
+
+def make_service(tmp_path, reconcile_seconds=300):
+    service = SiteStatisticsService(SharedCounters(str(tmp_path / "site_stats.json")), reconcile_seconds)
+    service.compute = MagicMock(return_value=dict(COMPUTED))
+    return service
+
+
+def test_shared_counters_are_visible_to_other_processes(tmp_path):
+    path = str(tmp_path / "stats.json")
+    writer, reader = SharedCounters(path), SharedCounters(path)
+
+    writer.set({"views": 5}, reconciled=True)
+    writer.increment({"views": 2, "unknown": 4})
+
+    assert reader.values() == {"views": 7}
+    assert reader.reconciled_at() is not None
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+
+def test_only_one_process_reconciles_at_a_time(tmp_path):
+    path = str(tmp_path / "stats.json")
+
+    with SharedCounters(path).reconciling() as first:
+        with SharedCounters(path).reconciling() as second:
+            assert first and not second
+
+
+def test_statistics_are_served_from_counters_between_reconciliations(tmp_path):
+    service = make_service(tmp_path)
+
+    assert service.get_statistics() == COMPUTED
+    service.increment(total_dataset_views=3, total_dataset_downloads=0)
+    statistics = service.get_statistics()
+
+    assert statistics["total_dataset_views"] == 103
+    assert service.compute.call_count == 1
+
+
+def test_stale_statistics_are_reconciled(tmp_path, monkeypatch):
+    service = make_service(tmp_path, reconcile_seconds=60)
+    service.get_statistics()
+    service.increment(total_dataset_views=3)
+
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    assert service.get_statistics()["total_dataset_views"] == 100
+    assert service.compute.call_count == 2
+
+
+def test_other_processes_serve_stale_values_while_reconciling(tmp_path):
+    service = make_service(tmp_path, reconcile_seconds=0)
+    service.get_statistics()
+    service.increment(total_dataset_views=1)
+
+    with service.counters.reconciling():
+        statistics = service.get_statistics()
+
+    assert statistics["total_dataset_views"] == 101
+    assert service.compute.call_count == 1
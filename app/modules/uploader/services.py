@@ -15,6 +15,7 @@ from app import db
 from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
 from app.modules.featuremodel.models import FeatureModel, FMMetaData
 from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.services import ContentBlobService
 from app.modules.zenodo.services import ZenodoService
 from core.services.BaseService import BaseService
 
@@ -22,6 +23,7 @@ VALID_EXTENSIONS = (".uvl", ".csv", ".png", ".jpg", ".jpeg")
 
 logger = logging.getLogger(__name__)
 zenodo_service = ZenodoService()
+content_blob_service = ContentBlobService()
 
 
 def calculate_checksum_and_size_bytes(content_bytes):
@@ -134,23 +136,21 @@ class UploaderService(BaseService):
             db.session.add(fm)
             db.session.commit()
 
-            file_path = dataset_dir / f["uvl_filename"]
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(file_path, "wb") as f_out:
-                f_out.write(content_bytes)
+            # Se guarda una sola vez en el almacén de blobs y se enlaza en la carpeta del dataset
+            blob = content_blob_service.store_bytes(content_bytes)
+            content_blob_service.link(blob, str(dataset_dir / f["uvl_filename"]))
 
             temp_file_path = Path(temp_dir) / f["uvl_filename"]
             temp_file_path.parent.mkdir(parents=True, exist_ok=True)
             with open(temp_file_path, "wb") as f_temp:
                 f_temp.write(content_bytes)
 
-            checksum, size = calculate_checksum_and_size_bytes(content_bytes)
-
             hubfile = Hubfile(
                 name=f["uvl_filename"],
-                checksum=checksum,
-                size=size,
+                checksum=blob.checksum,
+                size=blob.size,
                 feature_model_id=fm.id,
+                blob_id=blob.id,
             )
             db.session.add(hubfile)
             db.session.commit()
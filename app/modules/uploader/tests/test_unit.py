@@ -117,6 +117,7 @@ class TestUploaderService:
         with pytest.raises(ValueError, match="No ZIP o GitHub URL"):
             service.prepare_preview(None, None)
 
+    @patch("app.modules.uploader.services.content_blob_service")
     @patch("builtins.open", create=True)
     @patch("app.modules.uploader.services.Hubfile")
     @patch("app.modules.uploader.services.FeatureModel")
@@ -139,6 +140,7 @@ class TestUploaderService:
         mock_fm_class,
         mock_hubfile_class,
         mock_open,
+        mock_blob_service,
         service,
         tmp_path,
     ):
@@ -191,6 +193,10 @@ class TestUploaderService:
             assert result == mock_dataset
             assert mock_session.add.called
             assert mock_session.commit.called
+            mock_blob_service.store_bytes.assert_called_once_with(b"test content")
+            mock_blob_service.link.assert_called_once_with(
+                mock_blob_service.store_bytes.return_value, str(tmp_path / "user_1" / "dataset_1" / "test.uvl")
+            )
 
 
 class TestUploaderRepository:
@@ -37,4 +37,9 @@ def deploy():
     # Ejecutar el script de reinicio en segundo plano
     service.restart_container(web_container)
 
+    # El worker de datasets comparte el código montado en /app: reiniciarlo para que use la nueva versión
+    worker_container = service.get_worker_container()
+    if worker_container is not None:
+        service.restart_container(worker_container)
+
     return "Deployment successful", 200
@@ -34,6 +34,13 @@ class WebhookService(BaseService):
         except docker.errors.NotFound:
             abort(404, description="Web container not found.")
 
+    def get_worker_container(self):
+        """Contenedor del worker de datasets, o None si este despliegue no lo tiene."""
+        try:
+            return client.containers.get("dataset_worker_container")
+        except docker.errors.NotFound:
+            return None
+
     def get_volume_name(self, container):
         volume_name = next(
             (
@@ -0,0 +1,94 @@
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class SharedCounters:
+    """
+    Contadores en un fichero JSON compartido por los workers de gunicorn y el worker de trabajos.
+
+    Leer cuesta un stat() mientras el fichero no cambie. Los incrementos se serializan con un
+    flock y se escriben con os.replace, así que nadie lee un fichero a medio escribir. Junto a
+    los valores se guarda cuándo se cuadraron por última vez con la base de datos.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stat = None
+        self._state = {"values": {}, "reconciled_at": None}
+
+    def _read(self) -> dict:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {"values": {}, "reconciled_at": None}
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._stat:
+            try:
+                with open(self.path) as counters_file:
+                    self._state = json.load(counters_file)
+            except (FileNotFoundError, ValueError):
+                return self._state
+            self._stat = key
+        return self._state
+
+    def values(self) -> Dict[str, int]:
+        return dict(self._read()["values"])
+
+    def reconciled_at(self) -> Optional[float]:
+        return self._read()["reconciled_at"]
+
+    @contextmanager
+    def _locked(self, suffix: str = ".lock", blocking: bool = True):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + suffix, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _update(self, change: Callable[[dict], dict]):
+        with self._locked():
+            state = change(dict(self._read()))
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as tmp_file:
+                json.dump(state, tmp_file)
+            os.replace(tmp_path, self.path)
+
+    def increment(self, deltas: Dict[str, int]):
+        """Suma a los contadores existentes. Los que aún no se han calculado se dejan para la conciliación."""
+
+        def change(state):
+            values = dict(state["values"])
+            for name, delta in deltas.items():
+                if name in values and delta:
+                    values[name] += delta
+            return {**state, "values": values}
+
+        if any(deltas.values()):
+            self._update(change)
+
+    def set(self, values: Dict[str, int], reconciled: bool = False):
+        """Sustituye algunos valores; con reconciled=True marca además la conciliación completa."""
+
+        def change(state):
+            new_state = {**state, "values": {**state["values"], **values}}
+            if reconciled:
+                new_state["reconciled_at"] = time.time()
+            return new_state
+
+        self._update(change)
+
+    @contextmanager
+    def reconciling(self):
+        """Lock no bloqueante: solo un proceso recalcula a la vez; el resto sigue con los valores actuales."""
+        with self._locked(".reconcile.lock", blocking=False) as acquired:
+            yield acquired
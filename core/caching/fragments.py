@@ -0,0 +1,166 @@
+"""
+Caché de fragmentos de plantilla: `{% cache key, ttl %} ... {% endcache %}`.
+
+La clave es cualquier expresión (normalmente una lista con el tipo de fragmento, el id de la
+entidad y su `updated_at`), así que un cambio en la entidad produce una clave nueva y la
+entrada antigua simplemente caduca. A la clave se le antepone la plantilla y la línea de la
+etiqueta, de modo que editar una plantilla no sirve fragmentos de la versión anterior. El ttl
+es opcional (por defecto FRAGMENT_CACHE_TTL segundos).
+
+Los fragmentos no deben depender del usuario: se comparten entre todos los visitantes.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Optional
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from core.caching.lru import LRUCache
+from core.configuration.configuration import uploads_folder_name
+
+
+def fragment_key(prefix: str, key) -> str:
+    if isinstance(key, (list, tuple)):
+        parts = key
+    else:
+        parts = [key]
+    return ":".join(
+        [prefix] + [part.isoformat() if isinstance(part, (date, datetime)) else str(part) for part in parts]
+    )
+
+
+class LRUFragmentBackend:
+    """Fragmentos en memoria del proceso; cada worker de gunicorn tiene los suyos."""
+
+    def __init__(self, maxsize: int = 2048):
+        self.cache = LRUCache(maxsize)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.cache.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def set(self, key: str, value: str, ttl: int):
+        self.cache.set(key, (time.time() + ttl, value))
+
+
+class FileSystemFragmentBackend:
+    """
+    Fragmentos en un directorio compartido por todos los workers. Cada fragmento es un fichero
+    cuyo mtime es el instante de caducidad; se escriben con os.replace, así que nunca se lee
+    uno a medio escribir. Cada `prune_every` escrituras se borran los caducados.
+    """
+
+    def __init__(self, directory: str, prune_every: int = 500):
+        self.directory = directory
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            if os.stat(path).st_mtime < time.time():
+                return None
+            with open(path, encoding="utf-8") as fragment_file:
+                return fragment_file.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str, ttl: int):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fragment_file:
+            fragment_file.write(value)
+        expires_at = time.time() + ttl
+        os.utime(tmp_path, (expires_at, expires_at))
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Borra los fragmentos caducados. Devuelve cuántos se han borrado."""
+        removed = 0
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if entry.name.endswith(".tmp"):
+                # Fragmento que otro proceso está escribiendo
+                continue
+            try:
+                if entry.stat().st_mtime < now:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache_backend=None, fragment_cache_ttl=600)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        ttl = parser.parse_expression() if parser.stream.skip_if("comma") else nodes.Const(None)
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        prefix = nodes.Const(f"{parser.name}:{lineno}")
+        return nodes.CallBlock(self.call_method("_render", [prefix, key, ttl]), [], [], body).set_lineno(lineno)
+
+    def _render(self, prefix: str, key, ttl: Optional[int], caller) -> str:
+        backend = self.environment.fragment_cache_backend
+        if backend is None:
+            return caller()
+
+        cache_key = fragment_key(prefix, key)
+        fragment = backend.get(cache_key)
+        if fragment is None:
+            fragment = caller()
+            backend.set(cache_key, str(fragment), ttl or self.environment.fragment_cache_ttl)
+        return Markup(fragment)
+
+
+def fragment_cache_backend(app):
+    kind = app.config["FRAGMENT_CACHE"]
+    if kind == "lru":
+        return LRUFragmentBackend(app.config["FRAGMENT_CACHE_SIZE"])
+    if kind == "filesystem":
+        directory = app.config["FRAGMENT_CACHE_DIR"] or os.path.join(
+            os.getenv("WORKING_DIR", ""), uploads_folder_name(), "cache", "fragments"
+        )
+        return FileSystemFragmentBackend(directory)
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown FRAGMENT_CACHE backend: {kind}")
+
+
+def init_fragment_cache(app):
+    app.config.setdefault("FRAGMENT_CACHE", "lru")
+    app.config.setdefault("FRAGMENT_CACHE_TTL", 600)
+    app.config.setdefault("FRAGMENT_CACHE_SIZE", 2048)
+    app.config.setdefault("FRAGMENT_CACHE_DIR", None)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache_backend = fragment_cache_backend(app)
+    app.jinja_env.fragment_cache_ttl = app.config["FRAGMENT_CACHE_TTL"]
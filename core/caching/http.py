@@ -0,0 +1,93 @@
+import mimetypes
+import os
+from datetime import datetime
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+from werkzeug.http import is_resource_modified
+
+from core.configuration.configuration import uploads_folder_name
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    Respuesta 304 si la copia del cliente sigue siendo válida (If-None-Match o If-Modified-Since),
+    o None si hay que enviar el recurso. Se comprueba antes de leer el fichero o registrar la
+    descarga, así que una revalidación no cuesta nada en el servidor.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    if not request.if_none_match and request.if_modified_since is None:
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def is_resumed_download() -> bool:
+    """
+    True si la petición pide un rango que no empieza en el byte 0 (continuación de una descarga).
+    Un rango de sufijo (bytes=-N) llega con inicio negativo y también es una continuación.
+    """
+    return request.range is not None and any(start != 0 for start, _ in request.range.ranges)
+
+
+def file_delivery_mode() -> str:
+    """
+    "app" (por defecto): gunicorn envía el fichero con sendfile. "x-accel": la aplicación solo
+    autoriza y contabiliza, y nginx envía el fichero desde una location interna.
+    """
+    return os.getenv("FILE_DELIVERY", "app").lower()
+
+
+def x_accel_prefix() -> str:
+    return os.getenv("X_ACCEL_UPLOADS_PREFIX", "/protected/uploads/")
+
+
+def uploads_root() -> str:
+    return os.path.abspath(os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name()))
+
+
+def send_upload(
+    path: str,
+    mimetype: Optional[str] = None,
+    as_attachment: bool = True,
+    download_name: Optional[str] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+) -> Response:
+    """
+    Envía un fichero de la carpeta de uploads. Con FILE_DELIVERY=x-accel se responde con una
+    cabecera X-Accel-Redirect y nginx sirve los bytes (incluidos los rangos), así que el worker
+    queda libre al instante. Los ficheros fuera de uploads siempre se envían desde la aplicación.
+    """
+    path = os.path.abspath(path)
+    download_name = download_name or os.path.basename(path)
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+    relative_path = os.path.relpath(path, uploads_root())
+
+    if file_delivery_mode() != "x-accel" or relative_path.startswith(os.pardir):
+        return send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            etag=etag if etag is not None else True,
+            last_modified=last_modified,
+        )
+
+    response = Response(mimetype=mimetype)
+    response.headers["X-Accel-Redirect"] = x_accel_prefix() + quote(relative_path)
+    if as_attachment:
+        response.headers.set("Content-Disposition", "attachment", filename=download_name)
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
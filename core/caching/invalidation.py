@@ -0,0 +1,82 @@
+import fcntl
+import json
+import os
+from typing import List, Optional, Tuple
+
+
+class SharedInvalidationLog:
+    """
+    Registro en disco, compartido por los workers de gunicorn y el worker de trabajos, de las
+    últimas etiquetas invalidadas. Cada publicación incrementa la generación; un proceso que
+    conoce la generación N pide los cambios posteriores y solo invalida esas etiquetas.
+
+    Leer cuesta un stat() mientras el fichero no cambie. Si un proceso se ha quedado tan atrás
+    que sus cambios ya no están en el registro, se le indica que vacíe la caché entera.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self._stat = None
+        self._state = {"generation": 0, "entries": []}
+
+    def _read(self) -> dict:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {"generation": 0, "entries": []}
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._stat:
+            try:
+                with open(self.path) as log_file:
+                    self._state = json.load(log_file)
+            except (FileNotFoundError, ValueError):
+                return self._state
+            self._stat = key
+        return self._state
+
+    def generation(self) -> int:
+        return self._read()["generation"]
+
+    def publish(self, tags: Optional[List[str]]) -> int:
+        """Añade una invalidación (None = vaciar todo) y devuelve la nueva generación."""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = dict(self._read())
+                generation = state["generation"] + 1
+                entries = state["entries"] + [[generation, tags]]
+                state = {"generation": generation, "entries": entries[-self.max_entries :]}
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as tmp_file:
+                    json.dump(state, tmp_file)
+                # os.replace crea un inodo nuevo: los lectores detectan el cambio con un stat()
+                os.replace(tmp_path, self.path)
+                return generation
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def changes_since(self, generation: Optional[int]) -> Tuple[int, Optional[List[str]]]:
+        """
+        Devuelve (generación actual, etiquetas invalidadas desde `generation`). Las etiquetas son
+        None si hay que vaciar la caché: proceso recién arrancado, registro recortado o clear().
+        """
+        state = self._read()
+        current = state["generation"]
+        if generation == current:
+            return current, []
+        entries = state["entries"]
+        if generation is None or generation > current or not entries or entries[0][0] > generation + 1:
+            return current, None
+
+        tags = []
+        for entry_generation, entry_tags in entries:
+            if entry_generation <= generation:
+                continue
+            if entry_tags is None:
+                return current, None
+            tags.extend(entry_tags)
+        return current, tags
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+from core.caching.invalidation import SharedInvalidationLog
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Caché en memoria del proceso, acotada por número de entradas y con expulsión LRU.
+
+    Cada entrada puede llevar etiquetas (por ejemplo "driver:Fernando Alonso") para invalidar
+    de una vez todo lo que depende de una entidad. Si se indica un SharedInvalidationLog, las
+    invalidaciones se publican en él y cada proceso aplica las de los demás antes de leer.
+
+    Un valor calculado fuera de la caché se guarda con la generación leída antes de calcularlo
+    (`set(..., generation=cache.generation())`): si entretanto ha llegado alguna invalidación,
+    de este proceso o de otro, el valor puede estar obsoleto y no se guarda.
+    """
+
+    def __init__(self, maxsize: int = 1024, invalidation_log: Optional[SharedInvalidationLog] = None):
+        self.maxsize = maxsize
+        self.invalidation_log = invalidation_log
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._entry_tags: Dict[Hashable, Iterable[str]] = {}
+        self._generation = None
+        # Invalidaciones aplicadas en este proceso (propias o recibidas del registro compartido)
+        self._invalidations = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _sync(self):
+        if self.invalidation_log is None:
+            return
+        generation, tags = self.invalidation_log.changes_since(self._generation)
+        if generation == self._generation:
+            return
+        if tags is None:
+            self._clear()
+        else:
+            self._invalidate(tags)
+        self._generation = generation
+        self._invalidations += 1
+
+    def generation(self) -> int:
+        """Marca que se pasa a set() para descartar valores calculados antes de una invalidación."""
+        with self._lock:
+            self._sync()
+            return self._invalidations
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            self._sync()
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value, tags: Iterable[str] = (), generation: Optional[int] = None):
+        with self._lock:
+            self._sync()
+            if generation is not None and generation != self._invalidations:
+                return
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = value
+            self._entry_tags[key] = tuple(tags)
+            for tag in self._entry_tags[key]:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        """Elimina las entradas con alguna de las etiquetas, en este proceso y (con log) en los demás."""
+        tags = list(tags)
+        with self._lock:
+            self._invalidate(tags)
+            self._invalidations += 1
+        if self.invalidation_log is not None and tags:
+            self.invalidation_log.publish(tags)
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+            self._invalidations += 1
+        if self.invalidation_log is not None:
+            self.invalidation_log.publish(None)
+
+    def _discard(self, key: Hashable):
+        self._entries.pop(key, None)
+        for tag in self._entry_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _invalidate(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._discard(key)
+
+    def _clear(self):
+        self._entries.clear()
+        self._tags.clear()
+        self._entry_tags.clear()
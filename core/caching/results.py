@@ -0,0 +1,82 @@
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from core.caching.invalidation import SharedInvalidationLog
+from core.caching.lru import LRUCache
+
+_MISSING = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.ok = False
+
+
+class GenerationalCache:
+    """
+    Caché de resultados de consultas que dependen de muchas filas a la vez (búsquedas), donde
+    no se puede saber qué entradas afecta una escritura.
+
+    Una generación global, compartida por todos los procesos a través de un SharedInvalidationLog
+    (sin él, la generación es local al proceso), forma parte de la clave: cualquier escritura
+    relevante la incrementa (bump) y las entradas anteriores dejan de leerse y acaban saliendo
+    del LRU. Un resultado calculado antes de una
+    escritura se guarda con la generación que había al empezar, así que nunca se sirve después.
+
+    Los fallos simultáneos de la misma clave en un proceso se agrupan: el primer hilo calcula y
+    el resto espera su resultado (hasta `wait_timeout` segundos; después calcula por su cuenta).
+    """
+
+    def __init__(
+        self, generation_log: Optional[SharedInvalidationLog] = None, maxsize: int = 256, wait_timeout: float = 30.0
+    ):
+        self.generation_log = generation_log
+        self._local_generation = 0
+        self.cache = LRUCache(maxsize)
+        self.wait_timeout = wait_timeout
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def generation(self) -> int:
+        if self.generation_log is None:
+            return self._local_generation
+        return self.generation_log.generation()
+
+    def bump(self) -> int:
+        if self.generation_log is None:
+            with self._lock:
+                self._local_generation += 1
+                return self._local_generation
+        return self.generation_log.publish(None)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        cache_key = (self.generation(), key)
+        value = self.cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout) and flight.ok:
+                return flight.value
+            return compute()
+
+        try:
+            flight.value = compute()
+            flight.ok = True
+            self.cache.set(cache_key, flight.value)
+            return flight.value
+        finally:
+            with self._lock:
+                self._flights.pop(cache_key, None)
+            flight.done.set()
@@ -9,6 +9,13 @@ def uploads_folder_name():
     return os.getenv("UPLOADS_DIR", "uploads")
 
 
+def shared_cache_dir(app) -> str:
+    """Directorio de los ficheros de caché compartidos por todos los procesos (SHARED_CACHE_DIR)."""
+    return app.config.get("SHARED_CACHE_DIR") or os.path.join(
+        os.getenv("WORKING_DIR", ""), uploads_folder_name(), "cache"
+    )
+
+
 def get_app_version():
     version_file_path = os.path.join(os.getenv("WORKING_DIR", ""), ".version")
     try:
@@ -1,5 +1,6 @@
 import os
 import secrets
+import tempfile
 
 
 class ConfigManager:
@@ -33,6 +34,19 @@ class Config:
     TIMEZONE = "Europe/Madrid"
     TEMPLATES_AUTO_RELOAD = True
     UPLOAD_FOLDER = "uploads"
+    LOG_FILE = os.getenv("LOG_FILE", "app.log")
+    # Registro diferido de visitas y descargas (core/managers/record_manager.py)
+    RECORD_WRITE_BEHIND = os.getenv("RECORD_WRITE_BEHIND", "true").lower() == "true"
+    RECORD_FLUSH_INTERVAL = float(os.getenv("RECORD_FLUSH_INTERVAL", 2.0))
+    RECORD_BATCH_SIZE = int(os.getenv("RECORD_BATCH_SIZE", 500))
+    RECORD_QUEUE_SIZE = int(os.getenv("RECORD_QUEUE_SIZE", 10000))
+    # Caché de fragmentos de plantilla (core/caching/fragments.py): "lru", "filesystem" o "none"
+    FRAGMENT_CACHE = os.getenv("FRAGMENT_CACHE", "lru")
+    FRAGMENT_CACHE_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", 600))
+    FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 2048))
+    FRAGMENT_CACHE_DIR = os.getenv("FRAGMENT_CACHE_DIR")
+    # Ficheros de las cachés compartidas entre procesos (Explore, portada, cara a cara); None = uploads/cache
+    SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR")
 
 
 class DevelopmentConfig(Config):
@@ -49,7 +63,14 @@ class TestingConfig(Config):
         f"{os.getenv('MARIADB_TEST_DATABASE', 'default_db')}"
     )
     WTF_CSRF_ENABLED = False
+    RECORD_WRITE_BEHIND = False
+    FRAGMENT_CACHE = "none"
+    # Las pruebas no deben dejar ficheros en el árbol
+    LOG_FILE = None
+    SHARED_CACHE_DIR = os.path.join(tempfile.gettempdir(), f"formulahub-tests-{os.getpid()}")
 
 
 class ProductionConfig(Config):
     DEBUG = False
+    # Compartida por todos los workers de gunicorn
+    FRAGMENT_CACHE = os.getenv("FRAGMENT_CACHE", "filesystem")
@@ -7,22 +7,31 @@ class LoggingManager:
         self.app = app
 
     def setup_logging(self):
+        # Every app shares the "app" logger: drop the handlers set up by a previous create_app()
+        for handler in [handler for handler in self.app.logger.handlers if getattr(handler, "app_handler", False)]:
+            self.app.logger.removeHandler(handler)
+            handler.close()
+
         # Configure log format
         formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-        # Configure the log file with file rotation
-        file_handler = RotatingFileHandler("app.log", maxBytes=10240, backupCount=10)
-        file_handler.setLevel(logging.ERROR)
-        file_handler.setFormatter(formatter)
+        # Configure the log file with file rotation (LOG_FILE = None disables it, e.g. in the tests)
+        log_file = self.app.config.get("LOG_FILE", "app.log")
+        if log_file:
+            file_handler = RotatingFileHandler(log_file, maxBytes=10240, backupCount=10, delay=True)
+            file_handler.setLevel(logging.ERROR)
+            file_handler.setFormatter(formatter)
+            file_handler.app_handler = True
 
-        # Add handler to app logger
-        self.app.logger.addHandler(file_handler)
+            # Add handler to app logger
+            self.app.logger.addHandler(file_handler)
 
         # Configure console log if necessary
         if self.app.debug:
             stream_handler = logging.StreamHandler()
             stream_handler.setLevel(logging.INFO)
             stream_handler.setFormatter(formatter)
+            stream_handler.app_handler = True
             self.app.logger.addHandler(stream_handler)
 
         # Set the overall log level
@@ -0,0 +1,158 @@
+"""
+Record Manager - registro diferido (write-behind) de visitas y descargas.
+
+Las peticiones solo dejan el evento en una cola en memoria acotada; un hilo de cada proceso la
+vacía cada RECORD_FLUSH_INTERVAL segundos (o al llegar a RECORD_BATCH_SIZE eventos), quita los
+repetidos y los inserta por lotes con INSERT IGNORE: la clave única de cada tabla descarta los
+que ya estaban registrados. Si el proceso muere se pierden, como mucho, los eventos de un
+intervalo (y nunca más de RECORD_QUEUE_SIZE). Con RECORD_WRITE_BEHIND=False se escribe en la
+propia petición, con una única sentencia.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from flask import current_app
+from sqlalchemy import insert
+
+logger = logging.getLogger(__name__)
+
+
+class RecordManager:
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._exit_registered = False
+        self._flush_hooks = {}
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RECORD_WRITE_BEHIND", True)
+        app.config.setdefault("RECORD_FLUSH_INTERVAL", 2.0)
+        app.config.setdefault("RECORD_BATCH_SIZE", 500)
+        app.config.setdefault("RECORD_QUEUE_SIZE", 10000)
+        self.app = app
+        self._queue = None
+        self._pid = None
+        if not self._exit_registered:
+            atexit.register(self.flush)
+            self._exit_registered = True
+
+    def add_flush_hook(self, model, callback):
+        """
+        `callback(rows, inserted)` recibe las filas de `model` de cada lote, ya escritas y sin
+        repetidos, y cuántas eran nuevas (las que la clave única no ha descartado).
+        """
+        self._flush_hooks.setdefault(model.__table__, []).append(callback)
+
+    @property
+    def enabled(self) -> bool:
+        return self.app is not None and self.app.config["RECORD_WRITE_BEHIND"]
+
+    def record(self, model, row: dict, key: Sequence[str]):
+        """Registra una fila de `model`; `key` son las columnas que identifican un evento repetido."""
+        self.record_many(model, [row], key)
+
+    def record_many(self, model, rows: List[dict], key: Sequence[str]):
+        events = [(model.__table__, tuple(row.get(column) for column in key), row) for row in rows]
+        if not self.enabled:
+            self._write(events)
+            return
+
+        self._ensure_flusher()
+        overflow = []
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                overflow.append(event)
+        if overflow:
+            # Cola llena: antes que perder los eventos se escriben en la propia petición
+            self._write(overflow)
+
+    def _ensure_flusher(self):
+        # Tras un fork (workers de gunicorn) la cola y el hilo del padre no sirven
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.app.config["RECORD_QUEUE_SIZE"])
+            self._thread = threading.Thread(target=self._run, name="record-flusher", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _next_batch(self, timeout: float) -> List[Tuple]:
+        """Espera eventos hasta `timeout` segundos o hasta completar un lote."""
+        batch_size = self.app.config["RECORD_BATCH_SIZE"]
+        deadline = time.monotonic() + timeout
+        batch = []
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch(self.app.config["RECORD_FLUSH_INTERVAL"])
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Escribe todo lo pendiente en este proceso (al terminar o en las pruebas)."""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        while True:
+            batch = self._next_batch(0)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, events: List[Tuple]):
+        rows_by_table: Dict = {}
+        for table, key, row in events:
+            rows_by_table.setdefault(table, {}).setdefault(key, row)
+
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self._run_hooks(rows_by_table, self._insert(rows_by_table))
+            else:
+                self._run_hooks(rows_by_table, self._insert(rows_by_table))
+        except Exception as exc:
+            logger.exception(f"Lost {len(events)} view/download records: {exc}")
+
+    def _run_hooks(self, rows_by_table: Dict, inserted: Dict):
+        for table, rows in rows_by_table.items():
+            for callback in self._flush_hooks.get(table, []):
+                try:
+                    callback(list(rows.values()), inserted[table])
+                except Exception as exc:
+                    logger.exception(f"Exception in flush hook of {table.name}: {exc}")
+
+    def _insert(self, rows_by_table: Dict) -> Dict:
+        """Escribe los lotes y devuelve, por tabla, cuántas filas eran nuevas."""
+        engine = current_app.extensions["sqlalchemy"].engine
+        inserted = {}
+        with engine.begin() as connection:
+            for table, rows in rows_by_table.items():
+                statement = insert(table).prefix_with("IGNORE", dialect="mysql")
+                statement = statement.prefix_with("OR IGNORE", dialect="sqlite")
+                rowcount = connection.execute(statement, list(rows.values())).rowcount
+                inserted[table] = rowcount if rowcount is not None and rowcount >= 0 else len(rows)
+        return inserted
+
+
+record_manager = RecordManager()
@@ -0,0 +1,119 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from app.modules.dataset.models import StatsRollupState
+from core.repositories.BaseRepository import BaseRepository
+
+# Los registros más recientes que esto no se consolidan todavía: una transacción aún sin
+# confirmar puede tener un id menor que otra ya confirmada, y la marca de agua no debe saltarla
+ROLLUP_LAG = timedelta(minutes=1)
+
+
+class DailyStatsRepository(BaseRepository):
+    """
+    Contadores diarios (objeto, día) -> visitas, descargas, consolidados desde las tablas de registros.
+
+    Cada tabla de registros tiene una marca de agua en stats_rollup_state con el último id ya
+    sumado. La consolidación suma los registros posteriores con un INSERT ... SELECT ... ON
+    DUPLICATE KEY UPDATE y avanza la marca en la misma transacción (con la fila de la marca
+    bloqueada, así que dos procesos nunca suman lo mismo). Las lecturas suman los contadores
+    y los pocos registros que aún no se han consolidado, así que son exactas.
+    """
+
+    def __init__(self, model, key: str, sources: Dict[str, Tuple]):
+        super().__init__(model)
+        self.key = key
+        # contador -> (modelo de registros, nombre de la columna de fecha)
+        self.sources = sources
+
+    def _watermark(self, record_table, for_update: bool = False) -> int:
+        statement = select(StatsRollupState.last_id).where(StatsRollupState.source == record_table.name)
+        if for_update:
+            statement = statement.with_for_update()
+        last_id = self.session.execute(statement).scalar()
+        return last_id or 0
+
+    def roll_up(self, now: Optional[datetime] = None) -> int:
+        """Consolida los registros nuevos de todas las fuentes. Devuelve cuántos registros se han sumado."""
+        cutoff = (now or datetime.utcnow()) - ROLLUP_LAG
+        return sum(self._roll_up_source(counter, cutoff) for counter in self.sources)
+
+    def _roll_up_source(self, counter: str, cutoff: datetime) -> int:
+        record_model, date_column = self.sources[counter]
+        records = record_model.__table__
+        stats = self.model.__table__
+
+        # La fila de la marca de agua se crea una vez y se bloquea durante la consolidación
+        self.session.execute(
+            insert(StatsRollupState.__table__)
+            .prefix_with("IGNORE", dialect="mysql")
+            .values(source=records.name, last_id=0, updated_at=datetime.utcnow())
+        )
+        last_id = self._watermark(records, for_update=True)
+        upper_id = self.session.execute(
+            select(func.max(records.c.id)).where(records.c.id > last_id, records.c[date_column] <= cutoff)
+        ).scalar()
+        if upper_id is None:
+            self.session.commit()
+            return 0
+
+        day = func.date(records.c[date_column])
+        new_counts = (
+            select(records.c[self.key], day, func.count())
+            .where(records.c.id > last_id, records.c.id <= upper_id, records.c[self.key].isnot(None))
+            .group_by(records.c[self.key], day)
+        )
+        statement = mysql_insert(stats).from_select([self.key, "day", counter], new_counts, include_defaults=False)
+        statement = statement.on_duplicate_key_update({counter: stats.c[counter] + statement.inserted[counter]})
+        self.session.execute(statement)
+
+        rolled = self.session.execute(
+            select(func.count()).where(records.c.id > last_id, records.c.id <= upper_id)
+        ).scalar()
+        self.session.execute(
+            StatsRollupState.__table__.update()
+            .where(StatsRollupState.source == records.name)
+            .values(last_id=upper_id, updated_at=datetime.utcnow())
+        )
+        self.session.commit()
+        return rolled
+
+    def counts(self, counter: str, ids: Optional[Iterable[int]] = None, since: Optional[date] = None) -> Dict[int, int]:
+        """Contador por objeto (todos o los de `ids`), opcionalmente desde un día."""
+        record_model, date_column = self.sources[counter]
+        records = record_model.__table__
+        stats = self.model.__table__
+        ids = list(ids) if ids is not None else None
+
+        consolidated = select(stats.c[self.key], func.sum(stats.c[counter])).group_by(stats.c[self.key])
+        pending = (
+            select(records.c[self.key], func.count())
+            .where(records.c.id > self._watermark(records), records.c[self.key].isnot(None))
+            .group_by(records.c[self.key])
+        )
+        if ids is not None:
+            consolidated = consolidated.where(stats.c[self.key].in_(ids))
+            pending = pending.where(records.c[self.key].in_(ids))
+        if since is not None:
+            consolidated = consolidated.where(stats.c.day >= since)
+            pending = pending.where(records.c[date_column] >= since)
+
+        result: Dict[int, int] = {}
+        for statement in (consolidated, pending):
+            for object_id, count in self.session.execute(statement):
+                result[object_id] = result.get(object_id, 0) + int(count or 0)
+        return result
+
+    def total(self, counter: str) -> int:
+        record_model, _ = self.sources[counter]
+        records = record_model.__table__
+        stats = self.model.__table__
+
+        consolidated = self.session.execute(select(func.sum(stats.c[counter]))).scalar() or 0
+        pending = (
+            self.session.execute(select(func.count()).where(records.c.id > self._watermark(records))).scalar() or 0
+        )
+        return int(consolidated) + int(pending)
@@ -0,0 +1,66 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import unidecode
+
+# Parámetros habituales de BM25: saturación de la frecuencia y peso de la longitud
+K1 = 1.2
+B = 0.75
+
+# Los términos se guardan en una columna VARCHAR(64)
+MAX_TERM_LENGTH = 64
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> List[str]:
+    """Palabras en minúsculas y sin acentos ("Fórmula-1 GP" -> ["formula", "1", "gp"])."""
+    if text is None:
+        return []
+    normalized = unidecode.unidecode(str(text)).lower()
+    return [token for token in _TOKEN.findall(normalized) if len(token) <= MAX_TERM_LENGTH]
+
+
+def term_frequencies(fields: Iterable[Tuple[object, int]]) -> Counter:
+    """Frecuencias ponderadas de un documento a partir de pares (texto, peso del campo)."""
+    frequencies: Counter = Counter()
+    for text, weight in fields:
+        for token in tokenize(text):
+            frequencies[token] += weight
+    return frequencies
+
+
+def idf(documents: int, document_frequency: int) -> float:
+    # Variante siempre positiva (la de Lucene): un término presente en todo sigue sumando algo
+    return math.log(1 + (documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def score(
+    groups: List[Dict[str, List[Tuple[int, int, int]]]], documents: int, average_length: float
+) -> Dict[int, float]:
+    """
+    Puntuación BM25 de los documentos que contienen todos los grupos de la consulta.
+
+    Cada grupo es una palabra de la consulta: término -> [(documento, frecuencia, longitud)].
+    Un grupo puede tener varios términos (las expansiones de un prefijo); el documento suma el
+    mejor de ellos. Solo se puntúan los documentos presentes en todos los grupos.
+    """
+    totals: Dict[int, float] = {}
+    for position, group in enumerate(groups):
+        best: Dict[int, float] = {}
+        for postings in group.values():
+            term_idf = idf(documents, len(postings))
+            for document, frequency, length in postings:
+                normalization = K1 * (1 - B + B * length / average_length) if average_length else K1
+                value = term_idf * frequency * (K1 + 1) / (frequency + normalization)
+                if value > best.get(document, 0.0):
+                    best[document] = value
+        if position == 0:
+            totals = best
+        else:
+            totals = {document: totals[document] + value for document, value in best.items() if document in totals}
+        if not totals:
+            return {}
+    return totals
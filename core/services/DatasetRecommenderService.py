@@ -82,6 +82,8 @@ class DatasetRecommenderService:
 
         all_datasets = self.dataset_repository.get_all_synchronized_datasets()
         max_downloads = self.ds_download_repository.total_dataset_downloads()
+        # Una sola lectura de los contadores diarios para todos los candidatos
+        downloads = self.ds_download_repository.downloads_by_dataset([ds.id for ds in all_datasets])
 
         recommendations = []
 
@@ -89,7 +91,7 @@ class DatasetRecommenderService:
             if candidate_ds.id == target_dataset.id:
                 continue
 
-            downloads_count = self.ds_download_repository.count_downloads_for_dataset(candidate_ds.id)
+            downloads_count = downloads.get(candidate_ds.id, 0)
 
             candidate_ds.downloads_count = downloads_count
 
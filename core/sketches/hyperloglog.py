@@ -0,0 +1,73 @@
+import hashlib
+import math
+import zlib
+from collections import Counter
+from typing import Iterable, Optional
+
+# 2^14 registros: error típico 1.04 / sqrt(2^14) ≈ 0.8 %, 16 KB sin comprimir
+DEFAULT_PRECISION = 14
+
+
+class HyperLogLog:
+    """
+    Estimación del número de elementos distintos con memoria constante.
+
+    Cada elemento se resume en un hash de 64 bits: los primeros `precision` bits eligen un
+    registro y el resto guarda la posición del primer bit a 1. Dos sketches de la misma
+    precisión se combinan con el máximo registro a registro, así que los de cada día se pueden
+    unir en los de un mes o de todo el histórico. Se guardan comprimidos con zlib: con pocos
+    visitantes casi todos los registros son cero y ocupan unos cientos de bytes.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytes] = None):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError("registers do not match the precision")
+
+    @staticmethod
+    def _hash(value) -> int:
+        return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+    def add(self, value):
+        hashed = self._hash(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        histogram = Counter(self.registers)
+        zeros = histogram.get(0, 0)
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size**2 / sum(count * 2.0**-rank for rank, count in histogram.items())
+        # Con pocos elementos el conteo lineal de registros vacíos es mucho más preciso
+        if zeros and estimate <= 2.5 * self.size:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "HyperLogLog":
+        if not data:
+            return cls()
+        return cls(precision=data[0], registers=zlib.decompress(data[1:]))
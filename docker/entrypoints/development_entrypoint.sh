@@ -63,5 +63,11 @@ else
     flask db upgrade
 fi
 
+# Build the unique-visitor sketches from the existing view history (only the first time)
+flask dataset rebuild-sketches --if-empty
+
+# Build the Explore search index for the existing datasets (only the first time)
+flask explore reindex --if-empty
+
 # Start the Flask application with specified host and port, enabling reload and debug mode
 exec flask run --host=0.0.0.0 --port=5000 --reload --debug
@@ -54,6 +54,12 @@ else
     flask db upgrade
 fi
 
+# Build the unique-visitor sketches from the existing view history (only the first time)
+flask dataset rebuild-sketches --if-empty
+
+# Build the Explore search index for the existing datasets (only the first time)
+flask explore reindex --if-empty
+
 # Start the application using Gunicorn, binding it to port 5000
 # Set the logging level to info and the timeout to 3600 seconds
 exec gunicorn --bind 0.0.0.0:5000 app:app --log-level info --timeout 3600
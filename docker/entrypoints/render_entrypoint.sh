@@ -51,6 +51,16 @@ else
     flask db upgrade
 fi
 
+# Build the unique-visitor sketches from the existing view history (only the first time)
+flask dataset rebuild-sketches --if-empty
+
+# Build the Explore search index for the existing datasets (only the first time)
+flask explore reindex --if-empty
+
+# Render runs a single container: the dataset worker (queued uploads and daily stats
+# rollup) runs in the background next to Gunicorn and is restarted if it stops
+(while true; do flask --app app dataset worker; sleep 5; done) &
+
 # Start the application using Gunicorn, binding it to port 80
 # Set the logging level to info and the timeout to 3600 seconds
 exec gunicorn --bind 0.0.0.0:80 app:app --log-level info --timeout 3600
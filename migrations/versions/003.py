@@ -0,0 +1,82 @@
+"""add parsed race time to formula_result
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 10:12:05.418230
+
+"""
+
+import re
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+RACE_TIME_REGEX = re.compile(r"^(\d+:)?\d{1,2}:\d{2}(\.\d{1,3})?$")
+BACKFILL_BATCH_SIZE = 5000
+
+
+def parse_race_time_ms(value):
+    # Copia de app.modules.dataset.services.parse_race_time_ms: la migración no debe depender del código de la app
+    value = (value or "").strip()
+    if not RACE_TIME_REGEX.match(value):
+        return None
+    *parts, seconds = value.split(":")
+    seconds, _, fraction = seconds.partition(".")
+    total = 0
+    for part in parts:
+        total = total * 60 + int(part)
+    return (total * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, "0") or 0)
+
+
+def upgrade():
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("tiempo_carrera_ms", sa.Integer(), nullable=True))
+
+    # Backfill por bloques recorriendo la clave primaria
+    connection = op.get_bind()
+    formula_result = sa.table(
+        "formula_result",
+        sa.column("id", sa.Integer),
+        sa.column("tiempo_carrera", sa.String),
+        sa.column("tiempo_carrera_ms", sa.Integer),
+    )
+    update = (
+        formula_result.update()
+        .where(formula_result.c.id == sa.bindparam("row_id"))
+        .values(tiempo_carrera_ms=sa.bindparam("ms"))
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(formula_result.c.id, formula_result.c.tiempo_carrera)
+            .where(formula_result.c.id > last_id, formula_result.c.tiempo_carrera.isnot(None))
+            .order_by(formula_result.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        values = [{"row_id": row.id, "ms": parse_race_time_ms(row.tiempo_carrera)} for row in rows]
+        values = [value for value in values if value["ms"] is not None]
+        if values:
+            connection.execute(update, values)
+
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        batch_op.create_index("ix_formula_result_tiempo_carrera_ms", ["tiempo_carrera_ms"], unique=False)
+        batch_op.create_index(
+            "ix_formula_result_dataset_id_tiempo_carrera_ms", ["dataset_id", "tiempo_carrera_ms"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        batch_op.drop_index("ix_formula_result_dataset_id_tiempo_carrera_ms")
+        batch_op.drop_index("ix_formula_result_tiempo_carrera_ms")
+        batch_op.drop_column("tiempo_carrera_ms")
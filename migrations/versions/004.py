@@ -0,0 +1,51 @@
+"""add content-addressed blob store
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 12:40:31.902114
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "content_blob",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("checksum", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("checksum"),
+    )
+
+    with op.batch_alter_table("file", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("blob_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key("fk_file_blob_id_content_blob", "content_blob", ["blob_id"], ["id"])
+        batch_op.create_index("ix_file_checksum", ["checksum"], unique=False)
+
+    with op.batch_alter_table("formula_dataset", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("csv_checksum", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_formula_dataset_csv_checksum", ["csv_checksum"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("formula_dataset", schema=None) as batch_op:
+        batch_op.drop_index("ix_formula_dataset_csv_checksum")
+        batch_op.drop_column("csv_checksum")
+
+    with op.batch_alter_table("file", schema=None) as batch_op:
+        batch_op.drop_index("ix_file_checksum")
+        batch_op.drop_constraint("fk_file_blob_id_content_blob", type_="foreignkey")
+        batch_op.drop_column("blob_id")
+
+    op.drop_table("content_blob")
@@ -0,0 +1,49 @@
+"""add dataset_job queue
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 15:02:47.551308
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "005"
+down_revision = "004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "dataset_job",
+        sa.Column("id", sa.String(length=36), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("form_type", sa.String(length=20), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("stage", sa.String(length=30), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("result", sa.Text(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("dataset_job", schema=None) as batch_op:
+        batch_op.create_index("ix_dataset_job_status_created_at", ["status", "created_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("dataset_job", schema=None) as batch_op:
+        batch_op.drop_index("ix_dataset_job_status_created_at")
+
+    op.drop_table("dataset_job")
@@ -0,0 +1,80 @@
+"""add versioned deltas for formula results
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 17:25:10.663941
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "006"
+down_revision = "005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Un piloto solo puede aparecer una vez por carrera. Los datasets con varias filas del mismo
+    # piloto (temporadas completas subidas como un solo dataset) no se tocan: hay que separarlos
+    # en una carrera por dataset antes de migrar, así que la migración se detiene y los lista
+    duplicated = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT dataset_id, COUNT(*) - COUNT(DISTINCT piloto_nombre) AS extra_rows "
+                "FROM formula_result GROUP BY dataset_id "
+                "HAVING COUNT(*) > COUNT(DISTINCT piloto_nombre) ORDER BY dataset_id"
+            )
+        )
+        .all()
+    )
+    if duplicated:
+        details = ", ".join(
+            f"dataset {dataset_id} ({extra_rows} repeated rows)" for dataset_id, extra_rows in duplicated
+        )
+        raise RuntimeError(
+            "formula_result has drivers repeated within the same dataset, which the new unique key "
+            f"(dataset_id, piloto_nombre) does not allow: {details}. These are usually whole seasons "
+            "uploaded as a single dataset; split them into one dataset per race (upload the CSV again "
+            "with 'One dataset per race' and delete the old dataset) and run the migration again."
+        )
+
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        batch_op.create_unique_constraint("uq_formula_result_dataset_id_piloto_nombre", ["dataset_id", "piloto_nombre"])
+
+    with op.batch_alter_table("formula_dataset", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("results_version", sa.Integer(), server_default="0", nullable=False))
+
+    op.create_table(
+        "formula_result_delta",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("dataset_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("comment", sa.String(length=255), nullable=True),
+        sa.Column("changes", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["dataset_id"],
+            ["formula_dataset.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("dataset_id", "version", name="uq_formula_result_delta_dataset_id_version"),
+    )
+
+
+def downgrade():
+    op.drop_table("formula_result_delta")
+
+    with op.batch_alter_table("formula_dataset", schema=None) as batch_op:
+        batch_op.drop_column("results_version")
+
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        batch_op.drop_constraint("uq_formula_result_dataset_id_piloto_nombre", type_="unique")
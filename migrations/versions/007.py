@@ -0,0 +1,83 @@
+"""add materialized season standings
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 18:02:44.120517
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "007"
+down_revision = "006"
+branch_labels = None
+depends_on = None
+
+STANDINGS_SQL = (
+    "INSERT INTO {table} (anio_temporada, {key}, puntos, carreras, victorias, podios, updated_at) "
+    "SELECT d.anio_temporada, r.{key}, SUM(r.puntos_obtenidos), COUNT(DISTINCT r.dataset_id), "
+    "SUM(CASE WHEN r.posicion_final = '1' THEN 1 ELSE 0 END), "
+    "SUM(CASE WHEN r.posicion_final IN ('1', '2', '3') THEN 1 ELSE 0 END), NOW() "
+    "FROM formula_result r JOIN formula_dataset d ON d.id = r.dataset_id "
+    "GROUP BY d.anio_temporada, r.{key}"
+)
+
+
+def upgrade():
+    op.create_table(
+        "formula_driver_standing",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("anio_temporada", sa.Integer(), nullable=False),
+        sa.Column("piloto_nombre", sa.String(length=120), nullable=False),
+        sa.Column("puntos", sa.Float(), nullable=False),
+        sa.Column("carreras", sa.Integer(), nullable=False),
+        sa.Column("victorias", sa.Integer(), nullable=False),
+        sa.Column("podios", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("anio_temporada", "piloto_nombre", name="uq_formula_driver_standing_season_driver"),
+    )
+    op.create_index("ix_formula_driver_standing_season_puntos", "formula_driver_standing", ["anio_temporada", "puntos"])
+
+    op.create_table(
+        "formula_constructor_standing",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("anio_temporada", sa.Integer(), nullable=False),
+        sa.Column("equipo", sa.String(length=120), nullable=False),
+        sa.Column("puntos", sa.Float(), nullable=False),
+        sa.Column("carreras", sa.Integer(), nullable=False),
+        sa.Column("victorias", sa.Integer(), nullable=False),
+        sa.Column("podios", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("anio_temporada", "equipo", name="uq_formula_constructor_standing_season_team"),
+    )
+    op.create_index(
+        "ix_formula_constructor_standing_season_puntos", "formula_constructor_standing", ["anio_temporada", "puntos"]
+    )
+
+    op.create_table(
+        "formula_standing_race",
+        sa.Column("dataset_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("anio_temporada", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("dataset_id"),
+    )
+    op.create_index("ix_formula_standing_race_anio_temporada", "formula_standing_race", ["anio_temporada"])
+
+    # Clasificaciones de las carreras que ya existen
+    op.execute(STANDINGS_SQL.format(table="formula_driver_standing", key="piloto_nombre"))
+    op.execute(STANDINGS_SQL.format(table="formula_constructor_standing", key="equipo"))
+    op.execute(
+        "INSERT INTO formula_standing_race (dataset_id, anio_temporada) SELECT id, anio_temporada FROM formula_dataset"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_formula_standing_race_anio_temporada", table_name="formula_standing_race")
+    op.drop_table("formula_standing_race")
+    op.drop_index("ix_formula_constructor_standing_season_puntos", table_name="formula_constructor_standing")
+    op.drop_table("formula_constructor_standing")
+    op.drop_index("ix_formula_driver_standing_season_puntos", table_name="formula_driver_standing")
+    op.drop_table("formula_driver_standing")
@@ -0,0 +1,57 @@
+"""add indexes for the cross-dataset result query
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 19:11:37.540286
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "008"
+down_revision = "007"
+branch_labels = None
+depends_on = None
+
+RESULT_INDEXES = {
+    "ix_formula_result_piloto_nombre_dataset_id": ["piloto_nombre", "dataset_id", "id"],
+    "ix_formula_result_equipo_dataset_id": ["equipo", "dataset_id", "id"],
+    "ix_formula_result_motor_dataset_id": ["motor", "dataset_id", "id"],
+    "ix_formula_result_estado_carrera_dataset_id": ["estado_carrera", "dataset_id", "id"],
+    "ix_formula_result_posicion_numero_dataset_id": ["posicion_numero", "dataset_id", "id"],
+}
+
+
+def upgrade():
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("posicion_numero", sa.Integer(), nullable=True))
+
+    op.execute(
+        "UPDATE formula_result SET posicion_numero = CAST(TRIM(posicion_final) AS UNSIGNED) "
+        "WHERE TRIM(posicion_final) REGEXP '^[0-9]+$'"
+    )
+
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        for name, columns in RESULT_INDEXES.items():
+            batch_op.create_index(name, columns, unique=False)
+
+    with op.batch_alter_table("formula_dataset", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_formula_dataset_anio_temporada_circuito", ["anio_temporada", "circuito"], unique=False
+        )
+        batch_op.create_index(
+            "ix_formula_dataset_circuito_anio_temporada", ["circuito", "anio_temporada"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("formula_dataset", schema=None) as batch_op:
+        batch_op.drop_index("ix_formula_dataset_circuito_anio_temporada")
+        batch_op.drop_index("ix_formula_dataset_anio_temporada_circuito")
+
+    with op.batch_alter_table("formula_result", schema=None) as batch_op:
+        for name in RESULT_INDEXES:
+            batch_op.drop_index(name)
+        batch_op.drop_column("posicion_numero")
@@ -0,0 +1,104 @@
+"""add driver and team career statistics
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 19:48:02.771943
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "009"
+down_revision = "008"
+branch_labels = None
+depends_on = None
+
+CAREER_SQL = (
+    "INSERT INTO {table} ({key}, carreras, victorias, podios, puntos, abandonos, vueltas, mejor_posicion, "
+    "primera_temporada, ultima_temporada, updated_at) "
+    "SELECT r.{key}, COUNT(DISTINCT r.dataset_id), "
+    "SUM(CASE WHEN r.posicion_numero = 1 THEN 1 ELSE 0 END), "
+    "SUM(CASE WHEN r.posicion_numero <= 3 THEN 1 ELSE 0 END), "
+    "SUM(r.puntos_obtenidos), "
+    "SUM(CASE WHEN r.posicion_final IN ('DNF', 'RET') THEN 1 ELSE 0 END), "
+    "COALESCE(SUM(r.vueltas_completadas), 0), MIN(r.posicion_numero), "
+    "MIN(d.anio_temporada), MAX(d.anio_temporada), NOW() "
+    "FROM formula_result r JOIN formula_dataset d ON d.id = r.dataset_id "
+    "GROUP BY r.{key}"
+)
+
+
+def career_columns():
+    return [
+        sa.Column("carreras", sa.Integer(), nullable=False),
+        sa.Column("victorias", sa.Integer(), nullable=False),
+        sa.Column("podios", sa.Integer(), nullable=False),
+        sa.Column("puntos", sa.Float(), nullable=False),
+        sa.Column("abandonos", sa.Integer(), nullable=False),
+        sa.Column("vueltas", sa.Integer(), nullable=False),
+        sa.Column("mejor_posicion", sa.Integer(), nullable=True),
+        sa.Column("primera_temporada", sa.Integer(), nullable=True),
+        sa.Column("ultima_temporada", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    ]
+
+
+def upgrade():
+    op.create_table(
+        "formula_driver_career_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("piloto_nombre", sa.String(length=120), nullable=False),
+        *career_columns(),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("piloto_nombre"),
+    )
+    op.create_table(
+        "formula_team_career_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("equipo", sa.String(length=120), nullable=False),
+        *career_columns(),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("equipo"),
+    )
+    op.create_table(
+        "formula_driver_circuit_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("piloto_nombre", sa.String(length=120), nullable=False),
+        sa.Column("circuito", sa.String(length=200), nullable=False),
+        sa.Column("carreras", sa.Integer(), nullable=False),
+        sa.Column("victorias", sa.Integer(), nullable=False),
+        sa.Column("mejor_posicion", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("piloto_nombre", "circuito", name="uq_formula_driver_circuit_stats_driver_circuit"),
+    )
+    op.create_table(
+        "formula_stats_entry",
+        sa.Column("dataset_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("piloto_nombre", sa.String(length=120), nullable=False),
+        sa.Column("equipo", sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint("dataset_id", "piloto_nombre"),
+    )
+
+    # Estadísticas de los resultados que ya existen
+    op.execute(CAREER_SQL.format(table="formula_driver_career_stats", key="piloto_nombre"))
+    op.execute(CAREER_SQL.format(table="formula_team_career_stats", key="equipo"))
+    op.execute(
+        "INSERT INTO formula_driver_circuit_stats (piloto_nombre, circuito, carreras, victorias, mejor_posicion) "
+        "SELECT r.piloto_nombre, d.circuito, COUNT(DISTINCT r.dataset_id), "
+        "SUM(CASE WHEN r.posicion_numero = 1 THEN 1 ELSE 0 END), MIN(r.posicion_numero) "
+        "FROM formula_result r JOIN formula_dataset d ON d.id = r.dataset_id "
+        "GROUP BY r.piloto_nombre, d.circuito"
+    )
+    op.execute(
+        "INSERT INTO formula_stats_entry (dataset_id, piloto_nombre, equipo) "
+        "SELECT dataset_id, piloto_nombre, equipo FROM formula_result"
+    )
+
+
+def downgrade():
+    op.drop_table("formula_stats_entry")
+    op.drop_table("formula_driver_circuit_stats")
+    op.drop_table("formula_team_career_stats")
+    op.drop_table("formula_driver_career_stats")
@@ -0,0 +1,49 @@
+"""add unique keys to view and download records
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17 21:05:44.318207
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "010"
+down_revision = "009"
+branch_labels = None
+depends_on = None
+
+# (tabla, columna del objeto, columna de la cookie, nombre de la clave única)
+RECORD_TABLES = [
+    ("ds_view_record", "dataset_id", "view_cookie", "uq_ds_view_record_dataset_id_cookie_user_key"),
+    ("ds_download_record", "dataset_id", "download_cookie", "uq_ds_download_record_dataset_id_cookie_user_key"),
+    ("file_view_record", "file_id", "view_cookie", "uq_file_view_record_file_id_cookie_user_key"),
+    ("file_download_record", "file_id", "download_cookie", "uq_file_download_record_file_id_cookie_user_key"),
+]
+
+
+def upgrade():
+    for table, target, cookie, constraint in RECORD_TABLES:
+        # Se conserva el primer registro de cada (objeto, cookie, usuario), como hacían las peticiones
+        op.execute(
+            f"DELETE duplicate FROM {table} AS duplicate "
+            f"JOIN {table} AS original "
+            f"ON original.{target} <=> duplicate.{target} "
+            f"AND original.{cookie} <=> duplicate.{cookie} "
+            f"AND original.user_id <=> duplicate.user_id "
+            f"AND original.id < duplicate.id"
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(
+                sa.Column("user_key", sa.Integer(), sa.Computed("coalesce(user_id, 0)", persisted=True), nullable=True)
+            )
+            batch_op.create_unique_constraint(constraint, [target, cookie, "user_key"])
+
+
+def downgrade():
+    for table, target, cookie, constraint in reversed(RECORD_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(constraint, type_="unique")
+            batch_op.drop_column("user_key")
@@ -0,0 +1,71 @@
+"""add daily view and download counters
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 21:52:17.604381
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "011"
+down_revision = "010"
+branch_labels = None
+depends_on = None
+
+# (tabla de contadores, columna del objeto, contador, tabla de registros, columna de fecha)
+ROLLUPS = [
+    ("dataset_daily_stats", "dataset_id", "views", "ds_view_record", "view_date"),
+    ("dataset_daily_stats", "dataset_id", "downloads", "ds_download_record", "download_date"),
+    ("file_daily_stats", "file_id", "views", "file_view_record", "view_date"),
+    ("file_daily_stats", "file_id", "downloads", "file_download_record", "download_date"),
+]
+
+
+def upgrade():
+    op.create_table(
+        "dataset_daily_stats",
+        sa.Column("dataset_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("views", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("downloads", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("dataset_id", "day"),
+    )
+    op.create_table(
+        "file_daily_stats",
+        sa.Column("file_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("views", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("downloads", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("file_id", "day"),
+    )
+    op.create_table(
+        "stats_rollup_state",
+        sa.Column("source", sa.String(length=64), nullable=False),
+        sa.Column("last_id", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("source"),
+    )
+
+    # Consolidación inicial de todo el histórico y marca de agua en el último registro sumado
+    for stats, key, counter, records, date_column in ROLLUPS:
+        op.execute(
+            f"INSERT INTO stats_rollup_state (source, last_id, updated_at) "
+            f"SELECT '{records}', COALESCE(MAX(id), 0), NOW() FROM {records}"
+        )
+        op.execute(
+            f"INSERT INTO {stats} ({key}, day, {counter}) "
+            f"SELECT {key}, DATE({date_column}), COUNT(*) FROM {records} "
+            f"WHERE {key} IS NOT NULL "
+            f"AND id <= (SELECT last_id FROM stats_rollup_state WHERE source = '{records}') "
+            f"GROUP BY {key}, DATE({date_column}) "
+            f"ON DUPLICATE KEY UPDATE {counter} = {counter} + VALUES({counter})"
+        )
+
+
+def downgrade():
+    op.drop_table("stats_rollup_state")
+    op.drop_table("file_daily_stats")
+    op.drop_table("dataset_daily_stats")
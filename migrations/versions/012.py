@@ -0,0 +1,34 @@
+"""add unique visitor sketches
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 22:31:40.127596
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "012"
+down_revision = "011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los sketches del histórico los genera `flask dataset rebuild-sketches --if-empty`, que los
+    # entrypoints ejecutan después de `flask db upgrade`
+    op.create_table(
+        "view_sketch",
+        sa.Column("object_type", sa.String(length=16), nullable=False),
+        sa.Column("object_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("period", sa.String(length=10), nullable=False),
+        sa.Column("registers", sa.LargeBinary(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("object_type", "object_id", "period"),
+    )
+
+
+def downgrade():
+    op.drop_table("view_sketch")
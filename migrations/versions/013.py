@@ -0,0 +1,31 @@
+"""add updated_at to dataset
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17 23:08:52.471305
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "013"
+down_revision = "012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("dataset", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE dataset SET updated_at = created_at")
+
+    with op.batch_alter_table("dataset", schema=None) as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table("dataset", schema=None) as batch_op:
+        batch_op.drop_column("updated_at")
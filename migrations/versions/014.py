@@ -0,0 +1,44 @@
+"""add full-text search index
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17 23:47:05.193820
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "014"
+down_revision = "013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # El índice de los datasets existentes lo genera `flask explore reindex --if-empty`, que los
+    # entrypoints ejecutan después de `flask db upgrade`
+    op.create_table(
+        "search_document",
+        sa.Column("dataset_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("length", sa.Integer(), nullable=False),
+        sa.Column("indexed_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("dataset_id"),
+    )
+    op.create_table(
+        "search_posting",
+        sa.Column("term", sa.String(length=64), nullable=False),
+        sa.Column("dataset_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("frequency", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("term", "dataset_id"),
+    )
+    with op.batch_alter_table("search_posting", schema=None) as batch_op:
+        batch_op.create_index("ix_search_posting_dataset_id", ["dataset_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("search_posting", schema=None) as batch_op:
+        batch_op.drop_index("ix_search_posting_dataset_id")
+    op.drop_table("search_posting")
+    op.drop_table("search_document")
@@ -0,0 +1,25 @@
+"""add created_at index to dataset for keyset pagination
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-17 23:59:12.846031
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "015"
+down_revision = "014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("dataset", schema=None) as batch_op:
+        batch_op.create_index("ix_dataset_created_at_id", ["created_at", "id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("dataset", schema=None) as batch_op:
+        batch_op.drop_index("ix_dataset_created_at_id")
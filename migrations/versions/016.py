@@ -0,0 +1,99 @@
+"""recompute file checksums as SHA-256 and drop the unused checksum index
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-17 23:59:48.120377
+
+"""
+
+import hashlib
+import logging
+import os
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "016"
+down_revision = "015"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+BACKFILL_BATCH_SIZE = 500
+HASH_READ_SIZE = 1024 * 1024
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_READ_SIZE), b""):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+def upgrade():
+    # Las subidas por formulario guardaban MD5 y las demás SHA-256: se recalculan todos desde el
+    # fichero para que file.checksum (ETags, manifests de los zips) use un único algoritmo
+    connection = op.get_bind()
+    file = sa.table(
+        "file",
+        sa.column("id", sa.Integer),
+        sa.column("name", sa.String),
+        sa.column("checksum", sa.String),
+        sa.column("size", sa.Integer),
+        sa.column("feature_model_id", sa.Integer),
+    )
+    feature_model = sa.table("feature_model", sa.column("id", sa.Integer), sa.column("dataset_id", sa.Integer))
+    dataset = sa.table("dataset", sa.column("id", sa.Integer), sa.column("user_id", sa.Integer))
+    update = (
+        file.update()
+        .where(file.c.id == sa.bindparam("file_id"))
+        .values(checksum=sa.bindparam("new_checksum"), size=sa.bindparam("new_size"))
+    )
+    uploads = os.path.join(os.getenv("WORKING_DIR", ""), os.getenv("UPLOADS_DIR", "uploads"))
+
+    missing = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(file.c.id, file.c.name, file.c.checksum, file.c.size, dataset.c.id, dataset.c.user_id)
+            .select_from(file)
+            .join(feature_model, feature_model.c.id == file.c.feature_model_id)
+            .join(dataset, dataset.c.id == feature_model.c.dataset_id)
+            .where(file.c.id > last_id)
+            .order_by(file.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        values = []
+        for file_id, name, checksum, size, dataset_id, user_id in rows:
+            path = os.path.join(uploads, f"user_{user_id}", f"dataset_{dataset_id}", name)
+            try:
+                new_checksum, new_size = sha256_file(path)
+            except FileNotFoundError:
+                missing += 1
+                continue
+            if (new_checksum, new_size) != (checksum, size):
+                values.append({"file_id": file_id, "new_checksum": new_checksum, "new_size": new_size})
+        if values:
+            connection.execute(update, values)
+
+    if missing:
+        logger.warning(f"{missing} files were not found under {uploads}; their checksums were left unchanged")
+
+    # Nada busca ficheros por checksum (los blobs se buscan en content_blob)
+    with op.batch_alter_table("file", schema=None) as batch_op:
+        batch_op.drop_index("ix_file_checksum")
+
+
+def downgrade():
+    # Los MD5 anteriores no se pueden recuperar: solo se restaura el índice
+    with op.batch_alter_table("file", schema=None) as batch_op:
+        batch_op.create_index("ix_file_checksum", ["checksum"], unique=False)
@@ -0,0 +1,37 @@
+"""recount standing wins and podiums from the numeric position
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-17 23:59:55.408213
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "017"
+down_revision = "016"
+branch_labels = None
+depends_on = None
+
+RECOUNT_SQL = (
+    "UPDATE {table} s JOIN ("
+    "SELECT d.anio_temporada, r.{key} AS entity, "
+    "SUM(CASE WHEN r.posicion_numero = 1 THEN 1 ELSE 0 END) AS victorias, "
+    "SUM(CASE WHEN r.posicion_numero <= 3 THEN 1 ELSE 0 END) AS podios "
+    "FROM formula_result r JOIN formula_dataset d ON d.id = r.dataset_id "
+    "GROUP BY d.anio_temporada, r.{key}"
+    ") t ON t.anio_temporada = s.anio_temporada AND t.entity = s.{key} "
+    "SET s.victorias = t.victorias, s.podios = t.podios"
+)
+
+
+def upgrade():
+    # Las clasificaciones iniciales (007) contaban victorias y podios comparando posicion_final
+    # como texto; ahora, como las estadísticas de carrera, usan posicion_numero
+    op.execute(RECOUNT_SQL.format(table="formula_driver_standing", key="piloto_nombre"))
+    op.execute(RECOUNT_SQL.format(table="formula_constructor_standing", key="equipo"))
+
+
+def downgrade():
+    pass
@@ -11,6 +11,18 @@ flask db upgrade
 echo "🌱 Ejecutando seed (opcional)..."
 rosemary db:seed
 
-# 3. Arrancar Gunicorn
+# 3. Sketches de visitantes únicos del histórico (solo la primera vez)
+echo "📈 Generando sketches de visitantes únicos..."
+flask dataset rebuild-sketches --if-empty
+
+# 4. Índice de búsqueda de Explore para los datasets existentes (solo la primera vez)
+echo "🔎 Generando el índice de búsqueda..."
+flask explore reindex --if-empty
+
+# 5. Worker de datasets en segundo plano (subidas encoladas y consolidación de estadísticas)
+echo "⚙️ Arrancando worker de datasets..."
+(while true; do flask --app app dataset worker; sleep 5; done) &
+
+# 6. Arrancar Gunicorn
 echo "🔥 Arrancando Gunicorn..."
 gunicorn -w 1 --threads 4 --timeout 60 -b 0.0.0.0:5000 app:app